@@ -1,11 +1,19 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.webdriver.common.selenium_manager import SeleniumManager
+from selenium.webdriver.remote.command import Command
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException, WebDriverException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import subprocess
+import sys
+import argparse
+import hashlib
 import json
 import time
 import os
@@ -14,24 +22,204 @@ import re
 import csv
 import io
 import base64
+import zipfile
+import queue
+import html
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from collections import deque
 from PIL import Image
 import schedule
 import threading
 import shutil
 from pathlib import Path
 import tempfile
+import uuid
+import atexit
+import signal
+try:
+    import psutil
+except ImportError:  # Optional: without it processes are found through /proc (Linux only)
+    psutil = None
+import ssl
+import websocket
+import http.server
+import functools
+import platform
+import urllib.request
+import urllib.error
+from http.cookiejar import CookieJar
+from urllib.parse import urlsplit, urlunsplit
+import random
+import heapq
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, as_completed
+import numpy as np
+from visual_diff import compare_images
 
 # Constants
 TARGET_WIDTH_PX = 100
 TARGET_HEIGHT_PX = 100
 SCREENSHOT_DIR = "screenshots"
 RESULTS_DIR = "results"
+CSV_ARCHIVE_DIR = os.path.join(RESULTS_DIR, "csv")
+PARTIAL_RESULTS_DIR = os.path.join(RESULTS_DIR, "partial")
 TEST_CASES_FILE = "test_cases.json"
 SCHEDULED_TESTS_FILE = "scheduled_tests.json"
+ROLLUPS_DIR = "rollups"
+ROLLUPS_FILE = os.path.join(ROLLUPS_DIR, "daily_rollups.json")
+ROLLUP_MAX_SAMPLES = 200
+# Daily buckets (and the record of which result files they hold) are dropped after this long
+ROLLUP_RETENTION = timedelta(days=180)
+TIMEOUT_MODEL_FILE = os.path.join(ROLLUPS_DIR, "timeout_model.json")
+FIND_ELEMENT_TIMEOUT = 10
+NOTIFICATION_TIMEOUT = 3
+DROPDOWN_TIMEOUT = 5
+TIMEOUT_MIN_SAMPLES = 5
+TIMEOUT_MARGIN_FACTOR = 1.5
+TIMEOUT_MARGIN_SECONDS = 1.0
+TIMEOUT_FLOOR = 1.0
+# Learned timeouts never drop below these: a toast that has not shown yet cannot be told from
+# one that never will, and a slow render is cheaper to wait for than to fail on
+TIMEOUT_FLOORS = {"locate": 3.0, "notify": NOTIFICATION_TIMEOUT, "options": TIMEOUT_FLOOR}
+# How much of one miss each on-time wait takes back, so a widened timeout narrows again gradually
+TIMEOUT_MISS_DECAY = 0.1
+TIMEOUT_CEILING = 30.0
+TIMEOUT_RECENT = 20
+TIMEOUT_DRIFT_RATIO = 1.5
+PLANNER_EWMA_ALPHA = 0.3
+PLANNER_DEFAULT_STEP_SECONDS = 4.0
+PLANNER_FAILURE_WEIGHT = 1.0
+STEP_ACTIONS = ["visit", "click", "input", "fill_form", "assert", "select_dropdown", "visual_assert"]
+# Actions that leave no state behind; a resumed run may skip them
+READ_ONLY_ACTIONS = ["visit", "assert", "visual_assert"]
+SELECTOR_TYPES = ["id", "name", "xpath", "css_selector", "class_name", "tag_name", "link_text", "partial_link_text", "placeholder",
+                  "text", "label", "role", "within"]
+# Resolved by LOCATOR_JS inside the page in a single script call
+IN_PAGE_SELECTOR_TYPES = ["text", "label", "role", "within"]
+# Elements a "role" selector matches without a role attribute; the first matching entry wins
+IMPLICIT_ROLES = {
+    "button": "button, input[type=button], input[type=submit], input[type=reset]",
+    "link": "a[href]",
+    "textbox": "input:not([type]), input[type=text], input[type=email], input[type=password], input[type=search], "
+               "input[type=tel], input[type=url], input[type=number], textarea",
+    "checkbox": "input[type=checkbox]",
+    "radio": "input[type=radio]",
+    "combobox": "select",
+    "heading": "h1, h2, h3, h4, h5, h6",
+    "menuitem": ".el-dropdown-menu__item",
+    "option": "option, .el-select-dropdown__item",
+    "tab": ".el-tabs__item",
+    "dialog": ".el-dialog",
+    "row": "tr",
+    "cell": "td",
+}
+CAPTURE_MODES = ["screenshots", "screencast"]
+SCREENCAST_DIR = "screencasts"
+TRACES_DIR = "traces"
+TRACE_DOM_MAX_CHARS = 2_000_000
+TRACE_MAX_BYTES = 50 * 1024 * 1024
+TRACE_PREVIEW_CHARS = 20_000
+SCREENCAST_PREFIX = "screencast:"
+SCREENCAST_FPS = 5
+SCREENCAST_QUALITY = 60
+SCREENCAST_MAX_SIZE = (1280, 720)
+# Chrome paints at up to this rate; everyNthFrame thins it to roughly the requested fps at the source
+SCREENCAST_PAINT_FPS = 60
+SCREENCAST_MAX_AGE = timedelta(days=14)
+DROPDOWN_OPTION_SELECTOR = "li.el-dropdown-menu__item, li.el-select-dropdown__item"
+BASELINE_DIR = "baselines"
+VISUAL_DIFF_THRESHOLD = 0.01
+VISUAL_PIXEL_TOLERANCE = 0.1
+VISUAL_DIFF_WORKERS = 2
+ASSERT_TIMEOUT = 5
+FILL_FORM_TIMEOUT = 10
+ASSERT_POLL_INTERVAL = 0.25
+ASSERTION_TYPES = ["text_present", "text_absent", "count", "attribute", "regex", "url"]
+DRIVER_CACHE_FILE = ".driver_cache.json"
+# SessionNotCreatedException messages meaning Chrome updated under the cached chromedriver
+DRIVER_VERSION_MISMATCH = ("only supports chrome version", "this version of chromedriver")
+PAGE_LOAD_TIMEOUT = 60
+STEP_DEADLINE = 180
+RUN_DEADLINE = 30 * 60
+SCHEDULE_DEADLINE = 4 * 60 * 60
+WATCHDOG_INTERVAL = 5
+REAP_INTERVAL = 5 * 60
+ORPHAN_PROFILE_AGE = 30 * 60
+PROFILE_PREFIX = "selenium_profile_"
+# Written into each profile with the owning process's pid; reapers skip profiles of live owners
+PROFILE_OWNER_FILE = ".autotest_owner"
+RECORDINGS_DIR = "recordings"
+NETWORK_MODES = ["live", "record", "replay"]
+# How long the recorder waits for a body its websocket listener is still fetching
+RECORD_BODY_WAIT = 2
+BROWSER_MODES = ["process", "context"]
+CONTEXT_HOST_START_TIMEOUT = 30
+BREAKER_MIN_SAMPLES = 3
+BREAKER_FAILURE_RATE = 0.8
+BREAKER_WINDOW = 10
+BREAKER_COOLDOWN = 5 * 60
+BREAKER_PREFIX_MAX_STEPS = 6
+PREFLIGHT_TIMEOUT = 10
+LOAD_REPORTS_DIR = "load_reports"
+REPORTS_DIR = os.path.join(RESULTS_DIR, "reports")
+XERO_SCRIPT = "/home/ubuntu_admin/xero/run_multiple_scripts.sh"
+XERO_JOB_DIR = os.path.join("jobs", "xero")
+JOB_HISTORY_LIMIT = 50
+JOB_TAIL_BYTES = 64 * 1024
+JOB_POLL_SECONDS = 2
+JOB_START_GRACE = 60
+REPORT_FORMATS = {
+    "csv": ("CSV", "text/csv"),
+    "xlsx": ("Excel with Screenshots", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "html": ("HTML", "text/html"),
+}
+REPORT_WORKERS = 2
+REPORT_POLL_SECONDS = 1
+REPORT_CACHE_MAX_AGE = timedelta(days=30)
+REPORT_THUMBNAIL_SIZE = (400, 300)
+METRICS_DIR = "metrics"
+# Rewritten every METRICS_FLUSH_INTERVAL seconds for node_exporter's textfile collector
+METRICS_FILE = os.path.join(METRICS_DIR, "autotest.prom")
+# Also serve the metrics at http://<host>:<port>/metrics when set; 0 disables the endpoint
+METRICS_PORT = int(os.environ.get("AUTOTEST_METRICS_PORT") or 0)
+METRICS_FLUSH_INTERVAL = 15
+METRICS_RATE_WINDOW = 60
+METRICS_DISK_INTERVAL = 60
+METRICS_DISK_DIRS = [SCREENSHOT_DIR, SCREENCAST_DIR, TRACES_DIR, RESULTS_DIR, RECORDINGS_DIR, BASELINE_DIR]
+METRICS_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+METRICS_RUN_BUCKETS = (30, 60, 300, 900, 1800, 3600, 2 * 3600, 4 * 3600)
+LOAD_BACKENDS = ["browser", "context", "http"]
+LOAD_HTTP_RESOURCE_TYPES = {"Document", "XHR", "Fetch"}
+DRIVER_CACHE_MAX_AGE = timedelta(days=1)
+BENCH_FIXTURE_DIR = os.path.join("benchmarks", "fixture")
+BENCH_RESULTS_DIR = os.path.join("benchmarks", "results")
+BENCH_REGRESSION_THRESHOLD = 0.1
+# A step is slower when it took DIFF_DURATION_RATIO times as long and at least DIFF_DURATION_MIN_SECONDS more
+DIFF_DURATION_RATIO = 1.5
+DIFF_DURATION_MIN_SECONDS = 1.0
+DIFF_KEY = ["test_name", "unit", "occurrence", "step_index"]
+# Standard sequence run against the fixture site; placeholders come from the benchmark's CSV row
+BENCH_STEPS = [
+    {"action": "visit", "url": "{{base_url}}/index.html"},
+    {"action": "input", "selector_type": "id", "selector_value": "email", "text": "{{LoginEmail}}"},
+    {"action": "input", "selector_type": "placeholder", "selector_value": "Password", "text": "{{Password}}"},
+    {"action": "click", "selector_type": "id", "selector_value": "sign-in"},
+    {"action": "assert", "text": "Welcome {{LoginEmail}}"},
+    {"action": "select_dropdown", "selector_type": "id", "selector_value": "actions-button", "text": "Export"},
+    {"action": "scroll", "x": 0, "y": 500},
+]
 os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+os.makedirs(SCREENCAST_DIR, exist_ok=True)
+os.makedirs(TRACES_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
+os.makedirs(CSV_ARCHIVE_DIR, exist_ok=True)
+os.makedirs(PARTIAL_RESULTS_DIR, exist_ok=True)
+os.makedirs(ROLLUPS_DIR, exist_ok=True)
+os.makedirs(BASELINE_DIR, exist_ok=True)
+os.makedirs(RECORDINGS_DIR, exist_ok=True)
+os.makedirs(LOAD_REPORTS_DIR, exist_ok=True)
+os.makedirs(REPORTS_DIR, exist_ok=True)
+os.makedirs(METRICS_DIR, exist_ok=True)
 
 def get_image_scale(img_path, target_width_px=200, target_height_px=200):
     """Calculate scaling factors for image resizing"""
@@ -49,6 +237,8 @@ def get_image_scale(img_path, target_width_px=200, target_height_px=200):
 def insert_image_or_text(worksheet, row_num, col_num, cell_value, cell_format):
     """Insert an image into a worksheet cell if possible, otherwise write text."""
     worksheet.set_column(col_num, col_num, 30)
+    if isinstance(cell_value, str) and cell_value.startswith(SCREENCAST_PREFIX):
+        cell_value = screencast_still(cell_value) or cell_value
     if isinstance(cell_value, str):
         if os.path.exists(cell_value):
             try:
@@ -135,14 +325,59 @@ def identify_selectors_from_html(html_tag):
     if element.get('placeholder'):
         selectors['placeholder'] = element.get('placeholder')
 
+    # Text-based selectors, resolved in the page
+    if element.get('aria-label'):
+        selectors['label'] = element.get('aria-label')
+    text = " ".join(element.get_text().split())
+    if text and len(text) <= 60:
+        selectors['text'] = text
+        # Same role the in-page lookup derives, so the suggestion resolves to this element
+        explicit = (element.get('role') or "").split()
+        role = explicit[0] if explicit else next(
+            (name for name, selector in IMPLICIT_ROLES.items() if element.css.match(selector)), None)
+        if role:
+            selectors['role'] = f"{role}:{text}"
+
     return selectors
 
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None if missing; used to invalidate caches"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+@st.cache_data(show_spinner=False, max_entries=2000)
+def _read_json_cached(path, signature):
+    """Parse a JSON file; the signature argument keys the cache to the file's mtime"""
+    with open(path, "r") as file:
+        return json.load(file)
+
+def read_json_file(path, default=None):
+    """Load a JSON file through the mtime-keyed cache"""
+    signature = file_signature(path)
+    if signature is None:
+        return default
+    return _read_json_cached(path, signature)
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def parse_csv_bytes(data):
+    """Parse uploaded CSV content once per distinct upload"""
+    return pd.read_csv(io.BytesIO(data))
+
+def archive_csv_upload(data, name):
+    """Keep an uploaded CSV under results/csv so saved results can point at the exact data they ran with"""
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    path = os.path.join(CSV_ARCHIVE_DIR, f"{digest}_{os.path.basename(name)}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
 def load_test_cases():
     """Load saved test cases from JSON file"""
-    if os.path.exists(TEST_CASES_FILE):
-        with open(TEST_CASES_FILE, "r") as file:
-            return json.load(file)
-    return []
+    return read_json_file(TEST_CASES_FILE, default=[])
 
 def save_test_cases(test_cases):
     """Save test cases to JSON file"""
@@ -151,31 +386,502 @@ def save_test_cases(test_cases):
 
 def load_scheduled_tests():
     """Load scheduled tests from JSON file"""
-    if os.path.exists(SCHEDULED_TESTS_FILE):
-        with open(SCHEDULED_TESTS_FILE, "r") as file:
-            return json.load(file)
-    return []
+    return read_json_file(SCHEDULED_TESTS_FILE, default=[])
 
 def save_scheduled_tests(scheduled_tests):
     """Save scheduled tests to JSON file"""
     with open(SCHEDULED_TESTS_FILE, "w") as file:
         json.dump(scheduled_tests, file, indent=4)
 
+def resolve_chrome_binaries(refresh=False):
+    """Resolve chromedriver and Chrome once via Selenium Manager and cache the paths on disk"""
+    cached = {} if refresh else read_json_file(DRIVER_CACHE_FILE, default={})
+    if cached:
+        resolved_at = datetime.fromisoformat(cached.get("resolved_at", "1970-01-01T00:00:00"))
+        fresh = datetime.now() - resolved_at < DRIVER_CACHE_MAX_AGE
+        if fresh and os.path.exists(cached.get("driver_path") or ""):
+            return cached
+
+    paths = SeleniumManager().binary_paths(["--browser", "chrome"])
+    if not paths.get("driver_path"):
+        raise RuntimeError(f"Selenium Manager could not resolve chromedriver: {paths.get('message', paths)}")
+    cached = {
+        "driver_path": paths["driver_path"],
+        "browser_path": paths.get("browser_path") or None,
+        "resolved_at": datetime.now().isoformat(),
+    }
+    with open(DRIVER_CACHE_FILE, "w") as f:
+        json.dump(cached, f, indent=2)
+    return cached
+
+class SharedServiceChrome(webdriver.Remote):
+    """Chrome session on the shared chromedriver service; quit() ends the session but keeps the service"""
+
+    def get_log(self, log_type):
+        return self.execute(Command.GET_LOG, {"type": log_type})["value"]
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            manager = getattr(self, "_service_manager", None)
+            if manager is not None:
+                self._service_manager = None
+                manager.release(self._service)
+
+class DriverServiceManager:
+    """One long-lived chromedriver process serving many browser sessions, restarted if it dies.
+
+    Sessions are counted per service. When Chrome no longer matches the cached
+    chromedriver a new service is started beside the old one, which is only
+    stopped once its last session has quit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.service = None
+        self.binaries = None
+        self.starts = 0
+        self.sessions = {}
+
+    @staticmethod
+    def _alive(service):
+        process = getattr(service, "process", None)
+        return process is not None and process.poll() is None and service.is_connectable()
+
+    def _stop_service(self, service):
+        self.sessions.pop(service, None)
+        try:
+            service.stop()
+        except Exception as e:
+            print(f"Error stopping chromedriver service: {e}")
+
+    def _checkout(self, replace=None):
+        """Service to open a session on, counted as in use; replaces `replace` or a dead service first"""
+        with self.lock:
+            stale = self.service is not None and self.service is replace
+            if stale or not self._alive(self.service):
+                previous = self.service
+                self.binaries = resolve_chrome_binaries(refresh=stale)
+                service = ChromeService(executable_path=self.binaries["driver_path"])
+                service.start()
+                self.service = service
+                self.starts += 1
+                # A retired service keeps running for the sessions still on it
+                if previous is not None and (not self.sessions.get(previous) or not self._alive(previous)):
+                    self._stop_service(previous)
+            self.sessions[self.service] = self.sessions.get(self.service, 0) + 1
+            return self.service
+
+    def release(self, service):
+        """A session on `service` ended; stops a retired service once it has none left"""
+        with self.lock:
+            self.sessions[service] = self.sessions.get(service, 0) - 1
+            if self.sessions[service] <= 0 and service is not self.service:
+                self._stop_service(service)
+
+    def _new_session(self, service, options):
+        if self.binaries.get("browser_path") and not options.binary_location:
+            options.binary_location = self.binaries["browser_path"]
+        executor = ChromiumRemoteConnection(
+            remote_server_addr=service.service_url,
+            vendor_prefix="goog",
+            browser_name="chrome",
+            ignore_proxy=getattr(options, "_ignore_local_proxy", False),
+        )
+        return SharedServiceChrome(command_executor=executor, options=options)
+
+    def new_driver(self, options):
+        replace = None
+        for attempt in range(2):
+            service = self._checkout(replace)
+            try:
+                driver = self._new_session(service, options)
+            except SessionNotCreatedException as e:
+                self.release(service)
+                if attempt:
+                    raise
+                if any(marker in str(e).lower() for marker in DRIVER_VERSION_MISMATCH):
+                    print(f"chromedriver does not match Chrome, re-resolving: {e}")
+                    replace = service
+                else:
+                    # Usually a transient launch failure under load; the service and its sessions are fine
+                    print(f"Session not created, retrying: {e}")
+                continue
+            except Exception:
+                self.release(service)
+                if attempt or self._alive(service):
+                    raise
+                print("chromedriver service died, restarting")
+                continue
+            driver._service_manager = self
+            driver._service = service
+            return driver
+
+    def stop(self):
+        with self.lock:
+            services = set(self.sessions)
+            if self.service is not None:
+                services.add(self.service)
+            for service in services:
+                self._stop_service(service)
+            self.service = None
+
+@st.cache_resource
+def get_driver_service_manager():
+    """Process-wide chromedriver service shared by every run and recording"""
+    manager = DriverServiceManager()
+    atexit.register(manager.stop)
+    return manager
+
+def create_chrome_driver(options):
+    """Start a Chrome session on the shared service, falling back to a private chromedriver"""
+    try:
+        return get_driver_service_manager().new_driver(options)
+    except Exception as e:
+        print(f"Shared chromedriver service unavailable, starting a dedicated one: {e}")
+        return webdriver.Chrome(service=ChromeService(), options=options)
+
+def find_profile_processes(profile_dir):
+    """PIDs of browser processes started with the given --user-data-dir"""
+    marker = f"--user-data-dir={profile_dir}"
+    pids = []
+    if psutil is not None:
+        for proc in psutil.process_iter(["pid", "cmdline"]):
+            if marker in (proc.info.get("cmdline") or []):
+                pids.append(proc.info["pid"])
+        return pids
+    if os.path.isdir("/proc"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    args = f.read().decode(errors="ignore").split("\0")
+            except OSError:
+                continue
+            if marker in args:
+                pids.append(int(entry))
+    return pids
+
+def kill_process_tree(pid):
+    """Forcefully terminate a process and all of its children"""
+    if psutil is not None:
+        try:
+            parent = psutil.Process(pid)
+            procs = parent.children(recursive=True) + [parent]
+        except psutil.Error:
+            return
+        for proc in procs:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+        psutil.wait_procs(procs, timeout=5)
+        return
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+
+def kill_profile_browsers(profile_dir):
+    """Kill every Chrome process (and its renderers) using the given profile directory"""
+    pids = find_profile_processes(profile_dir)
+    for pid in pids:
+        kill_process_tree(pid)
+    return len(pids)
+
+class RunWatch:
+    """Deadlines of one run_test_case iteration as tracked by the watchdog"""
+
+    def __init__(self, profile_dir, run_deadline, step_deadline, kill=None):
+        self.profile_dir = profile_dir
+        self.kill = kill
+        self.run_deadline = run_deadline
+        self.step_deadline = step_deadline
+        self.step_started = None
+        self.reason = None
+
+    def start_step(self, step_deadline=None):
+        self.step_started = time.monotonic()
+        if step_deadline:
+            self.step_deadline = step_deadline
+
+    def overdue(self, now):
+        if self.run_deadline is not None and now > self.run_deadline:
+            return "run deadline exceeded"
+        if self.step_started is not None and now - self.step_started > self.step_deadline:
+            return f"step exceeded {self.step_deadline:.0f}s"
+        return None
+
+def pid_alive(pid):
+    """Whether a process exists and has not exited (zombies count as exited)"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def new_profile_dir():
+    """Temporary Chrome profile directory marked with the pid of the process that owns it"""
+    profile_dir = tempfile.mkdtemp(prefix=PROFILE_PREFIX)
+    with open(os.path.join(profile_dir, PROFILE_OWNER_FILE), "w") as f:
+        f.write(str(os.getpid()))
+    return profile_dir
+
+def profile_owner(profile_dir):
+    """pid recorded in a profile by new_profile_dir, or None"""
+    try:
+        with open(os.path.join(profile_dir, PROFILE_OWNER_FILE)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+class RunWatchdog:
+    """Kills browsers of runs that overrun their deadlines, reaps orphaned Chrome profiles and prunes old screencasts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = set()
+        self.protected = set()
+        self.last_reap = 0.0
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def register(self, profile_dir, deadline=None, step_deadline=STEP_DEADLINE, kill=None):
+        """Watch a run; an overdue run is stopped with kill() or else by killing its profile's browsers"""
+        run_deadline = time.monotonic() + RUN_DEADLINE
+        watch = RunWatch(profile_dir, min(run_deadline, deadline) if deadline else run_deadline, step_deadline, kill)
+        with self.lock:
+            self.runs.add(watch)
+        return watch
+
+    def unregister(self, watch):
+        with self.lock:
+            self.runs.discard(watch)
+
+    def protect(self, profile_dir, protected=True):
+        """Exempt a long-lived browser's profile (e.g. the context host) from reaping"""
+        with self.lock:
+            if protected:
+                self.protected.add(profile_dir)
+            else:
+                self.protected.discard(profile_dir)
+
+    def _loop(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            try:
+                self.enforce()
+                if time.monotonic() - self.last_reap > REAP_INTERVAL:
+                    self.reap_orphans()
+                    prune_screencasts()
+            except Exception as e:
+                print(f"Watchdog error: {e}")
+
+    def enforce(self):
+        now = time.monotonic()
+        with self.lock:
+            runs = list(self.runs)
+        for watch in runs:
+            reason = watch.overdue(now) if watch.reason is None else None
+            if reason:
+                watch.reason = reason
+                # The blocked WebDriver call fails once its browser is gone, unwinding the run normally
+                if watch.kill is not None:
+                    watch.kill()
+                    print(f"Watchdog: {reason}, closed the run's browser context")
+                else:
+                    killed = kill_profile_browsers(watch.profile_dir)
+                    print(f"Watchdog: {reason}, killed {killed} browser process(es) for {watch.profile_dir}")
+
+    def reap_orphans(self):
+        """Remove stale selenium profiles not owned by a live run, killing any browser still using them.
+
+        Profiles of this process count as live while a run or protect() holds
+        them; profiles of other processes while their owner is alive.
+        """
+        self.last_reap = time.monotonic()
+        with self.lock:
+            active = {watch.profile_dir for watch in self.runs} | self.protected
+        reaped = 0
+        for profile in Path(tempfile.gettempdir()).glob(f"{PROFILE_PREFIX}*"):
+            if str(profile) in active or not profile.is_dir():
+                continue
+            owner = profile_owner(profile)
+            if owner is not None and owner != os.getpid() and pid_alive(owner):
+                continue
+            try:
+                age = time.time() - profile.stat().st_mtime
+            except OSError:
+                continue
+            if age < ORPHAN_PROFILE_AGE:
+                continue
+            kill_profile_browsers(str(profile))
+            shutil.rmtree(profile, ignore_errors=True)
+            reaped += 1
+        if reaped:
+            print(f"Watchdog: reaped {reaped} orphaned browser profile(s)")
+        return reaped
+
+@st.cache_resource
+def get_watchdog():
+    """Process-wide run watchdog"""
+    return RunWatchdog()
+
+def chrome_browser_path():
+    """Chrome executable: the one Selenium Manager resolved, else one on PATH"""
+    browser = resolve_chrome_binaries().get("browser_path")
+    if browser and os.path.exists(browser):
+        return browser
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"):
+        found = shutil.which(name)
+        if found:
+            return found
+    raise RuntimeError("No Chrome executable found for the context host")
+
+class BrowserContextHost:
+    """One long-lived Chrome hosting an isolated browser context per run.
+
+    Contexts are created over the browser's own DevTools websocket. Each run
+    attaches a chromedriver session through debuggerAddress and drives only
+    its context's page, so cookies and storage stay separate per user while
+    the browser process and its startup cost are shared.
+    """
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self.lock = threading.RLock()
+        self.process = None
+        self.socket = None
+        self.profile_dir = None
+        self.debugger_address = None
+        self.message_id = 0
+
+    def _alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _start(self):
+        self.stop()
+        self.profile_dir = new_profile_dir()
+        get_watchdog().protect(self.profile_dir)
+        args = [chrome_browser_path(), "--remote-debugging-port=0", f"--user-data-dir={self.profile_dir}",
+                "--no-first-run", "--no-default-browser-check", "--disable-extensions", "--window-size=1920,1080"]
+        if self.headless:
+            args.append("--headless=new")
+        self.process = subprocess.Popen(args + ["about:blank"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # Chrome writes the chosen port and the browser's websocket path once DevTools is listening
+        port_file = os.path.join(self.profile_dir, "DevToolsActivePort")
+        started = time.monotonic()
+        port_lines = []
+        while len(port_lines) < 2:
+            if self.process.poll() is not None or time.monotonic() - started > CONTEXT_HOST_START_TIMEOUT:
+                raise RuntimeError("Context host Chrome did not start")
+            time.sleep(0.05)
+            if os.path.exists(port_file):
+                with open(port_file) as f:
+                    port_lines = f.read().splitlines()
+        port, browser_path = port_lines[:2]
+        self.debugger_address = f"127.0.0.1:{port}"
+        self.socket = websocket.create_connection(f"ws://{self.debugger_address}{browser_path}", timeout=60,
+                                                  suppress_origin=True)
+
+    def command(self, method, params=None):
+        """Send a browser-level CDP command and return its result"""
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+            self.socket.send(json.dumps({"id": message_id, "method": method, "params": params or {}}))
+            while True:
+                reply = json.loads(self.socket.recv())
+                if reply.get("id") == message_id:
+                    if "error" in reply:
+                        raise RuntimeError(f"{method} failed: {reply['error'].get('message')}")
+                    return reply.get("result", {})
+
+    def open_context(self, proxy_server=None):
+        """Create a fresh browser context with one blank page; returns (context id, target id)"""
+        with self.lock:
+            if not self._alive():
+                self._start()
+            params = {"disposeOnDetach": False}
+            if proxy_server:
+                params["proxyServer"] = proxy_server
+            context_id = self.command("Target.createBrowserContext", params)["browserContextId"]
+            target_id = self.command("Target.createTarget", {"url": "about:blank", "browserContextId": context_id})["targetId"]
+            return context_id, target_id
+
+    def close_context(self, context_id):
+        """Dispose a context, closing its pages and dropping its cookies and storage"""
+        try:
+            self.command("Target.disposeBrowserContext", {"browserContextId": context_id})
+        except Exception as e:
+            print(f"Error closing browser context {context_id}: {e}")
+
+    def stop(self):
+        with self.lock:
+            if self.socket is not None:
+                try:
+                    self.socket.close()
+                except Exception:
+                    pass
+                self.socket = None
+            if self.process is not None:
+                kill_process_tree(self.process.pid)
+                self.process = None
+            if self.profile_dir:
+                get_watchdog().protect(self.profile_dir, protected=False)
+                shutil.rmtree(self.profile_dir, ignore_errors=True)
+                self.profile_dir = None
+
+@st.cache_resource
+def get_context_host(headless=True):
+    """Process-wide context host, one per headless setting"""
+    host = BrowserContextHost(headless)
+    atexit.register(host.stop)
+    return host
+
+def attach_context_driver(host, target_id, perf_logging=False, console=False):
+    """chromedriver session attached to the context host and switched to one context's page"""
+    options = Options()
+    options.debugger_address = host.debugger_address
+    if perf_logging:
+        enable_instrumentation(options, console)
+    driver = create_chrome_driver(options)
+    # Window handles are DevTools target ids
+    handle = next((handle for handle in driver.window_handles if target_id in handle), None)
+    if handle is None:
+        cleanup_driver(driver)
+        raise RuntimeError(f"Context page {target_id} is not visible to chromedriver")
+    driver.switch_to.window(handle)
+    setattr(driver, "_context_target", target_id)
+    setattr(driver, "_debugger_address", host.debugger_address)
+    return driver
+
 def start_recording(url):
     """Launch browser and record user interactions across pages."""
     options = Options()
     options.add_argument("--incognito")
-    profile_dir = tempfile.mkdtemp(prefix="selenium_profile_")
+    profile_dir = new_profile_dir()
+    # A recording can stay open far longer than ORPHAN_PROFILE_AGE
+    get_watchdog().protect(profile_dir)
     options.add_argument(f"--user-data-dir={profile_dir}")
     try:
-        driver = webdriver.Chrome(service=ChromeService(), options=options)
+        driver = create_chrome_driver(options)
     except Exception:
+        get_watchdog().protect(profile_dir, protected=False)
         shutil.rmtree(profile_dir, ignore_errors=True)
         raise
     driver.maximize_window()
     setattr(driver, "_temp_profile_dir", profile_dir)
 
-    recorder_script = """
+    recorder_script = LOCATOR_JS + """
         window.__recordedSteps = JSON.parse(localStorage.getItem('__recordedSteps') || '[]');
         function recordStep(step){
             window.__recordedSteps.push(step);
@@ -221,8 +927,22 @@ def start_recording(url):
                 }
             }
         }
+        function uniqueSelector(type, value){
+            if (!value || value.length > 60) return null;
+            return __ldFind(type, value).filter(__ldVisible).length === 1 ? {type: type, value: value} : null;
+        }
+        function getTextSelector(el){
+            // Text-based selectors survive the layout changes that break generated XPaths
+            if (/^(INPUT|TEXTAREA|SELECT)$/.test(el.tagName)) return uniqueSelector('label', __ldLabelText(el));
+            var target = el.closest('button, a[href], [role], ' + __ldImplicitRoles.menuitem + ', ' + __ldImplicitRoles.option + ', ' + __ldImplicitRoles.tab) || el;
+            var role = __ldRole(target);
+            return (role && uniqueSelector('role', role + ':' + __ldName(target))) || uniqueSelector('text', __ldText(target));
+        }
         function getBestSelector(el){
-            if (el.id) return {type: 'id', value: el.id};
+            // Generated ids (el-id-1234-5, dropdown-menu-8822) change between page loads
+            if (el.id && !/\\d{3,}/.test(el.id)) return {type: 'id', value: el.id};
+            var byText = getTextSelector(el);
+            if (byText) return byText;
             var xp = getXPath(el);
             if (xp) return {type: 'xpath', value: xp};
             if (el.className) return {type: 'class_name', value: el.className.split(' ')[0]};
@@ -274,8 +994,10 @@ def cleanup_driver(driver, profile_dir=None):
         except Exception:
             pass
 
-    if profile_dir and os.path.exists(profile_dir):
-        shutil.rmtree(profile_dir, ignore_errors=True)
+    if profile_dir:
+        get_watchdog().protect(profile_dir, protected=False)
+        if os.path.exists(profile_dir):
+            shutil.rmtree(profile_dir, ignore_errors=True)
 
 def stop_recording(driver, start_url):
     """Stop recording and return recorded steps."""
@@ -304,8 +1026,18 @@ def stop_recording(driver, start_url):
         steps.append(step)
     return steps
 
-def find_element(driver, selector_type, selector_value, index=0, timeout=10):
+def find_element(driver, selector_type, selector_value, index=0, timeout=FIND_ELEMENT_TIMEOUT):
     """Universal element finder with waiting and multiple selector types"""
+    if selector_type in IN_PAGE_SELECTOR_TYPES:
+        # One script call per poll; index counts visible matches only
+        element = WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script(FIND_ELEMENT_SCRIPT, selector_type, selector_value, index) or False)
+        try:
+            WebDriverWait(driver, timeout).until(EC.element_to_be_clickable(element))
+        except Exception:
+            pass
+        return element
+
     selectors = {
         "id": By.ID,
         "name": By.NAME,
@@ -343,6 +1075,536 @@ def find_element(driver, selector_type, selector_value, index=0, timeout=10):
 
     return element
 
+def screenshot_path(timestamp, action):
+    """Unique screenshot filename; runs may execute concurrently in the same millisecond"""
+    return f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}_{uuid.uuid4().hex[:6]}.png"
+
+def screencast_reference(path, marker_id):
+    """Step-log screenshot value pointing at a marker in a run's screencast archive"""
+    return f"{SCREENCAST_PREFIX}{path}#{marker_id}"
+
+def page_websocket(driver):
+    """A DevTools websocket of our own to the page a session drives; recv() blocks until abort()"""
+    address = driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress") \
+        or getattr(driver, "_debugger_address", None)
+    target_id = getattr(driver, "_context_target", None) or driver.current_window_handle.replace("CDwindow-", "")
+    if not address:
+        raise RuntimeError("Browser has no DevTools address")
+    socket = websocket.create_connection(f"ws://{address}/devtools/page/{target_id}", timeout=10,
+                                         suppress_origin=True)
+    socket.settimeout(None)
+    return socket
+
+class ScreencastRecorder:
+    """Records a page's CDP screencast into a zip of JPEG frames plus an index.
+
+    Frames come from Page.startScreencast on the page's own DevTools websocket
+    and are throttled to fps; a reader thread acks them immediately and a
+    writer thread decodes and stores them, so the browser and the run never
+    wait on encoding. mark() notes a step's point in time and returns a
+    reference that screencast_still() turns into a still only when needed.
+    """
+
+    def __init__(self, driver, path, fps=SCREENCAST_FPS, quality=SCREENCAST_QUALITY):
+        self.path = path
+        self.interval = 1.0 / max(fps, 0.1)
+        self.fps = fps
+        self.quality = quality
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.frames = []
+        self.markers = []
+        self.pending = None
+        self.last_kept = 0.0
+        self.queue = queue.Queue()
+        self.message_id = 0
+
+        # A static page sends no frames for long stretches; the reader waits until stop() aborts it
+        self.socket = page_websocket(driver)
+        self.archive = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+        self.writer = threading.Thread(target=self._write_frames, daemon=True)
+        self.writer.start()
+        self.reader = threading.Thread(target=self._read_frames, daemon=True)
+        self.reader.start()
+        width, height = SCREENCAST_MAX_SIZE
+        self._send("Page.startScreencast", {"format": "jpeg", "quality": int(quality),
+                                            "maxWidth": width, "maxHeight": height,
+                                            "everyNthFrame": max(1, round(SCREENCAST_PAINT_FPS / max(fps, 0.1)))})
+
+    def _send(self, method, params=None):
+        with self.send_lock:
+            self.message_id += 1
+            self.socket.send(json.dumps({"id": self.message_id, "method": method, "params": params or {}}))
+
+    def _read_frames(self):
+        while True:
+            try:
+                message = json.loads(self.socket.recv())
+            except Exception:
+                break
+            if message.get("method") != "Page.screencastFrame":
+                continue
+            params = message["params"]
+            try:
+                self._send("Page.screencastFrameAck", {"sessionId": params["sessionId"]})
+            except Exception:
+                break
+            frame = (params.get("metadata", {}).get("timestamp") or time.time(), params["data"])
+            with self.lock:
+                # Frames inside the interval are held back; the newest one is kept so the final state is never lost
+                if frame[0] - self.last_kept >= self.interval:
+                    self._keep(frame)
+                else:
+                    self.pending = frame
+
+    def _keep(self, frame):
+        """Queue a frame for the writer; caller holds the lock"""
+        self.pending = None
+        self.last_kept = frame[0]
+        name = f"frames/{len(self.frames):06d}.jpg"
+        self.frames.append({"name": name, "t": round(frame[0], 3)})
+        self.queue.put((name, frame[1]))
+
+    def _write_frames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            name, data = item
+            frame = base64.b64decode(data)
+            self.archive.writestr(name, frame)
+            get_metrics().inc("autotest_screenshot_bytes_total", len(frame), kind="screencast")
+
+    def mark(self, step_index):
+        """Note the current moment for a step; returns the reference stored as its screenshot"""
+        with self.lock:
+            if self.pending is not None:
+                self._keep(self.pending)
+            marker_id = len(self.markers)
+            self.markers.append({"id": marker_id, "step": step_index, "t": round(time.time(), 3)})
+        return screencast_reference(self.path, marker_id)
+
+    def stop(self):
+        """Stop the screencast, flush queued frames and write the index; returns the archive path"""
+        try:
+            self._send("Page.stopScreencast")
+        except Exception:
+            pass
+        self.socket.abort()
+        self.reader.join(timeout=5)
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+        with self.lock:
+            if self.pending is not None:
+                self._keep(self.pending)
+        self.queue.put(None)
+        self.writer.join()
+        index = {"fps": self.fps, "quality": self.quality, "frames": self.frames, "markers": self.markers}
+        self.archive.writestr("index.json", json.dumps(index))
+        self.archive.close()
+        return self.path
+
+def screencast_still_path(reference):
+    """(archive path, cached still path, marker id) of a screencast reference"""
+    path, _, marker_id = reference[len(SCREENCAST_PREFIX):].rpartition("#")
+    return path, f"{path[:-len('.zip')]}_still_{marker_id}.jpg", marker_id
+
+def prune_screencasts(max_age=SCREENCAST_MAX_AGE):
+    """Drop screencast archives older than max_age, and stills whose archive is gone or that old"""
+    cutoff = time.time() - max_age.total_seconds()
+    entries = [entry for entry in os.scandir(SCREENCAST_DIR) if entry.is_file()]
+    kept = set()
+    for entry in entries:
+        try:
+            if entry.name.endswith(".zip"):
+                if entry.stat().st_mtime >= cutoff:
+                    kept.add(entry.name[:-len(".zip")])
+                else:
+                    os.remove(entry.path)
+        except OSError as e:
+            print(f"Error pruning screencast {entry.path}: {e}")
+    for entry in entries:
+        try:
+            if "_still_" in entry.name and (entry.name.rpartition("_still_")[0] not in kept
+                                            or entry.stat().st_mtime < cutoff):
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Error pruning screencast still {entry.path}: {e}")
+
+def screencast_still(reference):
+    """JPEG still for a screencast reference: the last frame painted before its marker.
+
+    Stills are extracted on first use and cached next to the archive.
+    """
+    path, still_path, marker_id = screencast_still_path(reference)
+    if os.path.exists(still_path):
+        return still_path
+    try:
+        with zipfile.ZipFile(path) as archive:
+            index = json.loads(archive.read("index.json"))
+            marker = next(m for m in index["markers"] if str(m["id"]) == marker_id)
+            frames = [frame for frame in index["frames"] if frame["t"] <= marker["t"]] or index["frames"][:1]
+            if not frames:
+                return None
+            data = archive.read(frames[-1]["name"])
+    except (OSError, KeyError, StopIteration, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error extracting screencast still {reference}: {e}")
+        return None
+    with open(still_path, "wb") as f:
+        f.write(data)
+    return still_path
+
+def screenshot_file(value):
+    """Readable image file for a step's screenshot value (PNG path or screencast reference), or None"""
+    if not isinstance(value, str) or not value:
+        return None
+    if value.startswith(SCREENCAST_PREFIX):
+        return screencast_still(value)
+    return value if os.path.exists(value) else None
+
+def capture_step(driver, step_log, timestamp, screencast=None):
+    """Record what the page shows after a step: a screencast marker, or a full PNG"""
+    if screencast is not None:
+        step_log["screenshot"] = screencast.mark(step_log["step_index"])
+        return
+    screenshot_filename = screenshot_path(timestamp, step_log["action"])
+    driver.save_screenshot(screenshot_filename)
+    get_metrics().record_file("autotest_screenshot_bytes_total", screenshot_filename, kind="png")
+    step_log["screenshot"] = screenshot_filename
+
+# In-page element lookup shared by scripts that must resolve selectors without WebDriver round-trips
+LOCATOR_JS = """
+    function __ldVisible(el){
+        if (!el || !(el instanceof Element)) return false;
+        var style = window.getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return false;
+        return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    }
+    function __ldAttr(name, value){
+        return '[' + name + '="' + CSS.escape(String(value)) + '"]';
+    }
+    function __ldNorm(value){
+        return String(value == null ? '' : value).replace(/\\s+/g, ' ').trim();
+    }
+    function __ldText(el){
+        return __ldNorm(el.innerText || el.textContent);
+    }
+    function __ldByText(value, root){
+        // Innermost elements whose visible text is exactly value, so a click lands on the item itself
+        var target = __ldNorm(value);
+        var matches = Array.prototype.filter.call(root.querySelectorAll('*'), function(el){
+            return !/^(SCRIPT|STYLE|NOSCRIPT|TEMPLATE)$/.test(el.tagName)
+                && __ldNorm(el.textContent).indexOf(target) !== -1 && __ldText(el) === target;
+        });
+        return matches.filter(function(el){
+            return !matches.some(function(other){ return other !== el && el.contains(other); });
+        });
+    }
+    function __ldLabelText(el){
+        if (el.getAttribute('aria-label')) return __ldNorm(el.getAttribute('aria-label'));
+        if (el.getAttribute('aria-labelledby')) {
+            return __ldNorm(el.getAttribute('aria-labelledby').split(/\\s+/).map(function(id){
+                var ref = document.getElementById(id);
+                return ref ? ref.textContent : '';
+            }).join(' '));
+        }
+        if (el.labels && el.labels.length) return __ldText(el.labels[0]);
+        var item = el.closest && el.closest('.el-form-item');
+        var label = item && item.querySelector('.el-form-item__label');
+        return label ? __ldText(label) : '';
+    }
+    function __ldByLabel(value, root){
+        var target = __ldNorm(value);
+        return Array.prototype.filter.call(root.querySelectorAll('input, textarea, select, [aria-label], [aria-labelledby]'), function(el){
+            return __ldLabelText(el) === target;
+        });
+    }
+    var __ldImplicitRoles = """ + json.dumps(IMPLICIT_ROLES) + """;
+    function __ldRole(el){
+        var explicit = el.getAttribute('role');
+        if (explicit) return explicit.split(/\\s+/)[0];
+        for (var role in __ldImplicitRoles) {
+            if (el.matches(__ldImplicitRoles[role])) return role;
+        }
+        return null;
+    }
+    function __ldName(el){
+        var label = __ldLabelText(el);
+        if (label) return label;
+        if (/^(INPUT|TEXTAREA|SELECT)$/.test(el.tagName)) {
+            if (/^(button|submit|reset)$/.test(el.type)) return __ldNorm(el.value);
+            return __ldNorm(el.getAttribute('placeholder') || el.getAttribute('title'));
+        }
+        return __ldText(el) || __ldNorm(el.getAttribute('title'));
+    }
+    function __ldByRole(value, root){
+        // "role" or "role:accessible name", e.g. "button:Save" or "menuitem:Export"
+        var sep = String(value).indexOf(':');
+        var role = (sep === -1 ? String(value) : String(value).slice(0, sep)).trim();
+        var name = sep === -1 ? null : __ldNorm(String(value).slice(sep + 1));
+        var selector = __ldAttr('role', role) + (__ldImplicitRoles[role] ? ', ' + __ldImplicitRoles[role] : '');
+        return Array.prototype.filter.call(root.querySelectorAll(selector), function(el){
+            return __ldRole(el) === role && (name === null || __ldName(el) === name);
+        });
+    }
+    function __ldWithin(value, root){
+        // "type=value >> type=value ...": each part is searched inside the matches of the previous one
+        var scopes = [root];
+        String(value).split(' >> ').forEach(function(part){
+            var sep = part.indexOf('='), next = [];
+            scopes.forEach(function(scope){
+                __ldFind(part.slice(0, sep).trim(), part.slice(sep + 1).trim(), scope).forEach(function(el){
+                    if (next.indexOf(el) === -1) next.push(el);
+                });
+            });
+            scopes = next;
+        });
+        return scopes;
+    }
+    function __ldFind(type, value, root){
+        root = root || document;
+        var found = [];
+        switch (type) {
+            case 'id':
+                var byId = document.getElementById(value);
+                found = byId && (root === document || root.contains(byId)) ? [byId] : [];
+                break;
+            case 'name': found = root.querySelectorAll(__ldAttr('name', value)); break;
+            case 'placeholder': found = root.querySelectorAll(__ldAttr('placeholder', value)); break;
+            case 'css_selector': found = root.querySelectorAll(value); break;
+            case 'class_name': found = root.getElementsByClassName(value); break;
+            case 'tag_name': found = root.getElementsByTagName(value); break;
+            case 'link_text':
+            case 'partial_link_text':
+                found = Array.prototype.filter.call(root.querySelectorAll('a'), function(a){
+                    var text = (a.innerText || '').trim();
+                    return type === 'link_text' ? text === value : text.indexOf(value) !== -1;
+                });
+                break;
+            case 'xpath':
+                var snapshot = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+                for (var i = 0; i < snapshot.snapshotLength; i++) found.push(snapshot.snapshotItem(i));
+                break;
+            case 'text': found = __ldByText(value, root); break;
+            case 'label': found = __ldByLabel(value, root); break;
+            case 'role': found = __ldByRole(value, root); break;
+            case 'within': found = __ldWithin(value, root); break;
+        }
+        return Array.prototype.slice.call(found);
+    }
+"""
+
+FIND_ELEMENT_SCRIPT = LOCATOR_JS + """
+    return __ldFind(arguments[0], arguments[1]).filter(__ldVisible)[arguments[2]] || null;
+"""
+
+SELECT_OPTION_SCRIPT = LOCATOR_JS + """
+    var optionSelector = arguments[0], expected = __ldNorm(arguments[1]), timeoutMs = arguments[2], pollMs = arguments[3];
+    var done = arguments[arguments.length - 1], started = Date.now();
+    function poll(){
+        var options = Array.prototype.filter.call(document.querySelectorAll(optionSelector), __ldVisible);
+        var match = options.filter(function(el){ return __ldText(el) === expected; })[0] || null;
+        if (match || Date.now() - started >= timeoutMs) {
+            done({element: match, visible: options.slice(0, 20).map(__ldText), elapsed_ms: Date.now() - started});
+        } else {
+            setTimeout(poll, pollMs);
+        }
+    }
+    poll();
+"""
+
+ASSERTION_SCRIPT = LOCATOR_JS + """
+    var checks = arguments[0], timeoutMs = arguments[1], pollMs = arguments[2], done = arguments[arguments.length - 1];
+    var started = Date.now();
+    function compare(actual, op, expected){
+        switch (op || '==') {
+            case '==': return actual === expected;
+            case '!=': return actual !== expected;
+            case '>=': return actual >= expected;
+            case '<=': return actual <= expected;
+            case '>': return actual > expected;
+            case '<': return actual < expected;
+        }
+        return false;
+    }
+    function evaluate(check){
+        var text = document.body ? document.body.innerText : '';
+        var result = {type: check.type, passed: false, actual: null};
+        try {
+            if (check.type === 'text_present' || check.type === 'text_absent') {
+                var present = text.indexOf(check.value) !== -1;
+                result.actual = present ? 'present' : 'absent';
+                result.passed = check.type === 'text_present' ? present : !present;
+            } else if (check.type === 'count') {
+                var elements = __ldFind(check.selector_type, check.selector_value);
+                if (check.visible_only !== false) elements = elements.filter(__ldVisible);
+                result.actual = elements.length;
+                result.passed = compare(elements.length, check.op, Number(check.expected));
+            } else if (check.type === 'attribute') {
+                var element = __ldFind(check.selector_type, check.selector_value)[check.index || 0];
+                result.actual = element ? (check.name === 'value' ? element.value : element.getAttribute(check.name)) : null;
+                result.passed = element !== undefined && String(result.actual) === String(check.expected);
+            } else if (check.type === 'regex') {
+                var match = text.match(new RegExp(check.pattern, check.flags || ''));
+                result.actual = match ? match[0] : null;
+                result.passed = !!match;
+            } else if (check.type === 'url') {
+                result.actual = window.location.href;
+                result.passed = new RegExp(check.pattern).test(window.location.href);
+            } else {
+                result.error = 'Unknown assertion type';
+            }
+        } catch (e) {
+            result.error = String(e);
+        }
+        return result;
+    }
+    function poll(){
+        var results = checks.map(evaluate);
+        var allPassed = results.every(function(r){ return r.passed; });
+        if (allPassed || Date.now() - started >= timeoutMs) {
+            done({passed: allPassed, elapsed_ms: Date.now() - started, results: results});
+        } else {
+            setTimeout(poll, pollMs);
+        }
+    }
+    poll();
+"""
+
+FILL_FORM_SCRIPT = LOCATOR_JS + """
+    var fields = arguments[0], timeoutMs = arguments[1], pollMs = arguments[2], done = arguments[arguments.length - 1];
+    var started = Date.now(), next = 0;
+    function nativeSetter(el){
+        var proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype
+                  : el instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+                  : HTMLInputElement.prototype;
+        return Object.getOwnPropertyDescriptor(proto, 'value').set;
+    }
+    function fill(el, value){
+        el.focus();
+        // Bypass the framework's own setter so Vue sees a genuine input event
+        nativeSetter(el).call(el, value);
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+        el.blur();
+    }
+    function poll(){
+        // Fill in order; later fields may only appear once earlier ones have values
+        while (next < fields.length) {
+            var field = fields[next];
+            var el = __ldFind(field.selector_type, field.selector_value)[field.index || 0];
+            if (!el || !__ldVisible(el) || el.disabled) break;
+            fill(el, field.text);
+            next++;
+        }
+        if (next >= fields.length || Date.now() - started >= timeoutMs) {
+            done({filled: next, missing: fields.slice(next).map(function(f){ return f.selector_value; }), elapsed_ms: Date.now() - started});
+        } else {
+            setTimeout(poll, pollMs);
+        }
+    }
+    poll();
+"""
+
+def run_page_script(driver, script, timeout, *args):
+    """execute_async_script for a polling script that gives up after `timeout` seconds.
+
+    If the page navigates or reloads mid-poll the script's document is gone
+    and WebDriver raises; the script then runs once more in the new document.
+    Raises WebDriverException if that fails too or the script hung.
+    """
+    driver.set_script_timeout(timeout + 5)
+    try:
+        return driver.execute_async_script(script, *args)
+    except TimeoutException:
+        raise
+    except WebDriverException as e:
+        print(f"Page script interrupted, retrying in the new document: {e.msg}")
+        return driver.execute_async_script(script, *args)
+
+def fill_form(driver, fields, timeout=FILL_FORM_TIMEOUT, poll_interval=ASSERT_POLL_INTERVAL):
+    """Locate and set every field in one script call, firing input/change events for Vue"""
+    try:
+        return run_page_script(driver, FILL_FORM_SCRIPT, timeout, fields, int(timeout * 1000), int(poll_interval * 1000))
+    except WebDriverException as e:
+        return {"filled": 0, "missing": [field.get("selector_value") for field in fields], "elapsed_ms": None,
+                "error": e.msg or str(e)}
+
+def merge_input_steps(steps):
+    """Collapse runs of two or more consecutive input steps into fill_form steps.
+
+    A run ends at any input step that waits afterwards; that wait moves to the
+    merged step so timing between the form and the next action is unchanged.
+    """
+    merged = []
+    run = []
+
+    def flush():
+        if len(run) >= 2:
+            merged.append({
+                "action": "fill_form",
+                "fields": [
+                    {"selector_type": s["selector_type"], "selector_value": s["selector_value"],
+                     "index": s.get("index", 0), "text": s.get("text", "")}
+                    for s in run
+                ],
+                "wait": run[-1].get("wait", 0),
+            })
+        else:
+            merged.extend(run)
+        run.clear()
+
+    for step in steps:
+        if step.get("action") == "input":
+            run.append(step)
+            if step.get("wait", 0):
+                flush()
+        else:
+            flush()
+            merged.append(step)
+    flush()
+    return merged
+
+def substitute_in_check(value, csv_row):
+    """Apply placeholder substitution to every string inside an assertion check"""
+    if isinstance(value, dict):
+        return {k: substitute_in_check(v, csv_row) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute_in_check(v, csv_row) for v in value]
+    return substitute_placeholders(value, csv_row)
+
+def assertion_checks(step, csv_row=None):
+    """Checks for an assert step; a plain text value means 'text_present'"""
+    checks = step.get("checks") or [{"type": "text_present", "value": step.get("text", "")}]
+    return [substitute_in_check(check, csv_row) for check in checks]
+
+def run_assertions(driver, checks, timeout=ASSERT_TIMEOUT, poll_interval=ASSERT_POLL_INTERVAL):
+    """Evaluate checks inside the page in one script call, polling until they all hold or time out"""
+    try:
+        return run_page_script(driver, ASSERTION_SCRIPT, timeout, checks, int(timeout * 1000), int(poll_interval * 1000))
+    except WebDriverException as e:
+        error = f"page script failed: {e.msg or e}"
+        return {"passed": False, "results": [{"passed": False, "actual": None, "error": error} for _ in checks]}
+
+def describe_check(result, check):
+    """Short human-readable outcome of one assertion"""
+    target = check.get("value") or check.get("pattern") or check.get("selector_value") or ""
+    detail = f" ({result['error']})" if result.get("error") else f" (actual: {result.get('actual')})"
+    return f"{check.get('type')} '{target}'" + ("" if result.get("passed") else detail)
+
+def tag_csv_row(step_log, csv_row):
+    """Label a log with the CSV row it ran for (LoginEmail and row_index)"""
+    if csv_row is None:
+        return step_log
+    if "LoginEmail" in csv_row:
+        step_log["LoginEmail"] = csv_row["LoginEmail"]
+    row_index = getattr(csv_row, "name", None)
+    if isinstance(row_index, (int, np.integer)):
+        step_log["row_index"] = int(row_index)
+    return step_log
+
 def substitute_placeholders(text, csv_row):
     """Replace {{placeholders}} with values from CSV row"""
     if not isinstance(text, str) or csv_row is None:
@@ -353,14 +1615,17 @@ def substitute_placeholders(text, csv_row):
         text = text.replace(f"{{{{{placeholder}}}}}", str(value) if value and pd.notna(value) else '')
     return text
 
-def capture_notification(driver):
-    """Capture and close any notifications/alerts"""
+def capture_notification(driver, timeout=NOTIFICATION_TIMEOUT, observe=None):
+    """Capture and close any notifications/alerts; observe(seconds or None) gets how long the first one took"""
+    started = time.perf_counter()
     try:
-        WebDriverWait(driver, 3).until(
+        WebDriverWait(driver, timeout).until(
             EC.presence_of_all_elements_located(
                 (By.XPATH, "//*[contains(@class, 'Vue-Toastification__toast-body') or @role='alert' or contains(@class, 'el-form-item__error')]")
             )
         )
+        if observe:
+            observe(time.perf_counter() - started)
         elements = driver.find_elements(By.XPATH, "//*[contains(@class, 'Vue-Toastification__toast-body') or @role='alert' or contains(@class, 'el-form-item__error')]")
         notifications = [el.text.strip() for el in elements if el.text.strip()]
         time.sleep(2)
@@ -378,126 +1643,1509 @@ def capture_notification(driver):
                 pass
         return notifications
     except:
+        if observe:
+            observe(None)
         return []
 
-def save_test_result(result_data, test_name):
-    """Save test results to JSON file with timestamp"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{test_name}_{timestamp}.json"
-    os.makedirs(RESULTS_DIR, exist_ok=True)
-    filepath = os.path.join(RESULTS_DIR, filename)
-    
-    full_data = {
-        "test_name": test_name,
-        "timestamp": datetime.now().isoformat(),
-        "logs": result_data
-    }
-    
-    with open(filepath, "w") as f:
-        json.dump(full_data, f, indent=2)
-    
-    return filepath
+# Largest Contentful Paint is only observable from inside the page, so record it on every document
+LCP_OBSERVER_SCRIPT = """
+    window.__ldLcp = null;
+    try {
+        new PerformanceObserver(function(list){
+            list.getEntries().forEach(function(entry){
+                window.__ldLcp = entry.renderTime || entry.loadTime || entry.startTime;
+            });
+        }).observe({type: 'largest-contentful-paint', buffered: true});
+    } catch (e) {}
+"""
 
-def get_historical_results():
-    """Load all historical test results"""
-    results = []
-    if os.path.exists(RESULTS_DIR):
-        for filename in sorted(os.listdir(RESULTS_DIR), reverse=True):
-            if filename.endswith(".json"):
-                filepath = os.path.join(RESULTS_DIR, filename)
-                try:
-                    with open(filepath, "r") as f:
-                        result_data = json.load(f)
-                        # Extract test name and timestamp from filename
-                        parts = filename.rsplit("_", 1)
-                        test_name = parts[0]
-                        timestamp_str = parts[1].replace(".json", "")
-                        
-                        try:
-                            timestamp = datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                        except ValueError:
-                            timestamp = datetime.fromtimestamp(os.path.getmtime(filepath))
-                        
-                        results.append({
-                            "filename": filename,
-                            "filepath": filepath,
-                            "test_name": test_name,
-                            "timestamp": timestamp,
-                            "data": result_data
-                        })
-                except Exception as e:
-                    print(f"Error loading result file {filename}: {e}")
-    return results
+NAVIGATION_TIMING_SCRIPT = """
+    var nav = performance.getEntriesByType('navigation')[0];
+    if (!nav) { return {time_origin: performance.timeOrigin, lcp_ms: window.__ldLcp}; }
+    return {
+        time_origin: performance.timeOrigin,
+        page: nav.name,
+        ttfb_ms: nav.responseStart,
+        dom_content_loaded_ms: nav.domContentLoadedEventEnd,
+        load_ms: nav.loadEventEnd,
+        transfer_bytes: nav.transferSize,
+        lcp_ms: window.__ldLcp
+    };
+"""
 
-def run_scheduled_test(test_name, headless=True, csv_path=None):
-    """Execute a scheduled test in background with optional CSV data"""
-    test_cases = load_test_cases()
-    test_case = next((tc for tc in test_cases if tc["name"] == test_name), None)
-    
-    if not test_case:
-        print(f"Test case {test_name} not found")
-        return
-    
-    logs_output = []
-    
+TIME_ORIGIN_SCRIPT = "return performance.timeOrigin;"
+
+def document_time_origin(driver):
+    """performance.timeOrigin of the current document (it changes with every new document), or None"""
     try:
-        if csv_path and os.path.exists(csv_path):
-            csv_data = pd.read_csv(csv_path)
-            for idx, row in csv_data.iterrows():
-                user_id = row.get("LoginEmail", f"Row {idx+1}")
-                print(f"Running scheduled test '{test_name}' for '{user_id}'")
-                logs = list(run_test_case(test_case, headless=headless, repeat=1, csv_row=row))
-                logs_output.extend(logs)
-        else:
-            print(f"Running scheduled test '{test_name}'")
-            logs = list(run_test_case(test_case, headless=headless, repeat=1))
-            logs_output.extend(logs)
-        
-        # Save the result
-        result_data = {
-            "test_name": test_name,
-            "timestamp": datetime.now().isoformat(),
-            "logs": logs_output,
-            "csv_used": csv_path if csv_path else None
-        }
-        
-        save_test_result(result_data, test_name)
-        print(f"Completed scheduled test for {test_name}")
-    except Exception as e:
-        print(f"Error running scheduled test: {e}")
+        return driver.execute_script(TIME_ORIGIN_SCRIPT)
+    except Exception:
+        return None
 
-def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
-    """Execute a test case and yield step results"""
-    logs_output = []
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+PERFORMANCE_METRIC_NAMES = ["TaskDuration", "ScriptDuration", "LayoutDuration", "RecalcStyleDuration", "JSHeapUsedSize", "Nodes"]
+
+def enable_instrumentation(options, console=False):
+    """Turn on chromedriver's performance log, which carries the CDP Network events, and optionally the console log"""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL", "browser": "ALL"} if console else {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+def start_instrumentation(driver):
+    """Enable the CDP domains used for per-step metrics on a fresh session"""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Performance.enable", {"timeDomain": "timeTicks"})
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": LCP_OBSERVER_SCRIPT})
+
+def drain_network_events(driver):
+    """Return and clear the CDP Network events buffered since the last call"""
+    events = []
+    # A session attached to the context host also logs other contexts' pages
+    target = getattr(driver, "_context_target", None)
+    for entry in driver.get_log("performance"):
+        try:
+            logged = json.loads(entry["message"])
+            message = logged["message"]
+        except (KeyError, ValueError):
+            continue
+        if target and logged.get("webview") not in (None, target):
+            continue
+        if message.get("method", "").startswith("Network."):
+            events.append(message)
+    return events
+
+def summarise_network(events, slowest=5):
+    """Request count, bytes, failures and the slowest XHR/fetch calls from CDP Network events"""
+    requests = {}
+    for event in events:
+        params = event.get("params", {})
+        request_id = params.get("requestId")
+        if request_id is None:
+            continue
+        request = requests.setdefault(request_id, {"bytes": 0, "failed": False})
+        method = event["method"]
+        if method == "Network.requestWillBeSent":
+            request.update({
+                "url": params["request"]["url"],
+                "method": params["request"]["method"],
+                "type": params.get("type", ""),
+                "start": params.get("timestamp"),
+            })
+        elif method == "Network.responseReceived":
+            request["status"] = params["response"].get("status")
+            request["type"] = params.get("type", request.get("type", ""))
+        elif method == "Network.loadingFinished":
+            request["end"] = params.get("timestamp")
+            request["bytes"] = params.get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed":
+            request["end"] = params.get("timestamp")
+            request["failed"] = True
+
+    sent = [r for r in requests.values() if "url" in r]
+    for request in sent:
+        if request.get("start") is not None and request.get("end") is not None:
+            request["duration_ms"] = round((request["end"] - request["start"]) * 1000, 1)
+    xhrs = sorted(
+        (r for r in sent if r.get("type") in ("XHR", "Fetch") and "duration_ms" in r),
+        key=lambda r: r["duration_ms"],
+        reverse=True,
+    )
+    return {
+        "request_count": len(sent),
+        "bytes": int(sum(r["bytes"] for r in sent)),
+        "failed_requests": sum(1 for r in sent if r["failed"]),
+        "slowest_xhrs": [
+            {k: r.get(k) for k in ("method", "url", "status", "duration_ms", "bytes")} for r in xhrs[:slowest]
+        ],
+    }
+
+def collect_step_metrics(driver, events, time_origin=None):
+    """Navigation Timing, LCP, CDP Performance metrics and a network summary for one step.
+
+    time_origin is the document's timeOrigin before the step; when it is
+    unchanged the step stayed on the same document (e.g. a click that did not
+    navigate) and the earlier page load's timings are left out.
+    """
+    metrics = {"network": summarise_network(events)}
+    try:
+        navigation = driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+        if time_origin is None or navigation.get("time_origin") != time_origin:
+            metrics["navigation"] = navigation
+    except Exception as e:
+        metrics["navigation"] = {"error": str(e)}
+    try:
+        values = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+        metrics["performance"] = {m["name"]: m["value"] for m in values if m["name"] in PERFORMANCE_METRIC_NAMES}
+    except Exception as e:
+        metrics["performance"] = {"error": str(e)}
+    return metrics
+
+TRACE_DOM_SCRIPT = """
+    var limit = arguments[0];
+    var root = document.documentElement.cloneNode(true);
+    // outerHTML does not carry what was typed; copy live values onto the clone (masking passwords)
+    var live = document.documentElement.querySelectorAll('input, textarea, select');
+    var copies = root.querySelectorAll('input, textarea, select');
+    for (var i = 0; i < live.length && i < copies.length; i++) {
+        var el = live[i], copy = copies[i];
+        if (el.type === 'password') {
+            copy.setAttribute('value', el.value ? '********' : '');
+        } else if (el.type === 'checkbox' || el.type === 'radio') {
+            if (el.checked) copy.setAttribute('checked', ''); else copy.removeAttribute('checked');
+        } else if (el.tagName === 'TEXTAREA') {
+            copy.textContent = el.value;
+        } else if (el.tagName === 'SELECT') {
+            Array.prototype.forEach.call(copy.options, function(option, n){
+                if (el.options[n] && el.options[n].selected) option.setAttribute('selected', ''); else option.removeAttribute('selected');
+            });
+        } else {
+            copy.setAttribute('value', el.value);
+        }
+    }
+    Array.prototype.forEach.call(root.querySelectorAll('script, noscript'), function(el){ el.remove(); });
+    var html = '<!DOCTYPE html>' + root.outerHTML;
+    return {url: location.href, title: document.title, size: html.length, truncated: html.length > limit, html: html.slice(0, limit)};
+"""
+
+class TraceRecorder:
+    """Per-run trace archive: a timeline of steps with DOM snapshots, console errors, network and timings.
+
+    Everything goes into one deflated zip under TRACES_DIR. DOM snapshots are
+    truncated to TRACE_DOM_MAX_CHARS each, and once the archive passes
+    TRACE_MAX_BYTES only the (small) timeline entries are still recorded.
+    """
+
+    def __init__(self, test_name, csv_row=None):
+        safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', str(test_name))
+        self.path = os.path.join(TRACES_DIR, f"{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.zip")
+        self.archive = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED)
+        self.bytes_written = 0
+        self.trace = {
+            "test_name": test_name,
+            "user": str(csv_row["LoginEmail"]) if csv_row is not None and "LoginEmail" in csv_row else None,
+            "started_at": datetime.now().isoformat(),
+            "steps": [],
+        }
+
+    def _add(self, name, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.archive.writestr(name, data)
+        self.bytes_written += self.archive.getinfo(name).compress_size
+
+    def record(self, driver, step_log, events=None):
+        """Add a finished (or failed) step to the trace; never raises"""
+        number = len(self.trace["steps"])
+        entry = {key: step_log.get(key) for key in ("step_index", "action", "selector_type", "selector_value",
+                                                    "status", "started_at", "duration")}
+        entry["label"] = step_label(step_log)
+        if events is not None:
+            entry["network"] = summarise_network(events)
+        if driver is not None:
+            try:
+                entry["console"] = [
+                    {"level": log["level"], "message": log["message"], "timestamp": log["timestamp"]}
+                    for log in driver.get_log("browser") if log.get("level") in ("SEVERE", "WARNING")
+                ]
+            except Exception as e:
+                entry["console_error"] = str(e)
+            if self.bytes_written < TRACE_MAX_BYTES:
+                try:
+                    snapshot = driver.execute_script(TRACE_DOM_SCRIPT, TRACE_DOM_MAX_CHARS)
+                    entry.update(url=snapshot["url"], title=snapshot["title"], dom_size=snapshot["size"],
+                                 dom_truncated=snapshot["truncated"], dom=f"dom/{number:03d}.html")
+                    self._add(entry["dom"], snapshot["html"])
+                except Exception as e:
+                    entry["dom_error"] = str(e)
+            else:
+                entry["dom_error"] = "trace size limit reached"
+        screenshot = step_log.get("screenshot")
+        if isinstance(screenshot, str) and os.path.exists(screenshot) and self.bytes_written < TRACE_MAX_BYTES:
+            # Screenshots may be cleaned up after reporting; the trace keeps its own copy
+            entry["screenshot"] = f"screenshots/{number:03d}{os.path.splitext(screenshot)[1]}"
+            with open(screenshot, "rb") as f:
+                self._add(entry["screenshot"], f.read())
+        elif screenshot:
+            entry["screenshot_ref"] = screenshot
+        self.trace["steps"].append(entry)
+
+    def update_status(self, step_log):
+        """Carry a status settled after the step was recorded (a visual check) into its entry"""
+        for entry in reversed(self.trace["steps"]):
+            if entry["step_index"] == step_log.get("step_index"):
+                entry["status"] = step_log.get("status")
+                break
+
+    def close(self):
+        """Write the timeline and close the archive; returns its path"""
+        self.trace["finished_at"] = datetime.now().isoformat()
+        self.archive.writestr("trace.json", json.dumps(self.trace, indent=2, default=str))
+        self.archive.close()
+        return self.path
+
+def list_traces():
+    """Trace archives, newest first"""
+    return sorted(Path(TRACES_DIR).glob("*.zip"), key=lambda path: path.stat().st_mtime, reverse=True)
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def _read_trace_cached(path, signature):
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read("trace.json"))
+
+def read_trace(path):
+    """Timeline of a trace archive, parsed once per file version"""
+    return _read_trace_cached(str(path), file_signature(path))
+
+def read_trace_file(path, name):
+    """One member (DOM snapshot, screenshot) of a trace archive"""
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(name)
+
+def recording_path(test_name, csv_row=None):
+    """HAR file for a test case, per CSV user when the row has a LoginEmail"""
+    parts = [str(test_name)]
+    if csv_row is not None and "LoginEmail" in csv_row and pd.notna(csv_row["LoginEmail"]):
+        parts.append(str(csv_row["LoginEmail"]))
+    safe_name = re.sub(r'[^A-Za-z0-9_.@-]', '_', "__".join(parts))
+    return os.path.join(RECORDINGS_DIR, f"{safe_name}.har")
+
+class NetworkRecorder:
+    """Turns CDP Network events into HAR entries.
+
+    A body can only be fetched while its document is alive, and the
+    performance log is read at step boundaries, after a redirect or
+    navigation may have discarded it. attach() therefore opens the page's
+    DevTools websocket, where a reader thread asks for each body the moment
+    Network.loadingFinished arrives. Bodies that still could not be fetched
+    are marked _bodyMissing so replay reports them instead of serving them empty.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.entries = []
+        self.socket = None
+        self.condition = threading.Condition()
+        self.message_id = 0
+        self.requested = {}
+        self.fetching = set()
+        self.bodies = {}
+
+    def attach(self, driver):
+        """Start fetching bodies over the page's own DevTools websocket"""
+        self.socket = page_websocket(driver)
+        threading.Thread(target=self._fetch_bodies, daemon=True).start()
+        self._send("Network.enable")
+
+    def _send(self, method, params=None):
+        """Send a command; caller may hold the condition. Returns the message id"""
+        with self.condition:
+            self.message_id += 1
+            self.socket.send(json.dumps({"id": self.message_id, "method": method, "params": params or {}}))
+            return self.message_id
+
+    def _fetch_bodies(self):
+        while True:
+            try:
+                message = json.loads(self.socket.recv())
+            except Exception:
+                break
+            with self.condition:
+                if message.get("method") == "Network.loadingFinished":
+                    request_id = message["params"]["requestId"]
+                    try:
+                        message_id = self._send("Network.getResponseBody", {"requestId": request_id})
+                    except Exception:
+                        break
+                    self.requested[message_id] = request_id
+                    self.fetching.add(request_id)
+                elif message.get("id") in self.requested:
+                    request_id = self.requested.pop(message["id"])
+                    self.fetching.discard(request_id)
+                    if "result" in message:
+                        self.bodies[request_id] = message["result"]
+                    self.condition.notify_all()
+        with self.condition:
+            self.fetching.clear()
+            self.condition.notify_all()
+
+    def _body(self, driver, request_id):
+        """The body fetched when the response finished, else one fetched now, else None"""
+        with self.condition:
+            self.condition.wait_for(lambda: request_id not in self.fetching, timeout=RECORD_BODY_WAIT)
+            body = self.bodies.pop(request_id, None)
+        if body is None:
+            try:
+                body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            except Exception:
+                body = None
+        return body
+
+    def close(self):
+        if self.socket is not None:
+            try:
+                self.socket.abort()
+                self.socket.close()
+            except Exception:
+                pass
+            self.socket = None
+        with self.condition:
+            self.bodies.clear()
+
+    def _finish(self, pending, response, body, step_index=None, fetched=False):
+        content = {"mimeType": response.get("mimeType", ""), "size": 0}
+        if body is not None:
+            content["text"] = body.get("body", "")
+            content["size"] = len(content["text"])
+            if body.get("base64Encoded"):
+                content["encoding"] = "base64"
+        elif fetched and response.get("status", 200) not in (204, 304) and not 300 <= response.get("status", 200) < 400:
+            content["_bodyMissing"] = True
+        self.entries.append({
+            "startedDateTime": pending["started"],
+            "_stepIndex": step_index,
+            "_resourceType": pending.get("type", ""),
+            "request": pending["request"],
+            "response": {
+                "status": response.get("status", 200),
+                "statusText": response.get("statusText", ""),
+                "headers": [{"name": k, "value": v} for k, v in (response.get("headers") or {}).items()],
+                "content": content,
+            },
+        })
+
+    def add(self, driver, events, step_index=None):
+        for event in events:
+            method = event["method"]
+            params = event.get("params", {})
+            request_id = params.get("requestId")
+            if method == "Network.requestWillBeSent":
+                if "redirectResponse" in params and request_id in self.pending:
+                    self._finish(self.pending.pop(request_id), params["redirectResponse"], None, step_index)
+                request = params["request"]
+                if request["url"].startswith(("data:", "blob:")):
+                    continue
+                har_request = {"method": request["method"], "url": request["url"]}
+                if request.get("postData"):
+                    har_request["postData"] = {"text": request["postData"]}
+                self.pending[request_id] = {"request": har_request, "response": None, "type": params.get("type", ""),
+                                            "started": datetime.now().isoformat()}
+            elif method == "Network.responseReceived" and request_id in self.pending:
+                self.pending[request_id]["response"] = params["response"]
+            elif method == "Network.loadingFinished" and request_id in self.pending:
+                pending = self.pending.pop(request_id)
+                if pending["response"] is None:
+                    continue
+                self._finish(pending, pending["response"], self._body(driver, request_id), step_index, fetched=True)
+            elif method == "Network.loadingFailed":
+                self.pending.pop(request_id, None)
+
+    def save(self, path):
+        self.close()
+        har = {"log": {"version": "1.2", "creator": {"name": "TestingFramework_V2", "version": "2"}, "entries": self.entries}}
+        with open(path, "w") as f:
+            json.dump(har, f)
+        return path
+
+class ReplayStore:
+    """Recorded responses indexed by method and URL, served in recorded order"""
+
+    # Headers that describe the original transfer rather than the decoded body we replay
+    HOP_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "connection", "keep-alive", "alt-svc"}
+
+    def __init__(self, har_path):
+        with open(har_path, "r") as f:
+            entries = json.load(f)["log"]["entries"]
+        self.exact = {}
+        self.by_path = {}
+        for entry in entries:
+            method = entry["request"]["method"]
+            url = self._strip_fragment(entry["request"]["url"])
+            self.exact.setdefault((method, url), []).append(entry)
+            self.by_path.setdefault((method, self._strip_query(url)), []).append(entry)
+        self.served = {}
+        self.lock = threading.Lock()
+        self.unmatched = []
+
+    @staticmethod
+    def _strip_fragment(url):
+        return urlunsplit(urlsplit(url)._replace(fragment=""))
+
+    @staticmethod
+    def _strip_query(url):
+        return urlunsplit(urlsplit(url)._replace(query="", fragment=""))
+
+    def match(self, method, url):
+        """Next recorded response for the request; repeats the last one once exhausted"""
+        url = self._strip_fragment(url)
+        for key, candidates in (((method, url), self.exact), ((method, self._strip_query(url)), self.by_path)):
+            entries = candidates.get(key)
+            if entries:
+                with self.lock:
+                    position = self.served.get(key, 0)
+                    self.served[key] = position + 1
+                    entry = entries[min(position, len(entries) - 1)]
+                    if entry["response"].get("content", {}).get("_bodyMissing"):
+                        self.unmatched.append({"method": method, "url": url, "reason": "body was not recorded"})
+                        return None
+                return entry
+        with self.lock:
+            self.unmatched.append({"method": method, "url": url})
+        return None
+
+    def take_unmatched(self):
+        with self.lock:
+            unmatched, self.unmatched = self.unmatched, []
+        return unmatched
+
+    def response_parts(self, entry):
+        response = entry["response"]
+        content = response.get("content", {})
+        text = content.get("text", "")
+        body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+        headers = [(h["name"], h["value"]) for h in response.get("headers", []) if h["name"].lower() not in self.HOP_HEADERS]
+        return response.get("status", 200), headers, body
+
+class ReplayProxyHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP proxy that answers from a ReplayStore; HTTPS is terminated locally after CONNECT"""
+
+    protocol_version = "HTTP/1.1"
+    tunnel_host = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_CONNECT(self):
+        self.send_response(200, "Connection Established")
+        self.end_headers()
+        try:
+            tls = self.server.ssl_context.wrap_socket(self.connection, server_side=True)
+        except (ssl.SSLError, OSError):
+            self.close_connection = True
+            return
+        self.connection = tls
+        self.rfile = tls.makefile("rb", self.rbufsize)
+        self.wfile = tls.makefile("wb")
+        host = self.path
+        self.tunnel_host = host[:-len(":443")] if host.endswith(":443") else host
+        self.close_connection = False
+
+    def _replay(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        url = f"https://{self.tunnel_host}{self.path}" if self.tunnel_host else self.path
+        entry = self.server.store.match(self.command, url)
+        if entry is None:
+            status, headers, body = 404, [("Content-Type", "text/plain")], b"Not in recording"
+        else:
+            status, headers, body = self.server.store.response_parts(entry)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _replay
+
+def replay_certificate():
+    """Self-signed certificate for terminating HTTPS in the replay proxy, created once"""
+    cert_path = os.path.join(RECORDINGS_DIR, ".replay_cert.pem")
+    key_path = os.path.join(RECORDINGS_DIR, ".replay_key.pem")
+    if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "3650",
+             "-keyout", key_path, "-out", cert_path, "-subj", "/CN=replay.local"],
+            check=True, capture_output=True,
+        )
+    return cert_path, key_path
+
+def start_replay_server(har_path):
+    """Serve a recording on an ephemeral local port; returns the running server"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ReplayProxyHandler)
+    server.daemon_threads = True
+    server.store = ReplayStore(har_path)
+    server.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server.ssl_context.load_cert_chain(*replay_certificate())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@st.cache_resource
+def get_visual_diff_pool():
+    """Worker pool for screenshot comparisons, kept off the browser thread"""
+    # Threads rather than processes: numpy releases the GIL for the heavy parts, and forking the
+    # multi-threaded server could deadlock a child and leak its sockets and driver pipes into it
+    pool = ThreadPoolExecutor(max_workers=VISUAL_DIFF_WORKERS, thread_name_prefix="visual-diff")
+    atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+    return pool
+
+def baseline_path(test_name, baseline_name, suffix=""):
+    """Location of a visual baseline (or its candidate/diff companion) in the baseline store"""
+    safe_test = re.sub(r'[^A-Za-z0-9_-]', '_', str(test_name))
+    safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', str(baseline_name))
+    return os.path.join(BASELINE_DIR, safe_test, f"{safe_name}{suffix}.png")
+
+def parse_masks(value):
+    """Parse mask regions written as 'x,y,w,h; x,y,w,h' (or already a list) into lists of ints"""
+    if isinstance(value, list):
+        return [[int(v) for v in region] for region in value if len(region) == 4]
+    masks = []
+    for region in str(value or "").split(";"):
+        parts = [p.strip() for p in region.split(",") if p.strip()]
+        if len(parts) == 4:
+            masks.append([int(float(p)) for p in parts])
+    return masks
+
+def submit_visual_check(step, step_log, screenshot_path, test_name, step_index):
+    """Save a missing baseline or queue a comparison; returns the pending future or None"""
+    baseline_name = step.get("baseline") or f"step_{step_index + 1}"
+    reference = baseline_path(test_name, baseline_name)
+    step_log["baseline"] = reference
+    if not os.path.exists(reference):
+        os.makedirs(os.path.dirname(reference), exist_ok=True)
+        shutil.copyfile(screenshot_path, reference)
+        step_log["status"] = "✅ Baseline saved"
+        return None
+    step_log["status"] = "⏳ Visual check pending"
+    return get_visual_diff_pool().submit(
+        compare_images,
+        screenshot_path,
+        reference,
+        parse_masks(step.get("masks")),
+        float(step.get("pixel_tolerance", VISUAL_PIXEL_TOLERANCE)),
+        baseline_path(test_name, baseline_name, ".diff"),
+    )
+
+def resolve_visual_checks(pending):
+    """Wait for queued comparisons and write their outcome into the step logs"""
+    for step, step_log, future in pending:
+        threshold = float(step.get("threshold", VISUAL_DIFF_THRESHOLD))
+        try:
+            outcome = future.result(timeout=60)
+        except Exception as e:
+            step_log["status"] = f"❌ Visual check error: {e}"
+            continue
+        step_log["visual_diff"] = outcome
+        candidate = step_log["baseline"].replace(".png", ".candidate.png")
+        if outcome["ratio"] <= threshold and not outcome["size_mismatch"]:
+            # A passing check supersedes the previous failure's candidate and diff
+            for stale in (candidate, step_log["baseline"].replace(".png", ".diff.png")):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            step_log["status"] = f"✅ Visual match ({outcome['ratio']:.2%} changed)"
+        else:
+            # Keep the candidate so it can be approved as the new baseline
+            if step_log.get("screenshot") and os.path.exists(step_log["screenshot"]):
+                shutil.copyfile(step_log["screenshot"], candidate)
+            if outcome["size_mismatch"]:
+                width, height = outcome["size"]
+                base_width, base_height = outcome["baseline_size"]
+                step_log["status"] = (f"❌ Visual mismatch (screenshot is {width}x{height}, "
+                                      f"baseline {base_width}x{base_height})")
+            else:
+                step_log["status"] = f"❌ Visual mismatch ({outcome['ratio']:.2%} changed)"
+
+def list_baselines():
+    """All stored baselines with their pending candidate and diff images"""
+    baselines = []
+    for test_dir in sorted(Path(BASELINE_DIR).glob("*")):
+        if not test_dir.is_dir():
+            continue
+        for image in sorted(test_dir.glob("*.png")):
+            if image.name.endswith((".candidate.png", ".diff.png")):
+                continue
+            candidate = image.with_name(image.stem + ".candidate.png")
+            diff = image.with_name(image.stem + ".diff.png")
+            baselines.append({
+                "test_name": test_dir.name,
+                "name": image.stem,
+                "path": str(image),
+                "candidate": str(candidate) if candidate.exists() else None,
+                "diff": str(diff) if diff.exists() else None,
+            })
+    return baselines
+
+def save_test_result(result_data, test_name, **metadata):
+    """Save test results to JSON file with timestamp; metadata (csv_used, rerun_of, ...) is stored alongside the logs"""
+    saved_at = datetime.now()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    # Never overwrite an earlier result saved within the same second (e.g. a quick rerun)
+    while True:
+        filename = f"{test_name}_{saved_at.strftime('%Y%m%d_%H%M%S')}.json"
+        filepath = os.path.join(RESULTS_DIR, filename)
+        if not os.path.exists(filepath):
+            break
+        saved_at += timedelta(seconds=1)
+    
+    full_data = {
+        "test_name": test_name,
+        "timestamp": datetime.now().isoformat(),
+        "logs": result_data,
+        **metadata
+    }
+    
+    with open(filepath, "w") as f:
+        json.dump(full_data, f, indent=2)
+
+    try:
+        update_rollups(full_data, filename)
+    except Exception as e:
+        print(f"Error updating rollups for {filename}: {e}")
+    
+    return filepath
+
+class ResultWriter:
+    """Append-only JSONL stream of a run, flushed after every step so a crash loses at most one step.
+
+    Records are a header with the run's metadata, a "step" per step log, a
+    "unit" when a (case, row) unit finishes and a closing "summary".
+    Reopening an unfinished stream appends a "resume" record and carries on;
+    finalize() materialises the usual results/<name>_<time>.json from it.
+    """
+
+    def __init__(self, test_name, path=None, **metadata):
+        self.test_name = test_name
+        self.path = path or os.path.join(
+            PARTIAL_RESULTS_DIR, f"{test_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.jsonl")
+        self.lock = threading.Lock()
+        resuming = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        if resuming:
+            self._drop_torn_tail()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if resuming:
+            self._append({"type": "resume", "resumed_at": datetime.now().isoformat()})
+        else:
+            self._append({"type": "header", "test_name": test_name, "started_at": datetime.now().isoformat(), **metadata})
+
+    def _drop_torn_tail(self):
+        """Cut a partially written last line left by a crash"""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _append(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record, default=str) + "\n")
+            self.file.flush()
+
+    def write_step(self, unit, step_log):
+        self._append({"type": "step", "unit": unit, "log": step_log})
+
+    def end_unit(self, unit, passed):
+        self._append({"type": "unit", "unit": unit, "passed": bool(passed)})
+
+    def completed_units(self):
+        """{unit: passed} for units already finished in this stream"""
+        return read_result_stream(self.path)["units"]
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def discard(self):
+        """Close and delete a stream that should not be kept"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def finalize(self):
+        """Append the summary record and save the standard result file; returns its path"""
+        stream = read_result_stream(self.path)
+        header = stream["header"]
+        started_at = header.get("started_at")
+        elapsed = (datetime.now() - datetime.fromisoformat(started_at)).total_seconds() if started_at else None
+        summary = {
+            "units": len(stream["units"]),
+            "failed_units": sum(1 for passed in stream["units"].values() if not passed),
+            "steps": len(stream["logs"]),
+            "failed_steps": sum(1 for log in stream["logs"] if not is_step_passed(log)),
+            "duration_s": round(elapsed, 1) if elapsed is not None else None,
+        }
+        self._append({"type": "summary", "finished_at": datetime.now().isoformat(), **summary})
+        self.close()
+        metadata = {key: value for key, value in header.items() if key not in ("type", "test_name")}
+        return save_test_result(stream["logs"], self.test_name, summary=summary, stream=self.path, **metadata)
+
+def read_result_stream(path):
+    """Parse a result stream: header, logs of finished units in completion order, unit outcomes and summary.
+
+    Steps of a unit that never finished (the run crashed mid-unit) are left
+    out, since resuming runs that unit again.
+    """
+    header, summary, units, logs, pending = {}, None, {}, [], {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            kind = record.get("type")
+            if kind == "header":
+                header = record
+            elif kind == "step":
+                pending.setdefault(record["unit"], []).append(record["log"])
+            elif kind == "unit":
+                logs.extend(pending.pop(record["unit"], []))
+                units[record["unit"]] = record["passed"]
+            elif kind == "resume":
+                pending.clear()
+            elif kind == "summary":
+                summary = record
+    return {"header": header, "logs": logs, "units": units, "summary": summary}
+
+def find_unfinished_result(test_name, csv_used=None):
+    """Newest stream of this test and CSV, if it never reached its summary, else None.
+
+    A finished run supersedes the unfinished streams older than it, so they
+    are not offered for resuming any more.
+    """
+    candidates = sorted(Path(PARTIAL_RESULTS_DIR).glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in candidates:
+        try:
+            with open(path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            continue
+        if header.get("test_name") != test_name or header.get("csv_used") != csv_used:
+            continue
+        return str(path) if read_result_stream(path)["summary"] is None else None
+    return None
+
+def get_historical_results():
+    """Load all historical test results"""
+    results = []
+    if os.path.exists(RESULTS_DIR):
+        for filename in sorted(os.listdir(RESULTS_DIR), reverse=True):
+            if filename.endswith(".json"):
+                filepath = os.path.join(RESULTS_DIR, filename)
+                try:
+                    result_data = read_json_file(filepath)
+                    if result_data is not None:
+                        # Extract test name and timestamp from filename (<name>_<YYYYmmdd>_<HHMMSS>.json)
+                        parts = filename[:-len(".json")].rsplit("_", 2)
+                        test_name = result_data.get("test_name") or parts[0]
+                        timestamp_str = "_".join(parts[-2:])
+                        
+                        try:
+                            timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
+                        except ValueError:
+                            timestamp = datetime.fromtimestamp(os.path.getmtime(filepath))
+                        
+                        results.append({
+                            "filename": filename,
+                            "filepath": filepath,
+                            "test_name": test_name,
+                            "timestamp": timestamp,
+                            "data": result_data
+                        })
+                except Exception as e:
+                    print(f"Error loading result file {filename}: {e}")
+    return results
+
+def extract_step_logs(result_data):
+    """Return the list of step logs from a saved result, unwrapping nested results"""
+    logs = result_data.get("logs", []) if isinstance(result_data, dict) else result_data
+    while isinstance(logs, dict):
+        logs = logs.get("logs", [])
+    return [log for log in logs or [] if isinstance(log, dict)]
+
+def is_step_passed(step_log):
+    """A step passes when its status carries the success marker"""
+    return str(step_log.get("status", "")).startswith("✅")
+
+def split_into_units(logs):
+    """Group step logs into units, one per run_test_case iteration"""
+    units = []
+    previous = None
+    for log in logs:
+        step_index = log.get("step_index")
+        starts_new = (
+            previous is None
+            or log.get("test_name") != previous.get("test_name")
+            or log.get("LoginEmail") != previous.get("LoginEmail")
+            or log.get("row_index") != previous.get("row_index")
+            or (step_index is not None and previous.get("step_index") is not None
+                and step_index <= previous["step_index"])
+        )
+        if starts_new:
+            units.append([])
+        units[-1].append(log)
+        previous = log
+    return units
+
+def unit_identity(step_log):
+    """Identity of a unit that is stable across runs: its LoginEmail, else its CSV row, else the case itself"""
+    if step_log.get("LoginEmail") not in (None, ""):
+        return str(step_log["LoginEmail"])
+    if step_log.get("row_index") is not None:
+        return f"row:{step_log['row_index']}"
+    return ""
+
+def step_label(step_log):
+    """Readable, stable identifier for a step within its test case"""
+    target = step_log.get("selector_value") or step_log.get("url") or ""
+    position = step_log.get("step_index")
+    prefix = f"{position + 1}. " if isinstance(position, int) else ""
+    return f"{prefix}{step_log.get('action', '?')} {target}".strip()
+
+# Held across each load/modify/save of the rollup store. Another process can still overwrite a
+# concurrent update; the files it drops leave "processed" too, so refresh_rollups folds them back in.
+ROLLUPS_LOCK = threading.Lock()
+
+def load_rollups():
+    """Load the aggregated rollup store"""
+    if os.path.exists(ROLLUPS_FILE):
+        try:
+            with open(ROLLUPS_FILE, "r") as f:
+                rollups = json.load(f)
+            # Stores from before per-unit statistics are rebuilt from the result files
+            if "units" in rollups:
+                # processed used to be a list of file names; their day is unknown, so they age out from today
+                if isinstance(rollups["processed"], list):
+                    today = datetime.now().date().isoformat()
+                    rollups["processed"] = {filename: today for filename in rollups["processed"]}
+                return rollups
+            print("Rollups predate unit statistics, rebuilding")
+        except Exception as e:
+            print(f"Error loading rollups, rebuilding: {e}")
+    return {"processed": {}, "steps": {}, "tests": {}, "units": {}}
+
+def rollup_cutoff(retention=ROLLUP_RETENTION):
+    """First day still kept in the rollups, as an ISO date"""
+    return (datetime.now() - retention).date().isoformat()
+
+def prune_rollups(rollups, retention=ROLLUP_RETENTION):
+    """Drop daily buckets and processed file records older than retention"""
+    cutoff = rollup_cutoff(retention)
+    for name in ("tests", "steps", "processed"):
+        store = rollups[name]
+        for key in [key for key, value in store.items()
+                    if (value["day"] if isinstance(value, dict) else value) < cutoff]:
+            del store[key]
+
+def save_rollups(rollups):
+    """Atomically write the rollup store"""
+    tmp_path = f"{ROLLUPS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(rollups, f)
+    os.replace(tmp_path, ROLLUPS_FILE)
+
+def _add_duration_sample(bucket, duration):
+    """Keep a bounded reservoir of durations and refresh the percentiles"""
+    samples = bucket.setdefault("durations", [])
+    bucket["timed"] = bucket.get("timed", 0) + 1
+    if len(samples) < ROLLUP_MAX_SAMPLES:
+        samples.append(duration)
+    else:
+        slot = random.randrange(bucket["timed"])
+        if slot < ROLLUP_MAX_SAMPLES:
+            samples[slot] = duration
+    p50, p90, p95 = np.percentile(samples, [50, 90, 95])
+    bucket["p50"], bucket["p90"], bucket["p95"] = round(float(p50), 3), round(float(p90), 3), round(float(p95), 3)
+
+def apply_result_to_rollups(rollups, result_data, filename):
+    """Fold one saved result into the rollups; returns False if already counted or past retention"""
+    if filename in rollups["processed"]:
+        return False
+    default_test = result_data.get("test_name", "")
+    default_day = str(result_data.get("timestamp", datetime.now().isoformat()))[:10]
+    if default_day < rollup_cutoff():
+        return False
+
+    for unit in split_into_units(extract_step_logs(result_data)):
+        test_name = unit[0].get("test_name") or default_test
+        day = str(unit[0].get("started_at") or default_day)[:10]
+        test_bucket = rollups["tests"].setdefault(f"{test_name}||{day}", {
+            "test_name": test_name, "day": day, "runs": 0, "passed_runs": 0, "steps": 0, "passed_steps": 0,
+        })
+        test_bucket["runs"] += 1
+        test_bucket["passed_runs"] += int(all(is_step_passed(log) for log in unit))
+
+        # Per-unit history for the planner; skipped units never ran, so they say nothing about it
+        if any(log.get("step_index") is not None for log in unit):
+            identity = unit_identity(unit[0])
+            unit_bucket = rollups.setdefault("units", {}).setdefault(f"{test_name}||{identity}", {
+                "test_name": test_name, "unit": identity, "runs": 0, "failures": 0, "duration": None,
+            })
+            unit_bucket["runs"] += 1
+            unit_bucket["failures"] += int(not all(is_step_passed(log) for log in unit))
+            duration = sum(float(log["duration"]) for log in unit if isinstance(log.get("duration"), (int, float)))
+            if duration > 0:
+                previous = unit_bucket["duration"]
+                unit_bucket["duration"] = round(
+                    duration if previous is None else previous + PLANNER_EWMA_ALPHA * (duration - previous), 3)
+
+        for log in unit:
+            label = step_label(log)
+            step_bucket = rollups["steps"].setdefault(f"{test_name}||{label}||{day}", {
+                "test_name": test_name, "step": label, "day": day, "count": 0, "passed": 0,
+            })
+            passed = is_step_passed(log)
+            step_bucket["count"] += 1
+            step_bucket["passed"] += int(passed)
+            test_bucket["steps"] += 1
+            test_bucket["passed_steps"] += int(passed)
+            if isinstance(log.get("duration"), (int, float)):
+                _add_duration_sample(step_bucket, float(log["duration"]))
+
+    rollups["processed"][filename] = default_day
+    return True
+
+def update_rollups(result_data, filename):
+    """Incrementally add a freshly saved result to the rollups"""
+    with ROLLUPS_LOCK:
+        rollups = load_rollups()
+        if apply_result_to_rollups(rollups, result_data, filename):
+            prune_rollups(rollups)
+            save_rollups(rollups)
+
+def refresh_rollups():
+    """Fold in any result files the rollups have not seen yet and return the store"""
+    with ROLLUPS_LOCK:
+        rollups = load_rollups()
+        processed = rollups["processed"]
+        # Files last written before the retention window only hold days that prune_rollups drops again
+        cutoff = time.time() - ROLLUP_RETENTION.total_seconds()
+        changed = False
+        if os.path.exists(RESULTS_DIR):
+            for entry in sorted(os.scandir(RESULTS_DIR), key=lambda entry: entry.name):
+                if not entry.name.endswith(".json") or entry.name in processed or entry.stat().st_mtime < cutoff:
+                    continue
+                try:
+                    with open(entry.path, "r") as f:
+                        result_data = json.load(f)
+                    changed |= apply_result_to_rollups(rollups, result_data, entry.name)
+                except Exception as e:
+                    print(f"Error adding {entry.name} to rollups: {e}")
+        if changed:
+            prune_rollups(rollups)
+            save_rollups(rollups)
+        return rollups
+
+def rollups_to_frames(rollups):
+    """Convert the rollup store into (tests_df, steps_df) without the raw samples"""
+    tests_df = pd.DataFrame(list(rollups["tests"].values()))
+    steps_df = pd.DataFrame([
+        {k: v for k, v in bucket.items() if k != "durations"} for bucket in rollups["steps"].values()
+    ])
+    if not tests_df.empty:
+        tests_df["day"] = pd.to_datetime(tests_df["day"])
+        tests_df["pass_rate"] = tests_df["passed_runs"] / tests_df["runs"]
+        tests_df["step_pass_rate"] = tests_df["passed_steps"] / tests_df["steps"].where(tests_df["steps"] > 0)
+    if not steps_df.empty:
+        steps_df["day"] = pd.to_datetime(steps_df["day"])
+        steps_df["pass_rate"] = steps_df["passed"] / steps_df["count"]
+        for col in ("p50", "p90", "p95"):
+            if col not in steps_df.columns:
+                steps_df[col] = np.nan
+    return tests_df, steps_df
+
+def find_slowing_steps(steps_df, recent_days=7, min_ratio=1.2):
+    """Compare each step's recent p90 against the preceding window of equal length"""
+    if steps_df.empty:
+        return steps_df
+    end = steps_df["day"].max()
+    recent_start = end - pd.Timedelta(days=recent_days - 1)
+    baseline_start = recent_start - pd.Timedelta(days=recent_days)
+    window = np.where(steps_df["day"] >= recent_start, "recent",
+                      np.where(steps_df["day"] >= baseline_start, "baseline", None))
+    framed = steps_df.assign(window=window).dropna(subset=["window", "p90"])
+    if framed.empty:
+        return framed
+    weighted = framed.assign(weighted_p90=framed["p90"] * framed["count"])
+    grouped = weighted.groupby(["test_name", "step", "window"])[["weighted_p90", "count"]].sum()
+    p90 = (grouped["weighted_p90"] / grouped["count"]).unstack("window")
+    if "recent" not in p90.columns or "baseline" not in p90.columns:
+        return pd.DataFrame()
+    p90 = p90.dropna(subset=["recent", "baseline"])
+    p90["ratio"] = p90["recent"] / p90["baseline"].where(p90["baseline"] > 0)
+    slowing = p90[p90["ratio"] >= min_ratio].sort_values("ratio", ascending=False)
+    slowing = slowing.rename(columns={"recent": "recent_p90", "baseline": "baseline_p90"})
+    return slowing.rename_axis(columns=None).reset_index()
+
+class TimeoutModel:
+    """Per-step latency history turned into per-step timeouts.
+
+    Latencies are kept per step and kind: "locate" (find_element), "notify"
+    (until a toast appeared) and "options" (until dropdown items showed), plus
+    a case-wide bucket per kind used while a step has too few samples. With
+    TIMEOUT_MIN_SAMPLES the timeout is p95 * TIMEOUT_MARGIN_FACTOR +
+    TIMEOUT_MARGIN_SECONDS, at least the kind's TIMEOUT_FLOORS entry, doubled
+    per miss so a step that really got slower recovers, and capped at
+    TIMEOUT_CEILING. Each on-time wait takes back TIMEOUT_MISS_DECAY of a miss, so
+    a step that is occasionally slow keeps the wider timeout.
+    """
+
+    def __init__(self, path=TIMEOUT_MODEL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.buckets = read_json_file(path, {}) or {}
+
+    def _bucket(self, key, kind):
+        return self.buckets.setdefault(f"{key}||{kind}", {"key": key, "kind": kind, "recent": [], "misses": 0})
+
+    def observe(self, test_name, step, kind, latency):
+        """Record a latency in seconds; None (no toast appeared) is not a miss, since most steps show none"""
+        if latency is None:
+            return
+        with self.lock:
+            for key in (f"{test_name}||{step}", f"{test_name}||*"):
+                bucket = self._bucket(key, kind)
+                _add_duration_sample(bucket, round(latency, 3))
+                bucket["recent"] = (bucket["recent"] + [round(latency, 3)])[-TIMEOUT_RECENT:]
+                bucket["misses"] = round(max(bucket["misses"] - TIMEOUT_MISS_DECAY, 0), 2)
+            self.dirty = True
+
+    def miss(self, test_name, step, kind):
+        """The wait timed out; widen the step's next timeout"""
+        with self.lock:
+            bucket = self._bucket(f"{test_name}||{step}", kind)
+            bucket["misses"] = min(bucket["misses"] + 1, 5)
+            self.dirty = True
+
+    def timeout(self, test_name, step, kind, default):
+        """Learned timeout for a step, or default until there is enough history"""
+        with self.lock:
+            step_bucket = self.buckets.get(f"{test_name}||{step}||{kind}", {})
+            for bucket in (step_bucket, self.buckets.get(f"{test_name}||*||{kind}", {})):
+                if bucket.get("timed", 0) >= TIMEOUT_MIN_SAMPLES:
+                    learned = bucket["p95"] * TIMEOUT_MARGIN_FACTOR + TIMEOUT_MARGIN_SECONDS
+                    learned = max(learned, TIMEOUT_FLOORS.get(kind, TIMEOUT_FLOOR)) * 2 ** step_bucket.get("misses", 0)
+                    return round(min(learned, TIMEOUT_CEILING), 2)
+            return default
+
+    def frame(self):
+        """One row per step and kind with percentiles, current timeout and drift"""
+        with self.lock:
+            buckets = [dict(b) for b in self.buckets.values() if not b["key"].endswith("||*") and b.get("timed")]
+        rows = []
+        half = TIMEOUT_RECENT // 2
+        for bucket in buckets:
+            test_name, step = bucket["key"].split("||", 1)
+            recent = bucket["recent"]
+            recent_p50 = float(np.median(recent[-half:]))
+            # Drift compares the latest half of the recent window with the half before it
+            earlier_p50 = float(np.median(recent[-2 * half:-half])) if len(recent) >= 2 * half else None
+            rows.append({
+                "test_name": test_name, "step": step, "kind": bucket["kind"], "samples": bucket["timed"],
+                "p50": bucket["p50"], "p95": bucket["p95"], "recent_p50": round(recent_p50, 3),
+                "drift": round(recent_p50 / earlier_p50, 2) if earlier_p50 else np.nan,
+                "timeout": self.timeout(test_name, step, bucket["kind"], None),
+            })
+        return pd.DataFrame(rows)
+
+    def save(self):
+        """Atomically persist the model if anything changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.buckets, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+@st.cache_resource
+def get_timeout_model():
+    """Process-wide timeout model shared by all runs"""
+    return TimeoutModel()
+
+def find_step_element(driver, step, index, test_name, label, model):
+    """find_element with the step's learned timeout, feeding the lookup latency back into the model"""
+    started = time.perf_counter()
+    try:
+        element = find_element(driver, step["selector_type"], step["selector_value"], index,
+                               timeout=model.timeout(test_name, label, "locate", FIND_ELEMENT_TIMEOUT))
+    except Exception:
+        model.miss(test_name, label, "locate")
+        raise
+    model.observe(test_name, label, "locate", time.perf_counter() - started)
+    return element
+
+# Everything the runner exports: name -> (type, help text)
+METRIC_DEFINITIONS = {
+    "autotest_steps_total": ("counter", "Steps finished, by test, action and outcome"),
+    "autotest_steps_per_second": ("gauge", f"Steps finished per second over the last {METRICS_RATE_WINDOW}s"),
+    "autotest_step_duration_seconds": ("histogram", "Step latency by action"),
+    "autotest_runs_total": ("counter", "Test case iterations finished, by test and outcome"),
+    "autotest_active_browsers": ("gauge", "Browsers currently driven by a run, by browser mode"),
+    "autotest_queue_depth": ("gauge", "Suite units waiting for a free browser or for their dependencies"),
+    "autotest_units_running": ("gauge", "Suite units currently running"),
+    "autotest_units_skipped_total": ("counter", "Suite units skipped because a dependency failed or a circuit was open"),
+    "autotest_scheduled_runs_total": ("counter", "Scheduled test runs finished, by test and outcome"),
+    "autotest_scheduled_run_duration_seconds": ("histogram", "Wall time of scheduled test runs"),
+    "autotest_scheduler_jobs": ("gauge", "Jobs registered with the scheduler"),
+    "autotest_scheduler_next_run_seconds": ("gauge", "Seconds until the next scheduled job is due"),
+    "autotest_scheduler_last_tick_timestamp_seconds": ("gauge", "Unix time the scheduler loop last ran"),
+    "autotest_screenshot_bytes_total": ("counter", "Bytes of screenshots and screencast frames written, by kind"),
+    "autotest_disk_bytes": ("gauge", "Bytes on disk per artifact directory"),
+}
+
+class MetricsRegistry:
+    """Counters, gauges and histograms from the execution path, rendered in the Prometheus text format.
+
+    Shared by every thread of the server process: run_test_case, run_suite,
+    run_scheduled_test and the scheduler loop feed it, render() is what the
+    /metrics endpoint serves and the exporter thread writes to METRICS_FILE.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.histograms = {}
+        self.step_times = deque()
+        self.disk_checked = None
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter (or move a gauge up or down)"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    add = inc
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name, value, buckets=METRICS_LATENCY_BUCKETS, **labels):
+        """Record a sample in a histogram"""
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.setdefault(key, {"buckets": buckets, "counts": [0] * len(buckets),
+                                                         "sum": 0.0, "count": 0})
+            for position, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["counts"][position] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def record_step(self, test_name, step_log):
+        """Count a finished step and its latency"""
+        action = step_log.get("action") or "none"
+        self.inc("autotest_steps_total", test=test_name, action=action,
+                 outcome="passed" if is_step_passed(step_log) else "failed")
+        self.observe("autotest_step_duration_seconds", float(step_log.get("duration") or 0.0), action=action)
+        now = time.monotonic()
+        with self.lock:
+            self.step_times.append(now)
+            while now - self.step_times[0] > METRICS_RATE_WINDOW:
+                self.step_times.popleft()
+
+    def record_file(self, name, path, **labels):
+        """Count the bytes of a file just written"""
+        try:
+            self.inc(name, os.path.getsize(path), **labels)
+        except OSError:
+            pass
+
+    def refresh_disk(self):
+        """Re-measure the artifact directories, at most every METRICS_DISK_INTERVAL seconds"""
+        if self.disk_checked is not None and time.monotonic() - self.disk_checked < METRICS_DISK_INTERVAL:
+            return
+        self.disk_checked = time.monotonic()
+        for directory in METRICS_DISK_DIRS:
+            total = 0
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, filename))
+                    except OSError:
+                        pass
+            self.set("autotest_disk_bytes", total, directory=directory)
+
+    def steps_per_second(self):
+        """Step throughput over the last METRICS_RATE_WINDOW seconds"""
+        now = time.monotonic()
+        with self.lock:
+            recent = sum(1 for finished in self.step_times if now - finished <= METRICS_RATE_WINDOW)
+        return round(recent / METRICS_RATE_WINDOW, 3)
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        self.refresh_disk()
+        self.set("autotest_steps_per_second", self.steps_per_second())
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in METRIC_DEFINITIONS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for (metric, labels), histogram in sorted(self.histograms.items()):
+                        if metric != name:
+                            continue
+                        for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                            lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}")
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {round(histogram['sum'], 6)}")
+                        lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+                else:
+                    for (metric, labels), value in sorted(self.values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, name, **labels):
+        """Sum of a counter or gauge over the series matching the given labels"""
+        wanted = set(self._key(name, labels)[1])
+        with self.lock:
+            return sum(value for (metric, series), value in self.values.items()
+                       if metric == name and wanted <= set(series))
+
+    def write_file(self, path=METRICS_FILE):
+        """Atomically write the exposition for a node_exporter textfile collector"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    """{key="value",...} for a sorted label tuple, or nothing without labels"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the registry at /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def export_metrics(registry):
+    """Background exporter: rewrite the metrics file every METRICS_FLUSH_INTERVAL"""
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            registry.write_file()
+        except Exception as e:
+            print(f"Error writing metrics file: {e}")
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide metrics registry; starts the file exporter and, if METRICS_PORT is set, the /metrics endpoint"""
+    registry = MetricsRegistry()
+    threading.Thread(target=export_metrics, args=(registry,), daemon=True).start()
+    if METRICS_PORT:
+        try:
+            server = http.server.ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), MetricsRequestHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        except OSError as e:
+            print(f"Metrics endpoint unavailable on port {METRICS_PORT}: {e}")
+    return registry
+
+def run_scheduled_test(test_name, headless=True, csv_path=None, instrument=False, max_duration=SCHEDULE_DEADLINE, resume=True,
+                       trace=False):
+    """Execute a scheduled test in background with optional CSV data, within max_duration seconds.
+
+    Steps are streamed to a ResultWriter as they finish, so memory stays flat
+    and a crash loses nothing already run; the next run of the same test and
+    CSV resumes the unfinished stream and skips the rows it completed.
+    """
+    test_cases = load_test_cases()
+    test_case = next((tc for tc in test_cases if tc["name"] == test_name), None)
+    
+    if not test_case:
+        print(f"Test case {test_name} not found")
+        return
+    
+    deadline = time.monotonic() + max_duration if max_duration else None
+    writer = None
+    metrics = get_metrics()
+    outcome = "error"
+    suite_started = time.perf_counter()
+    
+    try:
+        csv_data = pd.read_csv(csv_path) if csv_path and os.path.exists(csv_path) else None
+        csv_used = csv_path if csv_path else None
+        partial = find_unfinished_result(test_name, csv_used) if resume else None
+        writer = ResultWriter(test_name, partial, csv_used=csv_used)
+        if partial:
+            print(f"Resuming scheduled test '{test_name}' from {partial}")
+        else:
+            print(f"Running scheduled test '{test_name}'")
+        plan = plan_suite([test_case], [test_name], csv_data)
+        suite_started = time.perf_counter()
+        outcome = "passed"
+        for _, label, logs in run_suite([test_case], [test_name], headless=headless, csv_data=csv_data, plan=plan,
+                                        writers={test_name: writer}, breaker=get_circuit_breaker(), preflight=True,
+                                        instrument=instrument, deadline=deadline, trace=trace):
+            if any(not is_step_passed(log) for log in logs):
+                outcome = "failed"
+            print(f"Scheduled test '{test_name}' finished '{label}'")
+        
+        # Save the result
+        writer.finalize()
+        print(f"Completed scheduled test for {test_name} in {time.perf_counter() - suite_started:.0f}s "
+              f"(predicted {plan['predicted_makespan']:.0f}s)")
+    except Exception as e:
+        outcome = "error"
+        print(f"Error running scheduled test: {e}")
+        if writer is not None:
+            writer.close()
+    metrics.inc("autotest_scheduled_runs_total", test=test_name, outcome=outcome)
+    metrics.observe("autotest_scheduled_run_duration_seconds", time.perf_counter() - suite_started,
+                    buckets=METRICS_RUN_BUCKETS)
+
+def run_test_case(test_case, headless=True, repeat=1, csv_row=None, instrument=False, network_mode="live", deadline=None,
+                  start_step=0, browser_mode="process", capture="screenshots", screencast_fps=SCREENCAST_FPS,
+                  screencast_quality=SCREENCAST_QUALITY, trace=False):
+    """Execute a test case and yield step results.
+
+    With instrument=True, visit and click steps also record page and network
+    metrics from the same browser session under step_log["metrics"].
+    network_mode="record" saves every response to a HAR file in RECORDINGS_DIR;
+    "replay" serves that file from a local proxy instead of the network and
+    lists unmatched requests under step_log["replay_unmatched"].
+    Each iteration is supervised by the watchdog: steps may take STEP_DEADLINE
+    seconds (or the step's own "deadline"), the iteration RUN_DEADLINE, and
+    never past the absolute time.monotonic() deadline if one is given.
+    Element, toast and dropdown waits use the TimeoutModel's per-step timeouts.
+    Steps before start_step are skipped (used when resuming a failed run).
+    browser_mode="context" runs each iteration in its own browser context of
+    the shared context host instead of starting a Chrome process per run.
+    capture="screencast" records each iteration's screencast instead of saving
+    a PNG per step; step screenshots then reference stills in the archive.
+    With trace=True every iteration also writes a trace archive (DOM snapshot,
+    console errors, network summary and timings per step) to TRACES_DIR.
+    """
+    logs_output = []
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    test_name = test_case.get("name", "")
+    timeouts = get_timeout_model()
+    metrics = get_metrics()
+
+    def release_steps(block):
+        """Held step logs that may be yielded, in order: up to the first visual check still running (all when block)"""
+        released = []
+        while held:
+            checks = [entry for entry in pending_visual_checks if entry[1] is held[0]]
+            if checks and not block and not checks[0][2].done():
+                break
+            if checks:
+                resolve_visual_checks(checks)
+                pending_visual_checks.remove(checks[0])
+                if tracer is not None:
+                    tracer.update_status(held[0])
+            released.append(held.pop(0))
+            metrics.record_step(test_name, released[-1])
+        return released
     
     for _ in range(repeat):
+        iteration_start = len(logs_output)
+        browser_counted = False
         driver = None
         profile_dir = None
+        step_log = None
+        pending_visual_checks = []
+        # Steps are yielded (and so persisted) only once their status is final; a visual_assert
+        # holds back itself and the steps after it until its comparison finishes
+        held = []
+        recorder = NetworkRecorder() if network_mode == "record" else None
+        replay_server = None
+        perf_logging = instrument or recorder is not None or trace
+        tracer = None
+        watch = None
+        host = None
+        context_id = None
+        screencast = None
         try:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("schedule deadline reached before start")
+            if trace:
+                tracer = TraceRecorder(test_name, csv_row)
             options = Options()
             if headless:
                 options.add_argument("--headless=new")
             options.add_argument("--incognito")
             options.add_argument("--disable-extensions")
             options.add_argument("--disable-cache")
+            if perf_logging:
+                enable_instrumentation(options, console=trace)
+            if network_mode == "replay":
+                har_path = recording_path(test_case.get("name", ""), csv_row)
+                if not os.path.exists(har_path):
+                    har_path = recording_path(test_case.get("name", ""))
+                if not os.path.exists(har_path):
+                    raise FileNotFoundError(f"No recording for '{test_case.get('name', '')}'; run it once in record mode")
+                replay_server = start_replay_server(har_path)
+                options.add_argument(f"--proxy-server=http://127.0.0.1:{replay_server.server_address[1]}")
+                options.add_argument("--ignore-certificate-errors")
 
-            profile_dir = tempfile.mkdtemp(prefix="selenium_profile_")
-            options.add_argument(f"--user-data-dir={profile_dir}")
+            if browser_mode == "context":
+                # A context is as isolated as a fresh profile; the proxy is set per context
+                host = get_context_host(headless)
+                proxy = f"http://127.0.0.1:{replay_server.server_address[1]}" if replay_server is not None else None
+                context_id, target_id = host.open_context(proxy_server=proxy)
+                watch = get_watchdog().register(None, deadline, kill=functools.partial(host.close_context, context_id))
+                watch.start_step()
+                driver = attach_context_driver(host, target_id, perf_logging, console=trace)
+                if replay_server is not None:
+                    driver.execute_cdp_cmd("Security.setIgnoreCertificateErrors", {"ignore": True})
+            else:
+                profile_dir = new_profile_dir()
+                options.add_argument(f"--user-data-dir={profile_dir}")
+                watch = get_watchdog().register(profile_dir, deadline)
+                watch.start_step()
 
-            driver = webdriver.Chrome(service=ChromeService(), options=options)
-            setattr(driver, "_temp_profile_dir", profile_dir)
+                driver = create_chrome_driver(options)
+                setattr(driver, "_temp_profile_dir", profile_dir)
+            metrics.add("autotest_active_browsers", 1, mode=browser_mode)
+            browser_counted = True
+            driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+            if perf_logging:
+                start_instrumentation(driver)
+            if recorder is not None:
+                try:
+                    recorder.attach(driver)
+                except Exception as e:
+                    print(f"Recording bodies at step boundaries only: {e}")
             driver.maximize_window()
             driver.delete_all_cookies()
             driver.refresh()
             driver.refresh()
+            if capture == "screencast":
+                safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', test_name)
+                screencast = ScreencastRecorder(
+                    driver, os.path.join(SCREENCAST_DIR, f"{safe_name}_{timestamp}_{uuid.uuid4().hex[:6]}.zip"),
+                    fps=screencast_fps, quality=screencast_quality)
 
-            for step in test_case["steps"]:
+            for step_index, step in enumerate(test_case["steps"]):
+                if step_index < start_step:
+                    continue
                 action = step["action"]
                 wait_time = step.get("wait", 0)
                 index = step.get("index", 0)
+                step_started = time.perf_counter()
+                watch.start_step(step.get("deadline"))
                 
                 step_log = {
+                    "test_name": test_case.get("name", ""),
+                    "step_index": step_index,
+                    "started_at": datetime.now().isoformat(),
                     "action": action,
                     "selector_type": step.get("selector_type", ""),
                     "selector_value": step.get("selector_value", ""),
@@ -511,6 +3159,19 @@ def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
                     "status": "",
                     "notifications": []
                 }
+                if tracer is not None:
+                    step_log["trace"] = tracer.path
+                # Waits use what this step needed before instead of fixed timeouts
+                label = step_label(step_log)
+                notify_timeout = timeouts.timeout(test_name, label, "notify", NOTIFICATION_TIMEOUT)
+                notify_observer = functools.partial(timeouts.observe, test_name, label, "notify")
+                measured = instrument and action in ("visit", "click")
+                time_origin = document_time_origin(driver) if measured else None
+                if perf_logging:
+                    # Events since the previous step: kept for the recording, excluded from metrics
+                    earlier_events = drain_network_events(driver)
+                    if recorder is not None:
+                        recorder.add(driver, earlier_events, max(step_index - 1, 0))
 
                 if action == "visit":
                     driver.refresh()
@@ -520,10 +3181,8 @@ def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
                     actual_url = driver.current_url
                     step_log["actual_url"] = actual_url
                     step_log["status"] = "✅ Success" if expected_url.rstrip('/') == actual_url.rstrip('/') else "❌ No Access"
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
-                    notifications = capture_notification(driver)
+                    capture_step(driver, step_log, timestamp, screencast)
+                    notifications = capture_notification(driver, notify_timeout, notify_observer)
                     if notifications:
                         step_log["notifications"] = notifications
                         if any("success" in str(n).lower() for n in notifications):
@@ -532,13 +3191,11 @@ def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
                             step_log["status"] = "❌ Failed"
 
                 elif action == "click":
-                    find_element(driver, step["selector_type"], step["selector_value"], index).click()
+                    find_step_element(driver, step, index, test_name, label, timeouts).click()
                     step_log["status"] = "✅ Clicked"
                     time.sleep(1)                    
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
-                    notifications = capture_notification(driver)
+                    capture_step(driver, step_log, timestamp, screencast)
+                    notifications = capture_notification(driver, notify_timeout, notify_observer)
                     if notifications:
                         step_log["notifications"] = notifications
                         if any("success" in str(n).lower() for n in notifications):
@@ -547,61 +3204,76 @@ def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
                             step_log["status"] = "❌ Failed"
 
                 elif action == "input":
-                    element = find_element(driver, step["selector_type"], step["selector_value"], index)
+                    element = find_step_element(driver, step, index, test_name, label, timeouts)
                     element.clear()
                     value = substitute_placeholders(step["text"], csv_row)
                     element.send_keys(value)
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
+                    capture_step(driver, step_log, timestamp, screencast)
                     step_log["status"] = f"✅ Input '{value}'"
 
+                elif action == "fill_form":
+                    fields = [dict(field, text=substitute_placeholders(field.get("text", ""), csv_row)) for field in step["fields"]]
+                    step_log["selector_value"] = ", ".join(str(field["selector_value"]) for field in fields)
+                    step_log["text"] = ", ".join(str(field["text"]) for field in fields)
+                    outcome = fill_form(driver, fields, timeout=float(step.get("timeout", FILL_FORM_TIMEOUT)))
+                    capture_step(driver, step_log, timestamp, screencast)
+                    if outcome.get("error"):
+                        step_log["status"] = f"❌ Fill form failed: {outcome['error']}"
+                    elif outcome["missing"]:
+                        step_log["status"] = f"❌ Filled {outcome['filled']}/{len(fields)}, not found: {', '.join(map(str, outcome['missing']))}"
+                    else:
+                        step_log["status"] = f"✅ Filled {outcome['filled']} fields"
+
                 elif action == "assert":
-                    value = substitute_placeholders(step["text"], csv_row)
-                    assert value in driver.page_source
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
-                    step_log["status"] = f"✅ Asserted '{value}'"
+                    checks = assertion_checks(step, csv_row)
+                    outcome = run_assertions(driver, checks, timeout=float(step.get("timeout", ASSERT_TIMEOUT)))
+                    capture_step(driver, step_log, timestamp, screencast)
+                    step_log["assertions"] = [dict(result, check=check) for result, check in zip(outcome["results"], checks)]
+                    if outcome["passed"]:
+                        step_log["status"] = "✅ Asserted " + "; ".join(describe_check(r, c) for r, c in zip(outcome["results"], checks))
+                    else:
+                        failures = [describe_check(r, c) for r, c in zip(outcome["results"], checks) if not r["passed"]]
+                        step_log["status"] = "❌ Assertion failed: " + "; ".join(failures)
 
                 elif action == "select_dropdown":
-                    dropdown = find_element(driver, step["selector_type"], step["selector_value"], index)
+                    dropdown = find_step_element(driver, step, index, test_name, label, timeouts)
                     try:
                         dropdown.click()
                     except Exception:
                         # Fallback to JavaScript click if normal click fails
                         driver.execute_script("arguments[0].click();", dropdown)
 
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
+                    capture_step(driver, step_log, timestamp, screencast)
 
                     expected_text = substitute_placeholders(step["text"], csv_row).strip()
 
-                    # Wait for dropdown options to be visible before searching
+                    # Options are waited for and matched in the page in one script call
+                    options_timeout = timeouts.timeout(test_name, label, "options", DROPDOWN_TIMEOUT)
                     try:
-                        WebDriverWait(driver, 5).until(
-                            lambda d: any(el.is_displayed() for el in d.find_elements(By.CSS_SELECTOR, "li.el-dropdown-menu__item"))
-                        )
-                    except Exception:
-                        step_log["status"] = "❌ Dropdown options not visible"
-                        continue
+                        outcome = run_page_script(driver, SELECT_OPTION_SCRIPT, options_timeout, DROPDOWN_OPTION_SELECTOR,
+                                                  expected_text, int(options_timeout * 1000),
+                                                  int(ASSERT_POLL_INTERVAL * 1000))
+                    except WebDriverException as e:
+                        outcome = {"element": None, "visible": [], "error": e.msg or str(e)}
+                    if outcome.get("error"):
+                        step_log["status"] = f"❌ Dropdown options could not be read: {outcome['error']}"
+                    elif outcome["element"] is not None:
+                        timeouts.observe(test_name, label, "options", outcome["elapsed_ms"] / 1000)
+                        try:
+                            outcome["element"].click()
+                        except Exception:
+                            driver.execute_script("arguments[0].click();", outcome["element"])
+                        step_log["status"] = f"✅ Selected '{expected_text}'"
+                    else:
+                        timeouts.miss(test_name, label, "options")
+                        if outcome["visible"]:
+                            step_log["status"] = (f"❌ Dropdown item '{expected_text}' not found "
+                                                  f"(visible: {', '.join(outcome['visible'])})")
+                        else:
+                            step_log["status"] = "❌ Dropdown options not visible"
 
-                    items = [el for el in driver.find_elements(By.CSS_SELECTOR, "li.el-dropdown-menu__item") if el.is_displayed()]
-                    selected = False
-                    for item in items:
-                        if item.text.strip() == expected_text:
-                            item.click()
-                            step_log["status"] = f"✅ Selected '{item.text.strip()}'"
-                            selected = True
-                            break
-                    if not selected:
-                        step_log["status"] = f"❌ Dropdown item '{expected_text}' not found"
-
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
-                    notifications = capture_notification(driver)
+                    capture_step(driver, step_log, timestamp, screencast)
+                    notifications = capture_notification(driver, notify_timeout, notify_observer)
                     if notifications:
                         step_log["notifications"] = notifications
                         if any("success" in str(n).lower() for n in notifications):
@@ -609,31 +3281,1071 @@ def run_test_case(test_case, headless=True, repeat=1, csv_row=None):
                         else:
                             step_log["status"] = "❌ Failed"
 
+                elif action == "visual_assert":
+                    # Baselines are compared against full-resolution PNGs in every capture mode
+                    screenshot_filename = screenshot_path(timestamp, action)
+                    driver.save_screenshot(screenshot_filename)
+                    metrics.record_file("autotest_screenshot_bytes_total", screenshot_filename, kind="png")
+                    step_log["screenshot"] = screenshot_filename
+                    future = submit_visual_check(step, step_log, screenshot_filename, test_case.get("name", ""), step_index)
+                    if future is not None:
+                        pending_visual_checks.append((step, step_log, future))
+
                 elif action == "scroll":
                     x = step.get("x", 0)
                     y = step.get("y", 0)
                     driver.execute_script("window.scrollTo(arguments[0], arguments[1]);", x, y)
-                    screenshot_filename = f"{SCREENSHOT_DIR}/step_{timestamp}_{action}_{int(time.time()*1000)}.png"
-                    driver.save_screenshot(screenshot_filename)
-                    step_log["screenshot"] = screenshot_filename
+                    capture_step(driver, step_log, timestamp, screencast)
                     step_log["status"] = f"✅ Scrolled to ({x}, {y})"
 
-                if csv_row is not None and "LoginEmail" in csv_row:
-                    step_log["LoginEmail"] = csv_row["LoginEmail"]
-                logs_output.append(step_log)
-                yield step_log
-                if wait_time > 0:
-                    time.sleep(wait_time)
+                if perf_logging:
+                    step_events = drain_network_events(driver)
+                    if measured:
+                        step_log["metrics"] = collect_step_metrics(driver, step_events, time_origin)
+                    if recorder is not None:
+                        recorder.add(driver, step_events, step_index)
+                if replay_server is not None:
+                    unmatched = replay_server.store.take_unmatched()
+                    if unmatched:
+                        step_log["replay_unmatched"] = unmatched
+                tag_csv_row(step_log, csv_row)
+                step_log["duration"] = round(time.perf_counter() - step_started, 3)
+                if tracer is not None:
+                    tracer.record(driver, step_log, step_events)
+                logs_output.append(step_log)
+                held.append(step_log)
+                yield from release_steps(block=False)
+                step_log = None
+                if wait_time > 0:
+                    time.sleep(wait_time)
+            yield from release_steps(block=True)
+
+        except Exception as e:
+            # Report the failing step like any other so history and rollups see it
+            error_log = {
+                "test_name": test_case.get("name", ""),
+                "status": f"❌ Timed out: {watch.reason}" if watch is not None and watch.reason else f"❌ Error: {e}",
+            }
+            if step_log is not None:
+                error_log.update({
+                    "step_index": step_log["step_index"],
+                    "started_at": step_log["started_at"],
+                    "action": step_log["action"],
+                    "selector_type": step_log["selector_type"],
+                    "selector_value": step_log["selector_value"],
+                    "url": step_log["url"],
+                    "duration": round(time.perf_counter() - step_started, 3),
+                })
+                if screencast is not None:
+                    # The frames leading up to the failure are already in the archive
+                    error_log["screenshot"] = screencast.mark(step_log["step_index"])
+            tag_csv_row(error_log, csv_row)
+            if tracer is not None:
+                # The page as it was when the step failed is what a rerun would have to reproduce
+                error_log["trace"] = tracer.path
+                tracer.record(driver, error_log)
+            logs_output.append(error_log)
+            yield from release_steps(block=True)
+            metrics.record_step(test_name, error_log)
+            yield error_log
+        finally:
+            if recorder is not None:
+                try:
+                    if driver is not None:
+                        recorder.add(driver, drain_network_events(driver), len(test_case["steps"]) - 1)
+                    recorder.save(recording_path(test_case.get("name", ""), csv_row))
+                except Exception as e:
+                    print(f"Error saving network recording: {e}")
+            if screencast is not None:
+                try:
+                    screencast.stop()
+                except Exception as e:
+                    print(f"Error saving screencast: {e}")
+            if tracer is not None:
+                try:
+                    tracer.close()
+                except Exception as e:
+                    print(f"Error saving trace: {e}")
+            if context_id is not None:
+                host.close_context(context_id)
+            cleanup_driver(driver, profile_dir)
+            if browser_counted:
+                metrics.add("autotest_active_browsers", -1, mode=browser_mode)
+            if watch is not None:
+                get_watchdog().unregister(watch)
+            if replay_server is not None:
+                replay_server.shutdown()
+                replay_server.server_close()
+            # Only checks of steps never released (the run was abandoned) are still outstanding
+            resolve_visual_checks(pending_visual_checks)
+            iteration_passed = all(is_step_passed(log) for log in logs_output[iteration_start:])
+            metrics.inc("autotest_runs_total", test=test_name, outcome="passed" if iteration_passed else "failed")
+            try:
+                timeouts.save()
+            except Exception as e:
+                print(f"Error saving timeout model: {e}")
+    return logs_output
+
+def build_case_graph(test_cases, selected_names):
+    """Map each selected case to the selected cases it depends on.
+
+    Dependencies on cases that are not selected are ignored. Raises ValueError
+    for unknown cases or dependency cycles.
+    """
+    by_name = {tc["name"]: tc for tc in test_cases}
+    missing = [name for name in selected_names if name not in by_name]
+    if missing:
+        raise ValueError(f"Unknown test case(s): {', '.join(missing)}")
+    selected = set(selected_names)
+    graph = {name: [dep for dep in by_name[name].get("depends_on", []) if dep in selected] for name in selected_names}
+
+    # Depth-first search for cycles
+    state = {}
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "active":
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = "active"
+        for dep in graph[name]:
+            visit(dep, path + [name])
+        state[name] = "done"
+    for name in selected_names:
+        visit(name, [])
+    return graph
+
+def critical_path_weights(graph, unit_costs):
+    """Longest chain of unit cost from each case to the end of the suite, including itself"""
+    dependents = {name: [] for name in graph}
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents[dep].append(name)
+    weights = {}
+    def weight(name):
+        if name not in weights:
+            weights[name] = unit_costs[name] + max((weight(child) for child in dependents[name]), default=0)
+        return weights[name]
+    for name in graph:
+        weight(name)
+    return weights
+
+def suite_units(selected_names, csv_data=None, repeat=1):
+    """Units of a suite per case as (label, key, csv_row, repeat); one per CSV row, else one per repeat"""
+    units = {}
+    for name in selected_names:
+        if csv_data is not None:
+            units[name] = [(row.get("LoginEmail", f"Row {idx+1}"), f"row:{idx}", row, repeat) for idx, row in csv_data.iterrows()]
+        else:
+            units[name] = [(f"Run {r+1}", f"run:{r}", None, 1) for r in range(repeat)]
+    return units
+
+def simulate_makespan(graph, durations, priorities, max_workers):
+    """Wall-clock of list-scheduling units on max_workers by priority, releasing cases once their dependencies finish"""
+    pending = {name: list(units) for name, units in durations.items()}
+    remaining = {name: len(units) for name, units in durations.items()}
+    finished, released, ready, running = {}, set(), [], []
+    now = 0.0
+    while True:
+        changed = True
+        while changed:
+            changed = False
+            for name in graph:
+                if name in released or not all(dep in finished for dep in graph[name]):
+                    continue
+                released.add(name)
+                changed = True
+                if not pending[name]:
+                    finished[name] = now
+                ready.extend((priorities[(name, key)], name, seconds) for key, seconds in pending[name])
+        ready.sort(reverse=True)
+        while ready and len(running) < max_workers:
+            _, name, seconds = ready.pop(0)
+            heapq.heappush(running, (now + seconds, name))
+        if not running:
+            return now
+        now, name = heapq.heappop(running)
+        remaining[name] -= 1
+        if remaining[name] == 0:
+            finished[name] = now
+
+def plan_suite(test_cases, selected_names, csv_data=None, repeat=1, max_workers=1, unit_stats=None):
+    """Order a suite's units from their history so the slowest chains and likely failures start first.
+
+    Each unit's duration is its EWMA from the rollups' units table, falling
+    back to the case's average and then to PLANNER_DEFAULT_STEP_SECONDS per
+    step. Priority is the unit's duration plus the longest dependent chain
+    after its case, scaled up by its failure rate. Returns the priorities,
+    the estimates and the predicted makespan in seconds.
+    """
+    graph = build_case_graph(test_cases, selected_names)
+    by_name = {tc["name"]: tc for tc in test_cases}
+    unit_stats = load_rollups().get("units", {}) if unit_stats is None else unit_stats
+    workers = max(1, int(max_workers))
+
+    durations, failure_rates = {}, {}
+    for name, units in suite_units(selected_names, csv_data, repeat).items():
+        history = [bucket for bucket in unit_stats.values() if bucket["test_name"] == name]
+        known = [bucket["duration"] for bucket in history if bucket.get("duration")]
+        case_duration = float(np.mean(known)) if known else PLANNER_DEFAULT_STEP_SECONDS * max(len(by_name[name]["steps"]), 1)
+        case_runs = sum(bucket["runs"] for bucket in history)
+        case_failure_rate = sum(bucket["failures"] for bucket in history) / case_runs if case_runs else 0.0
+        durations[name] = []
+        for _, key, row, unit_repeat in units:
+            bucket = unit_stats.get(f"{name}||{unit_identity(tag_csv_row({}, row))}")
+            seconds = bucket["duration"] if bucket and bucket.get("duration") else case_duration
+            durations[name].append((key, seconds * unit_repeat))
+            failure_rates[(name, key)] = bucket["failures"] / bucket["runs"] if bucket and bucket["runs"] else case_failure_rate
+
+    # A case on many workers takes roughly its longest unit or its share of the total, whichever is larger
+    case_costs = {name: max([s for _, s in units] + [sum(s for _, s in units) / workers]) if units else 0.0
+                  for name, units in durations.items()}
+    weights = critical_path_weights(graph, case_costs)
+    priorities = {
+        (name, key): (weights[name] - case_costs[name] + seconds) * (1 + PLANNER_FAILURE_WEIGHT * failure_rates[(name, key)])
+        for name, units in durations.items() for key, seconds in units
+    }
+    return {
+        "priorities": priorities,
+        "durations": {name: dict(units) for name, units in durations.items()},
+        "failure_rates": failure_rates,
+        "predicted_makespan": round(simulate_makespan(graph, durations, priorities, workers), 1),
+    }
+
+def step_prefix(test_case):
+    """Key and length of a case's leading steps up to its first click (usually sign-in)"""
+    steps = test_case.get("steps", [])
+    clicks = [i for i, step in enumerate(steps[:BREAKER_PREFIX_MAX_STEPS]) if step.get("action") == "click"]
+    length = clicks[0] + 1 if clicks else min(len(steps), 1)
+    key = hashlib.sha1(json.dumps(steps[:length], sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return key, length
+
+def failed_in_prefix(logs, prefix_length):
+    """Whether a unit's first failure happened within its shared prefix (or before any step ran)"""
+    for log in logs:
+        if not is_step_passed(log):
+            step_index = log.get("step_index")
+            return step_index is None or step_index < prefix_length
+    return False
+
+class CircuitBreaker:
+    """Fails fast when units sharing a step prefix keep failing inside it.
+
+    Each prefix keeps its last BREAKER_WINDOW outcomes. Once min_samples are in
+    and the failing share reaches failure_rate the circuit opens and units with
+    that prefix are skipped. After cooldown seconds one unit is let through;
+    its outcome closes the circuit or opens it again. A probe that never
+    reports back is given up after another cooldown. allow() and record()
+    take optional per-run settings overriding the process-wide thresholds.
+    """
+
+    def __init__(self, min_samples=BREAKER_MIN_SAMPLES, failure_rate=BREAKER_FAILURE_RATE, cooldown=BREAKER_COOLDOWN):
+        self.lock = threading.Lock()
+        self.circuits = {}
+        self.configure(min_samples, failure_rate, cooldown)
+
+    def configure(self, min_samples, failure_rate, cooldown):
+        with self.lock:
+            self.min_samples = max(1, int(min_samples))
+            self.failure_rate = float(failure_rate)
+            self.cooldown = float(cooldown)
+
+    def _circuit(self, key, label):
+        circuit = self.circuits.setdefault(key, {"label": label, "outcomes": [], "opened_at": None,
+                                                 "reason": "", "probing": None})
+        circuit["label"] = label or circuit["label"]
+        return circuit
+
+    def _setting(self, settings, name):
+        return (settings or {}).get(name, getattr(self, name))
+
+    def allow(self, key, settings=None):
+        """None when a unit with this prefix may run, otherwise why it should be skipped"""
+        with self.lock:
+            circuit = self.circuits.get(key)
+            if circuit is None or circuit["opened_at"] is None:
+                return None
+            now = time.monotonic()
+            cooldown = float(self._setting(settings, "cooldown"))
+            # A probe whose unit was abandoned without reporting must not hold the circuit open forever
+            since = circuit["opened_at"] if circuit["probing"] is None else circuit["probing"]
+            if now - since >= cooldown:
+                circuit["probing"] = now
+                return None
+            return circuit["reason"]
+
+    def abandon(self, key):
+        """Give up an outstanding probe of this prefix, so the next unit may probe"""
+        with self.lock:
+            circuit = self.circuits.get(key)
+            if circuit is not None and circuit["probing"] is not None:
+                circuit["probing"] = None
+                circuit["opened_at"] = time.monotonic() - float(self.cooldown)
+
+    def trip(self, key, label, reason):
+        with self.lock:
+            circuit = self._circuit(key, label)
+            circuit.update(opened_at=time.monotonic(), reason=reason, probing=None)
+
+    def record(self, key, label, failed, settings=None):
+        """Add a unit's outcome; failed means it failed within the prefix"""
+        with self.lock:
+            circuit = self._circuit(key, label)
+            min_samples = max(1, int(self._setting(settings, "min_samples")))
+            failure_rate = float(self._setting(settings, "failure_rate"))
+            if circuit["probing"] is not None:
+                circuit["probing"] = None
+                if failed:
+                    circuit["opened_at"] = time.monotonic()
+                else:
+                    circuit.update(outcomes=[], opened_at=None, reason="")
+                return
+            circuit["outcomes"] = (circuit["outcomes"] + [bool(failed)])[-BREAKER_WINDOW:]
+            failures = sum(circuit["outcomes"])
+            if (circuit["opened_at"] is None and len(circuit["outcomes"]) >= min_samples
+                    and failures / len(circuit["outcomes"]) >= failure_rate):
+                circuit["opened_at"] = time.monotonic()
+                circuit["reason"] = f"{failures}/{len(circuit['outcomes'])} recent runs failed during '{circuit['label']}'"
+
+    def reset(self, key=None):
+        with self.lock:
+            if key is None:
+                self.circuits.clear()
+            else:
+                self.circuits.pop(key, None)
+
+    def open_circuits(self):
+        """Open circuits as {key, label, reason, open_for}"""
+        now = time.monotonic()
+        with self.lock:
+            return [{"key": key, "label": circuit["label"], "reason": circuit["reason"],
+                     "open_for": round(now - circuit["opened_at"])}
+                    for key, circuit in self.circuits.items() if circuit["opened_at"] is not None]
+
+@st.cache_resource
+def get_circuit_breaker():
+    """Process-wide circuit breaker shared by UI and scheduled runs"""
+    return CircuitBreaker()
+
+def entry_url(test_case, csv_row=None):
+    """URL of a case's first visit step, if it is an http(s) URL"""
+    visit = next((step for step in test_case.get("steps", []) if step.get("action") == "visit"), None)
+    url = substitute_placeholders(visit.get("url", ""), csv_row) if visit else ""
+    return url if url.startswith(("http://", "https://")) else None
+
+def probe_url(url, timeout=PREFLIGHT_TIMEOUT):
+    """Cheap pre-flight request; None when the server answers below 500, otherwise what went wrong"""
+    request = urllib.request.Request(url, headers={"User-Agent": "AutomatedTest pre-flight"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return None if response.status < 500 else f"HTTP {response.status}"
+    except urllib.error.HTTPError as e:
+        return None if e.code < 500 else f"HTTP {e.code}"
+    except Exception as e:
+        return f"unreachable ({e})"
+
+def run_suite(test_cases, selected_names, headless=True, repeat=1, csv_data=None, max_workers=1, writers=None,
+              breaker=None, preflight=False, plan=None, breaker_settings=None, **run_options):
+    """Run the selected cases across a pool of browsers, honouring depends_on.
+
+    Every CSV row (or every repeat without CSV) is a unit. A case's units become
+    ready once all of its dependencies have finished; ready units start in the
+    order of plan_suite's priorities (computed here unless a plan is given). If
+    a dependency had a failing unit, its dependents are skipped. Yields (case name, unit label,
+    logs) as units finish. Extra keyword arguments are passed to run_test_case.
+    writers maps case names to ResultWriters: steps are streamed to them as
+    they finish, and units the stream already completed are not run again.
+    With a CircuitBreaker, units whose shared prefix keeps failing are skipped
+    as "Environment down"; preflight probes each case's entry URL first and
+    opens the circuit straight away when it is unreachable. breaker_settings
+    overrides the breaker's thresholds for this suite only.
+    """
+    graph = build_case_graph(test_cases, selected_names)
+    by_name = {tc["name"]: tc for tc in test_cases}
+    writers = writers or {}
+
+    plan = plan or plan_suite(test_cases, selected_names, csv_data, repeat, max_workers)
+
+    units = suite_units(selected_names, csv_data, repeat)
+    failed = set()
+    for name in selected_names:
+        completed = writers[name].completed_units() if name in writers else {}
+        if any(not passed for passed in completed.values()):
+            failed.add(name)
+        units[name] = [unit for unit in units[name] if unit[1] not in completed]
+
+    prefixes = {name: step_prefix(by_name[name]) for name in selected_names}
+    prefix_labels = {name: ", ".join(step_label(step) for step in by_name[name]["steps"][:prefixes[name][1]])
+                     for name in selected_names}
+    if breaker is not None and preflight and run_options.get("network_mode", "live") != "replay":
+        sample_row = csv_data.iloc[0] if csv_data is not None and len(csv_data) else None
+        probes = {}
+        for name in selected_names:
+            url = entry_url(by_name[name], sample_row)
+            if url is None:
+                continue
+            if url not in probes:
+                probes[url] = probe_url(url)
+            if probes[url]:
+                breaker.trip(prefixes[name][0], prefix_labels[name], f"pre-flight check of {url} failed: {probes[url]}")
+
+    remaining = {name: len(units[name]) for name in selected_names}
+    metrics = get_metrics()
+    # This suite's share of the queue gauges, so concurrent suites add up and an abandoned one is taken back out
+    published = {"autotest_queue_depth": 0, "autotest_units_running": 0}
+    started = set()
+    finished = set()
+    ready = []
+    running = {}
+
+    def release_ready_cases():
+        released = True
+        while released:
+            released = False
+            for name in selected_names:
+                if name in started or not all(dep in finished for dep in graph[name]):
+                    continue
+                started.add(name)
+                released = True
+                ready.extend((name, label, key, row, unit_repeat) for label, key, row, unit_repeat in units[name])
+                if not units[name]:
+                    # Every unit already finished in an earlier, resumed run
+                    finished.add(name)
+        ready.sort(key=lambda unit: plan["priorities"].get((unit[0], unit[2]), 0), reverse=True)
+
+    def run_unit(name, key, row, unit_repeat):
+        logs = []
+        for log in run_test_case(by_name[name], headless=headless, repeat=unit_repeat, csv_row=row, **run_options):
+            logs.append(log)
+            if name in writers:
+                writers[name].write_step(key, log)
+        return logs
+
+    def publish_queue():
+        current = {"autotest_queue_depth": sum(remaining.values()) - len(running),
+                   "autotest_units_running": len(running)}
+        for metric, value in current.items():
+            metrics.add(metric, value - published[metric])
+            published[metric] = value
+
+    def finish_unit(name, key, logs, streamed):
+        if name in writers:
+            if not streamed:
+                for log in logs:
+                    writers[name].write_step(key, log)
+            writers[name].end_unit(key, all(is_step_passed(log) for log in logs))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+            release_ready_cases()
+            while ready or running:
+                while ready and len(running) < max(1, int(max_workers)):
+                    name, label, key, row, unit_repeat = ready.pop(0)
+                    failed_deps = [dep for dep in graph[name] if dep in failed]
+                    skip_status = f"⏭️ Skipped: dependency '{failed_deps[0]}' failed" if failed_deps else None
+                    if skip_status is None and breaker is not None:
+                        reason = breaker.allow(prefixes[name][0], breaker_settings)
+                        if reason:
+                            skip_status = f"🔌 Environment down: {reason}"
+                    if skip_status:
+                        skipped = tag_csv_row({"test_name": name, "status": skip_status}, row)
+                        finish_unit(name, key, [skipped], streamed=False)
+                        metrics.inc("autotest_units_skipped_total", test=name)
+                        failed.add(name)
+                        remaining[name] -= 1
+                        if remaining[name] == 0:
+                            finished.add(name)
+                            release_ready_cases()
+                        yield name, label, [skipped]
+                        continue
+                    running[pool.submit(run_unit, name, key, row, unit_repeat)] = (name, label, key)
+
+                publish_queue()
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, label, key = running.pop(future)
+                    try:
+                        logs = future.result()
+                        finish_unit(name, key, logs, streamed=True)
+                    except Exception as e:
+                        logs = [{"test_name": name, "status": f"❌ Error: {e}"}]
+                        finish_unit(name, key, logs, streamed=False)
+                    if breaker is not None:
+                        breaker.record(prefixes[name][0], prefix_labels[name], failed_in_prefix(logs, prefixes[name][1]),
+                                       breaker_settings)
+                    if any(not is_step_passed(log) for log in logs):
+                        failed.add(name)
+                    remaining[name] -= 1
+                    if remaining[name] == 0:
+                        finished.add(name)
+                        release_ready_cases()
+                    yield name, label, logs
+    finally:
+        for metric, value in published.items():
+            metrics.add(metric, -value)
+        if breaker is not None:
+            # Units of an abandoned suite never report; any probe among them is given up
+            for name, _, _ in running.values():
+                breaker.abandon(prefixes[name][0])
+
+def result_csv_path(result_data):
+    """CSV file a saved result ran with, if recorded (older results nest it under "logs")"""
+    csv_used = result_data.get("csv_used")
+    if csv_used is None and isinstance(result_data.get("logs"), dict):
+        csv_used = result_data["logs"].get("csv_used")
+    return csv_used
+
+def failed_units(result_data):
+    """Failing units of a saved result: case, CSV row identity and the first failing step"""
+    failures = []
+    for position, unit in enumerate(split_into_units(extract_step_logs(result_data))):
+        failing = [log for log in unit if not is_step_passed(log)]
+        if failing:
+            failures.append({
+                "position": position,
+                "test_name": unit[0].get("test_name", result_data.get("test_name", "")),
+                "row_index": unit[0].get("row_index"),
+                "LoginEmail": unit[0].get("LoginEmail"),
+                "failed_step": failing[0].get("step_index"),
+            })
+    return failures
+
+def result_steps_frame(result_data):
+    """Step logs of a result keyed for alignment with another run: case, unit, repeat occurrence and step.
+
+    The unit is unit_identity (LoginEmail, else CSV row, else empty); the
+    occurrence tells repeats of the same unit apart. Logs of a unit that
+    failed before reaching a step get step_index -1.
+    """
+    logs = pd.DataFrame(extract_step_logs(result_data)).reindex(columns=[
+        "test_name", "LoginEmail", "row_index", "step_index", "action", "selector_value", "url",
+        "status", "actual_url", "notifications", "duration"])
+    logs["test_name"] = logs["test_name"].fillna(result_data.get("test_name", "")).astype(str)
+    email = logs["LoginEmail"].fillna("").astype(str)
+    row_index = pd.to_numeric(logs["row_index"], errors="coerce")
+    rows = "row:" + row_index.astype("Int64").astype(str)
+    logs["unit"] = email.where(email != "", rows.where(row_index.notna(), ""))
+    logs["step_index"] = pd.to_numeric(logs["step_index"], errors="coerce").fillna(-1).astype(int)
+    logs["occurrence"] = logs.groupby(["test_name", "unit", "step_index"]).cumcount()
+    logs["status"] = logs["status"].fillna("").astype(str)
+    logs["passed"] = logs["status"].str.startswith("✅")
+    logs["actual_url"] = logs["actual_url"].fillna("").astype(str)
+    logs["duration"] = pd.to_numeric(logs["duration"], errors="coerce")
+    return logs.drop(columns=["LoginEmail", "row_index"])
+
+def diff_results(base_data, head_data, duration_ratio=DIFF_DURATION_RATIO, min_seconds=DIFF_DURATION_MIN_SECONDS):
+    """Align two results step by step (outer join on DIFF_KEY) and flag what changed from base to head.
+
+    change is "regressed", "fixed", "changed" (different status, same
+    outcome), "added" or "removed"; lost marks coverage head gave up (a step
+    that passed in base and is gone, or an added step that fails);
+    url_mismatch compares the URLs the step ended on; slower applies the
+    duration thresholds; new_notifications joins the toasts and alerts head
+    showed that base did not. Rows with any finding have flagged set.
+    """
+    base, head = result_steps_frame(base_data), result_steps_frame(head_data)
+    diff = base.merge(head, on=DIFF_KEY, how="outer", suffixes=("_base", "_head"), indicator=True)
+    both = diff["_merge"] == "both"
+    passed_base = diff["passed_base"].fillna(False).astype(bool)
+    passed_head = diff["passed_head"].fillna(False).astype(bool)
+    diff["change"] = np.select(
+        [diff["_merge"] == "left_only", diff["_merge"] == "right_only",
+         both & passed_base & ~passed_head, both & ~passed_base & passed_head,
+         both & (diff["status_base"] != diff["status_head"])],
+        ["removed", "added", "regressed", "fixed", "changed"], default="")
+    diff["lost"] = (((diff["change"] == "removed") & passed_base)
+                    | ((diff["change"] == "added") & ~passed_head))
+    diff["url_mismatch"] = (both & (diff["actual_url_base"] != diff["actual_url_head"])
+                            & (diff["actual_url_base"] != "") & (diff["actual_url_head"] != ""))
+    diff["duration_change"] = (diff["duration_head"] - diff["duration_base"]).round(3)
+    diff["slower"] = (both & (diff["duration_head"] > diff["duration_base"] * duration_ratio)
+                      & (diff["duration_change"] >= min_seconds))
+
+    # Notifications are compared as sets per step: explode both sides and anti-join
+    def notifications(frame):
+        exploded = frame[DIFF_KEY + ["notifications"]].explode("notifications").dropna(subset=["notifications"])
+        return exploded.astype({"notifications": str}).drop_duplicates()
+    new = notifications(head).merge(notifications(base), on=DIFF_KEY + ["notifications"], how="left", indicator=True)
+    new = new[new["_merge"] == "left_only"].groupby(DIFF_KEY)["notifications"].agg("; ".join).rename("new_notifications")
+    diff = diff.merge(new, left_on=DIFF_KEY, right_index=True, how="left")
+    has_new = diff["new_notifications"].notna()
+    diff["new_notifications"] = diff["new_notifications"].where(has_new, "")
+
+    diff["action"] = diff["action_head"].combine_first(diff["action_base"])
+    diff["target"] = (diff["selector_value_head"].combine_first(diff["selector_value_base"]).fillna("")
+                      .where(lambda target: target != "", diff["url_head"].combine_first(diff["url_base"]).fillna("")))
+    diff["flagged"] = (diff["change"] != "") | diff["url_mismatch"] | diff["slower"] | has_new
+    return diff[DIFF_KEY + ["action", "target", "status_base", "status_head", "change", "lost", "actual_url_base",
+                            "actual_url_head", "url_mismatch", "duration_base", "duration_head", "duration_change",
+                            "slower", "new_notifications", "flagged"]].sort_values(DIFF_KEY, ignore_index=True)
+
+def diff_summary(diff):
+    """Counts of each kind of finding in a diff_results frame"""
+    counts = diff["change"].value_counts()
+    summary = {kind: int(counts.get(kind, 0)) for kind in ["regressed", "fixed", "changed", "added", "removed"]}
+    summary["lost"] = int(diff["lost"].sum())
+    summary["url_mismatch"] = int(diff["url_mismatch"].sum())
+    summary["slower"] = int(diff["slower"].sum())
+    summary["new_notifications"] = int((diff["new_notifications"] != "").sum())
+    return summary
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def _diff_result_files_cached(base_path, head_path, signatures, duration_ratio, min_seconds):
+    return diff_results(read_json_file(base_path, {}), read_json_file(head_path, {}), duration_ratio, min_seconds)
+
+def diff_result_files(base_path, head_path, duration_ratio=DIFF_DURATION_RATIO, min_seconds=DIFF_DURATION_MIN_SECONDS):
+    """diff_results of two result files, computed once per pair of file versions"""
+    signatures = (file_signature(base_path), file_signature(head_path))
+    return _diff_result_files_cached(base_path, head_path, signatures, duration_ratio, min_seconds)
+
+def resume_step(test_case, failed_step):
+    """Step to restart from: the last visit at or before the failing step, so the page is rebuilt.
+
+    A resumed run starts in a fresh browser, so the session that a sign-in or
+    any other click/input before that visit set up would be missing; such
+    cases restart from step 0.
+    """
+    if failed_step is None:
+        return 0
+    steps = test_case["steps"][:failed_step + 1]
+    visits = [i for i, step in enumerate(steps) if step.get("action") == "visit"]
+    if not visits or any(step.get("action") not in READ_ONLY_ACTIONS for step in steps[:visits[-1]]):
+        return 0
+    return visits[-1]
+
+def find_csv_row(csv_data, failure):
+    """CSV row a failing unit ran with, by row_index or else by LoginEmail"""
+    if csv_data is None:
+        return None
+    if failure["row_index"] is not None and failure["row_index"] in csv_data.index:
+        return csv_data.loc[failure["row_index"]]
+    if failure["LoginEmail"] is not None and "LoginEmail" in csv_data.columns:
+        matches = csv_data.index[csv_data["LoginEmail"] == failure["LoginEmail"]]
+        if len(matches):
+            return csv_data.loc[matches[0]]
+    return None
+
+def rerun_failures(result_data, result_name, test_cases, headless=True, from_failed_step=False, max_workers=1,
+                   progress=None, **run_options):
+    """Re-run only the failing units of a saved result and save the merged result.
+
+    Passing units are kept as they were; each failing unit is replaced by its
+    new logs. With from_failed_step, units restart at the visit preceding the
+    step that failed instead of from the top. The new result records
+    rerun_of=result_name. Returns (saved path, number of units rerun).
+    """
+    failures = failed_units(result_data)
+    units = split_into_units(extract_step_logs(result_data))
+    csv_path = result_csv_path(result_data)
+    csv_data = pd.read_csv(csv_path) if csv_path and os.path.exists(csv_path) else None
+    by_name = {tc["name"]: tc for tc in test_cases}
+
+    def rerun(failure):
+        test_case = by_name.get(failure["test_name"])
+        if test_case is None:
+            return 0, [{"test_name": failure["test_name"], "status": "❌ Error: test case no longer exists"}]
+        row = find_csv_row(csv_data, failure)
+        if row is None and (failure["row_index"] is not None or failure["LoginEmail"] is not None):
+            missing = {"test_name": failure["test_name"], "status": "❌ Error: CSV row for this unit is unavailable"}
+            missing.update({key: failure[key] for key in ("row_index", "LoginEmail") if failure[key] is not None})
+            return 0, [missing]
+        start = resume_step(test_case, failure["failed_step"]) if from_failed_step else 0
+        return start, list(run_test_case(test_case, headless=headless, csv_row=row, start_step=start, **run_options))
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        futures = {pool.submit(rerun, failure): failure for failure in failures}
+        for future in as_completed(futures):
+            failure = futures[future]
+            try:
+                start, logs = future.result()
+                # Steps that were not re-executed keep their original outcome
+                kept = [log for log in units[failure["position"]]
+                        if isinstance(log.get("step_index"), int) and log["step_index"] < start]
+                units[failure["position"]] = kept + logs
+            except Exception as e:
+                units[failure["position"]] = [{"test_name": failure["test_name"], "status": f"❌ Error: {e}"}]
+            done += 1
+            if progress:
+                progress(done, len(failures))
+
+    merged = [log for unit in units for log in unit]
+    test_name = result_data.get("test_name") or (merged[0].get("test_name", "rerun") if merged else "rerun")
+    path = save_test_result(merged, test_name, csv_used=csv_path, rerun_of=result_name, rerun_units=len(failures))
+    return path, len(failures)
+
+def parse_load_stages(text):
+    """Parse an arrival schedule like '60@0.5, 120@2, 30@0' into (seconds, arrivals per second) stages"""
+    stages = []
+    for part in str(text).split(","):
+        part = part.strip().lower().replace("s@", "@")
+        if not part:
+            continue
+        duration, _, rate = part.partition("@")
+        stages.append((float(duration), float(rate or 0)))
+    if not stages or any(duration <= 0 or rate < 0 for duration, rate in stages):
+        raise ValueError("Stages must look like '60@0.5, 120@2': seconds@arrivals-per-second")
+    return stages
+
+def arrival_offsets(stages, resolution=0.01):
+    """Arrival times (s from start); the rate ramps linearly to each stage's target and
+    an arrival is emitted each time the integrated rate crosses a whole user"""
+    offsets = []
+    expected = 0.0
+    stage_start, start_rate = 0.0, 0.0
+    for duration, target_rate in stages:
+        ticks = np.arange(0.0, duration, resolution)
+        rates = start_rate + (target_rate - start_rate) * ticks / duration
+        cumulative = expected + np.cumsum(rates * resolution)
+        crossed = np.floor(cumulative) > np.floor(np.concatenate(([expected], cumulative[:-1])))
+        offsets.extend(np.round(stage_start + ticks[crossed] + resolution, 3).tolist())
+        expected = float(cumulative[-1]) if len(cumulative) else expected
+        stage_start, start_rate = stage_start + duration, target_rate
+    return offsets
+
+def load_http_steps(test_name):
+    """Recorded document/XHR requests of a test case grouped by step index, for the HTTP backend"""
+    har_path = recording_path(test_name)
+    if not os.path.exists(har_path):
+        raise FileNotFoundError(f"No recording for '{test_name}'; run it once with Network Mode 'record'")
+    with open(har_path, "r") as f:
+        entries = json.load(f)["log"]["entries"]
+    steps = {}
+    for entry in entries:
+        if entry.get("_resourceType") in LOAD_HTTP_RESOURCE_TYPES:
+            steps.setdefault(entry.get("_stepIndex") or 0, []).append(entry)
+    return sorted(steps.items())
+
+def http_journey(http_steps, timeout=30):
+    """Replay one user's recorded requests against the live app; returns per-step samples"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    samples = []
+    for step_index, entries in http_steps:
+        started = time.perf_counter()
+        ok = True
+        for entry in entries:
+            request = entry["request"]
+            data = request.get("postData", {}).get("text")
+            headers = {"User-Agent": "TestingFramework_V2 load"}
+            if data is not None:
+                headers["Content-Type"] = "application/json" if data.lstrip().startswith(("{", "[")) else "application/x-www-form-urlencoded"
+            try:
+                with opener.open(urllib.request.Request(request["url"], data=data.encode("utf-8") if data else None,
+                                                        method=request["method"], headers=headers), timeout=timeout) as response:
+                    response.read()
+            except urllib.error.HTTPError as e:
+                ok = ok and e.code < 400
+            except Exception:
+                ok = False
+        samples.append({"step": f"{step_index + 1}. http ({len(entries)} req)", "latency": time.perf_counter() - started, "ok": ok})
+    return samples
+
+def browser_journey(test_case, csv_row=None, browser_mode="process"):
+    """Drive one virtual user through the case in a browser; returns per-step samples"""
+    return [
+        {"step": step_label(log), "latency": log.get("duration", 0.0), "ok": is_step_passed(log)}
+        for log in run_test_case(test_case, headless=True, repeat=1, csv_row=csv_row, browser_mode=browser_mode)
+    ]
+
+def run_load_test(test_case, stages, max_users, backend="browser", csv_data=None, progress=None):
+    """Ramp virtual users through a test case on an arrival-rate schedule.
+
+    Arrivals follow the stages; at most max_users journeys run at once and the
+    rest queue (queue time is reported). Returns a report with one sample per
+    step and one record per journey, offsets in seconds from the start.
+    progress(done, total) is called from the calling thread as journeys finish.
+    """
+    offsets = arrival_offsets(stages)
+    http_steps = load_http_steps(test_case["name"]) if backend == "http" else None
+    rows = [row for _, row in csv_data.iterrows()] if csv_data is not None and len(csv_data) else [None]
+    started = time.perf_counter()
+    samples, journeys = [], []
+    lock = threading.Lock()
+
+    def journey(number, arrival):
+        begin = time.perf_counter() - started
+        try:
+            if backend == "http":
+                steps = http_journey(http_steps)
+            else:
+                steps = browser_journey(test_case, rows[number % len(rows)],
+                                        browser_mode="context" if backend == "context" else "process")
+            error = None
+        except Exception as e:
+            steps, error = [], str(e)
+        end = time.perf_counter() - started
+        ok = error is None and bool(steps) and all(step["ok"] for step in steps)
+        with lock:
+            journeys.append({"vu": number, "arrival": arrival, "queued": round(begin - arrival, 3),
+                             "start": round(begin, 3), "end": round(end, 3), "ok": ok, "error": error})
+            offset = begin
+            for step in steps:
+                offset += step["latency"]
+                samples.append(dict(step, vu=number, t=round(offset, 3)))
+
+    def report_progress():
+        if progress:
+            with lock:
+                done = len(journeys)
+            progress(done, len(offsets))
+
+    # Workers only record; the caller's thread (which may own a Streamlit context) reports progress
+    # while it waits for the next arrival and then for the last journeys
+    with ThreadPoolExecutor(max_workers=max(1, int(max_users))) as pool:
+        pending = set()
+        for number, arrival in enumerate(offsets):
+            delay = arrival - (time.perf_counter() - started)
+            while delay > 0:
+                if not pending:
+                    time.sleep(delay)
+                    break
+                done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                if done:
+                    report_progress()
+                delay = arrival - (time.perf_counter() - started)
+            pending.add(pool.submit(journey, number, arrival))
+        while pending:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            report_progress()
+
+    return {
+        "test_name": test_case["name"],
+        "timestamp": datetime.now().isoformat(),
+        "backend": backend,
+        "stages": stages,
+        "max_users": max_users,
+        "samples": samples,
+        "journeys": journeys,
+    }
+
+def summarise_load_report(report, bucket_seconds=10):
+    """(step percentile table, timeline of throughput, error rate and latency) from a load report"""
+    samples = pd.DataFrame(report["samples"], columns=["step", "latency", "ok", "vu", "t"])
+    journeys = pd.DataFrame(report["journeys"], columns=["vu", "arrival", "queued", "start", "end", "ok", "error"])
+
+    if samples.empty:
+        step_table = pd.DataFrame()
+    else:
+        grouped = samples.groupby("step", sort=False)["latency"]
+        step_table = grouped.quantile([0.5, 0.9, 0.95, 0.99]).unstack()
+        step_table.columns = ["p50", "p90", "p95", "p99"]
+        step_table.insert(0, "count", grouped.size())
+        step_table["error_rate"] = 1 - samples.groupby("step", sort=False)["ok"].mean()
+        step_table = step_table.reset_index()
+
+    if journeys.empty:
+        return step_table, pd.DataFrame()
+    journeys["bucket"] = (journeys["end"] // bucket_seconds) * bucket_seconds
+    timeline = journeys.groupby("bucket").agg(completed=("vu", "size"), failures=("ok", lambda ok: int((~ok.astype(bool)).sum())))
+    timeline["throughput_per_s"] = timeline["completed"] / bucket_seconds
+    timeline["error_rate"] = timeline["failures"] / timeline["completed"]
+    if not samples.empty:
+        samples["bucket"] = (samples["t"] // bucket_seconds) * bucket_seconds
+        timeline["p95_step_latency"] = samples.groupby("bucket")["latency"].quantile(0.95)
+    # Journeys in flight at each bucket boundary
+    boundaries = timeline.index.to_numpy()
+    starts = journeys["start"].to_numpy()
+    ends = journeys["end"].to_numpy()
+    timeline["active_users"] = ((starts[None, :] <= boundaries[:, None]) & (ends[None, :] > boundaries[:, None])).sum(axis=1)
+    return step_table, timeline.reset_index().rename(columns={"bucket": "t"})
+
+def save_load_report(report):
+    """Write a load report next to the others and return its path"""
+    safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', report["test_name"])
+    path = os.path.join(LOAD_REPORTS_DIR, f"{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f)
+    return path
+
+class FixtureRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler for the benchmark fixture that keeps the console quiet"""
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_fixture(directory=BENCH_FIXTURE_DIR):
+    """Serve the benchmark fixture site on an ephemeral local port; the URL is server.base_url"""
+    handler = functools.partial(FixtureRequestHandler, directory=os.path.abspath(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def git_revision():
+    """Commit the working tree is at, suffixed -dirty when it has local changes"""
+    try:
+        result = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+def process_rss(pids):
+    """Resident memory in bytes summed over the given processes"""
+    total = 0
+    for pid in pids:
+        if psutil is not None:
+            try:
+                total += psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                pass
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+def timing_stats(samples):
+    """Median, p95, mean and min of durations given in seconds, reported in milliseconds"""
+    values = np.asarray(samples, dtype=float) * 1000
+    if not len(values):
+        return {"n": 0}
+    return {
+        "n": int(len(values)),
+        "median_ms": round(float(np.median(values)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "mean_ms": round(float(values.mean()), 2),
+        "min_ms": round(float(values.min()), 2),
+    }
+
+def bench_options(profile_dir):
+    """Headless options matching run_test_case, with a throwaway profile"""
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-extensions")
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    return options
+
+def bench_driver_startup(iterations):
+    """Cost of starting and quitting a browser session; the first start includes driver resolution"""
+    starts, quits = [], []
+    for _ in range(iterations):
+        profile_dir = new_profile_dir()
+        started = time.perf_counter()
+        driver = create_chrome_driver(bench_options(profile_dir))
+        starts.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        cleanup_driver(driver, profile_dir)
+        quits.append(time.perf_counter() - started)
+    return {
+        "first_start_ms": round(starts[0] * 1000, 2),
+        "start": timing_stats(starts[1:] or starts),
+        "quit": timing_stats(quits),
+    }
+
+def bench_primitives(base_url, iterations):
+    """find_element against a raw WebDriver lookup, screenshot cost and memory, in one warm browser"""
+    profile_dir = new_profile_dir()
+    driver = create_chrome_driver(bench_options(profile_dir))
+    try:
+        driver.get(f"{base_url}/index.html")
+        harness, raw, shots, shot_sizes = [], [], [], []
+        shot_path = os.path.join(profile_dir, "bench.png")
+        for _ in range(iterations):
+            started = time.perf_counter()
+            find_element(driver, "id", "email")
+            harness.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            driver.find_element(By.ID, "email")
+            raw.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            driver.save_screenshot(shot_path)
+            shots.append(time.perf_counter() - started)
+            shot_sizes.append(os.path.getsize(shot_path))
+        memory = {
+            "python_rss_bytes": process_rss([os.getpid()]),
+            "browser_rss_bytes": process_rss(find_profile_processes(profile_dir)),
+        }
+    finally:
+        cleanup_driver(driver, profile_dir)
+    find_stats, raw_stats = timing_stats(harness), timing_stats(raw)
+    return {
+        "find_element": find_stats,
+        "raw_find_element": raw_stats,
+        "find_element_overhead_ms": round(find_stats["median_ms"] - raw_stats["median_ms"], 2),
+        "screenshot": timing_stats(shots),
+        "screenshot_bytes": int(np.median(shot_sizes)),
+        "memory": memory,
+    }
+
+def bench_run_test_case(base_url, iterations):
+    """Full runs of BENCH_STEPS; the fixture answers instantly, so step time is the runner's own cost"""
+    test_case = {"name": "benchmark", "steps": BENCH_STEPS}
+    row = pd.Series({"base_url": base_url, "LoginEmail": "bench@example.com", "Password": "secret"})
+    runs, per_action, failures = [], {}, []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        logs = list(run_test_case(test_case, headless=True, csv_row=row))
+        runs.append(time.perf_counter() - started)
+        for log in logs:
+            per_action.setdefault(log.get("action", "error"), []).append(log.get("duration", 0))
+            if not is_step_passed(log):
+                failures.append(log.get("status"))
+            if log.get("screenshot") and os.path.exists(log["screenshot"]):
+                os.remove(log["screenshot"])
+    return {
+        "run": timing_stats(runs),
+        "actions": {action: timing_stats(samples) for action, samples in per_action.items()},
+        "failures": failures[:20],
+    }
+
+def run_benchmarks(iterations=5, startup_iterations=3):
+    """Measure the runner's own overhead against the local fixture site"""
+    server = serve_fixture()
+    try:
+        report = {
+            "revision": git_revision(),
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "driver": bench_driver_startup(max(1, startup_iterations)),
+            "primitives": bench_primitives(server.base_url, max(1, iterations * 10)),
+            "run_test_case": bench_run_test_case(server.base_url, max(1, iterations)),
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
+
+def save_benchmark(report, path=None):
+    """Write a benchmark report to benchmarks/results/<revision>_<timestamp>.json"""
+    if path is None:
+        os.makedirs(BENCH_RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(BENCH_RESULTS_DIR, f"{report['revision']}_{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
 
-        except Exception as e:
-            logs_output.append({"status": f"❌ Error: {e}"})
-        finally:
-            cleanup_driver(driver, profile_dir)
-    return logs_output
+def flatten_benchmark(report, prefix=""):
+    """Comparable metrics of a report as {dotted.path: value}; only *_ms and *_bytes leaves count"""
+    metrics = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten_benchmark(value, f"{path}."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_bytes")):
+            metrics[path] = value
+    return metrics
+
+def compare_benchmarks(base, head, threshold=BENCH_REGRESSION_THRESHOLD):
+    """Metric-by-metric comparison of two reports; every metric is lower-is-better"""
+    frame = pd.DataFrame({"base": pd.Series(flatten_benchmark(base), dtype=float),
+                          "head": pd.Series(flatten_benchmark(head), dtype=float)}).dropna()
+    frame["change"] = (frame["head"] - frame["base"]) / frame["base"].where(frame["base"] != 0)
+    frame["regression"] = frame["change"] > threshold
+    return frame.rename_axis("metric").reset_index().sort_values("change", ascending=False)
 
-def create_excel_with_screenshots(logs_df, writer):
-    """Create Excel file with embedded screenshots"""
+def create_excel_with_screenshots(logs_df, writer, progress=None):
+    """Create Excel file with embedded screenshots; progress(fraction) is called per row"""
     workbook = writer.book
+    rows_done = 0
     cell_format = workbook.add_format({'valign': 'top'})
     header_format = workbook.add_format({
         'bold': True,
@@ -665,6 +4377,9 @@ def create_excel_with_screenshots(logs_df, writer):
                         # Auto-adjust column width
                         max_len = max(len(str(cell_value)), len(col_name)) + 2
                         worksheet.set_column(col_num, col_num, max_len)
+                rows_done += 1
+                if progress:
+                    progress(rows_done / len(logs_df))
     else:
         # Fallback for tests without LoginEmail
         sheet_name = 'Test Results'
@@ -686,6 +4401,381 @@ def create_excel_with_screenshots(logs_df, writer):
                     worksheet.write(row_num, col_num, str(cell_value), cell_format)
                     max_len = max(len(str(cell_value)), len(col_name)) + 2
                     worksheet.set_column(col_num, col_num, max_len)
+            if progress:
+                progress(row_num / len(logs_df))
+
+def report_path(result_id, fmt):
+    """Location of a cached report artifact for a result"""
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(result_id))
+    return os.path.join(REPORTS_DIR, f"{safe_id}.{fmt}")
+
+def screenshot_data_uri(value):
+    """Thumbnail of a screenshot path or base64 image as a data URI, or None when it cannot be read"""
+    try:
+        if isinstance(value, str) and value.startswith(SCREENCAST_PREFIX):
+            value = screencast_still(value)
+        if isinstance(value, str) and os.path.exists(value):
+            img = Image.open(value)
+        elif isinstance(value, str) and value:
+            b64_data = value.split(",", 1)[1] if value.startswith("data:image") else value
+            img = Image.open(io.BytesIO(base64.b64decode(b64_data)))
+        else:
+            return None
+        with img:
+            img.thumbnail(REPORT_THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            img.convert("RGB").save(buffer, format="PNG")
+        return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    except Exception:
+        return None
+
+def write_html_report(logs_df, path, title, progress=None):
+    """Self-contained HTML report with inline screenshot thumbnails"""
+    failed = sum(1 for log in logs_df.to_dict("records") if not is_step_passed(log))
+    rows = []
+    for number, record in enumerate(logs_df.to_dict("records"), start=1):
+        cells = []
+        for column in logs_df.columns:
+            value = record[column]
+            uri = screenshot_data_uri(value) if column == "screenshot" else None
+            if uri:
+                cells.append(f'<td><img src="{uri}" alt="screenshot"></td>')
+            else:
+                text = "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+                cells.append(f"<td>{html.escape(text)}</td>")
+        row_class = "" if is_step_passed(record) else ' class="failed"'
+        rows.append(f"<tr{row_class}>{''.join(cells)}</tr>")
+        if progress:
+            progress(number / len(logs_df))
+    header = "".join(f"<th>{html.escape(str(column))}</th>" for column in logs_df.columns)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 24px; }}
+table {{ border-collapse: collapse; }}
+th {{ background: #1F4E78; color: #fff; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; vertical-align: top; }}
+tr.failed td {{ background: #fdecea; }}
+</style></head><body>
+<h1>{html.escape(title)}</h1>
+<p>{len(logs_df)} step(s), {failed} failed. Generated {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.</p>
+<table><thead><tr>{header}</tr></thead><tbody>
+{chr(10).join(rows)}
+</tbody></table></body></html>
+""")
+
+def build_report(logs_df, fmt, path, title="", progress=None):
+    """Write one report format for a step-log DataFrame to path"""
+    if fmt == "csv":
+        logs_df.to_csv(path, index=False, encoding="utf-8-sig")
+    elif fmt == "xlsx":
+        with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+            create_excel_with_screenshots(logs_df, writer, progress)
+    elif fmt == "html":
+        write_html_report(logs_df, path, title, progress)
+    else:
+        raise ValueError(f"Unknown report format: {fmt}")
+
+class ReportJob:
+    """One report build; finished jobs point at the cached artifact"""
+
+    def __init__(self, result_id, fmt, path):
+        self.result_id = result_id
+        self.fmt = fmt
+        self.path = path
+        self.progress = 0.0
+        self.error = None
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.future is None or self.future.done()
+
+    @property
+    def ready(self):
+        return self.finished and self.error is None and os.path.exists(self.path)
+
+class ReportQueue:
+    """Background report builds keyed by (result id, format); artifacts are cached in REPORTS_DIR.
+
+    A cached artifact is reused as long as it is newer than its source, so
+    reruns and repeated downloads never rebuild the same report.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.prune()
+
+    def prune(self, max_age=REPORT_CACHE_MAX_AGE):
+        """Drop artifacts built more than max_age ago"""
+        cutoff = time.time() - max_age.total_seconds()
+        for entry in os.scandir(REPORTS_DIR):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    print(f"Error pruning report {entry.path}: {e}")
+
+    def _cached(self, result_id, fmt, source_mtime):
+        path = report_path(result_id, fmt)
+        if os.path.exists(path) and (source_mtime is None or os.path.getmtime(path) >= source_mtime):
+            return ReportJob(result_id, fmt, path)
+        return None
+
+    def status(self, result_id, fmt, source_mtime=None):
+        """The current job for an artifact, a finished job for a valid cached file, or None"""
+        with self.lock:
+            job = self.jobs.get((result_id, fmt))
+        if job is not None and not job.finished:
+            return job
+        cached = self._cached(result_id, fmt, source_mtime)
+        if cached is not None:
+            return cached
+        return job if job is not None and job.error else None
+
+    def submit(self, result_id, fmt, load_logs, source_mtime=None, title=""):
+        """Queue a build unless one is running or the cached artifact is current; returns the job"""
+        with self.lock:
+            job = self.jobs.get((result_id, fmt))
+            if job is not None and not job.finished:
+                return job
+            job = self._cached(result_id, fmt, source_mtime)
+            if job is None:
+                job = ReportJob(result_id, fmt, report_path(result_id, fmt))
+                job.future = self.pool.submit(self._build, job, load_logs, title or str(result_id))
+            self.jobs[(result_id, fmt)] = job
+            return job
+
+    def _build(self, job, load_logs, title):
+        root, ext = os.path.splitext(job.path)
+        partial_path = f"{root}.{uuid.uuid4().hex}.partial{ext}"
+        try:
+            logs_df = load_logs()
+            build_report(logs_df, job.fmt, partial_path, title,
+                         progress=lambda fraction: setattr(job, "progress", fraction))
+            # Readers only ever see a complete artifact
+            os.replace(partial_path, job.path)
+            job.progress = 1.0
+        except Exception as e:
+            job.error = str(e)
+            print(f"Error building {job.fmt} report for {job.result_id}: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def when_finished(self, jobs, callback):
+        """Call callback() once every job has finished, without holding a report worker"""
+        futures = [job.future for job in jobs if job.future is not None]
+        threading.Thread(target=lambda: (wait(futures), callback()), daemon=True).start()
+
+@st.cache_resource
+def get_report_queue():
+    """Report job queue shared by all sessions"""
+    return ReportQueue()
+
+def result_logs_frame(path):
+    """Step logs of a saved result file as a DataFrame"""
+    with open(path, "r") as f:
+        return pd.DataFrame(extract_step_logs(json.load(f)))
+
+def remove_screenshots(paths):
+    """Delete screenshot files (and screencast stills; the archive stays) once the reports that embed them are built"""
+    for path in paths:
+        if isinstance(path, str) and path.startswith(SCREENCAST_PREFIX):
+            path = screencast_still_path(path)[1]
+        if isinstance(path, str) and os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Could not delete {path}: {e}")
+
+def read_report(path):
+    """Bytes of a cached artifact, read only when a download is clicked"""
+    with open(path, "rb") as f:
+        return f.read()
+
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def report_progress(jobs):
+    """Live progress of running report builds; the app reruns once they finish"""
+    for job in jobs:
+        st.progress(job.progress, text=f"Building {REPORT_FORMATS[job.fmt][0]}… {job.progress:.0%}")
+    if all(job.finished for job in jobs):
+        st.rerun()
+
+def report_downloads(result_id, load_logs, file_base, source_mtime=None, title="", key=""):
+    """Download buttons served from the report cache, with Build buttons for missing artifacts"""
+    report_queue = get_report_queue()
+    running = []
+    for column, (fmt, (label, mime)) in zip(st.columns(len(REPORT_FORMATS)), REPORT_FORMATS.items()):
+        with column:
+            job = report_queue.status(result_id, fmt, source_mtime)
+            if job is not None and job.ready:
+                st.download_button(f"📥 Download {label}", data=functools.partial(read_report, job.path),
+                                   file_name=f"{file_base}.{fmt}", mime=mime, on_click="ignore",
+                                   key=f"{key}_{fmt}_download")
+            elif job is not None and not job.finished:
+                running.append(job)
+                st.caption(f"⏳ Building {label}")
+            else:
+                if job is not None and job.error:
+                    st.error(f"❌ {label} failed: {job.error}")
+                if st.button(f"⚙️ Build {label}", key=f"{key}_{fmt}_build"):
+                    report_queue.submit(result_id, fmt, load_logs, source_mtime, title)
+                    rerun_fragment()
+    if running:
+        report_progress(running)
+
+def rerun_fragment():
+    """Rerun only the calling fragment, or the whole app when not in a fragment rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+# Background scheduler thread
+def run_scheduler():
+    """Background thread to run scheduled tests"""
+    metrics = get_metrics()
+    while True:
+        schedule.run_pending()
+        metrics.set("autotest_scheduler_jobs", len(schedule.get_jobs()))
+        metrics.set("autotest_scheduler_next_run_seconds", max(0, round(schedule.idle_seconds() or 0)))
+        metrics.set("autotest_scheduler_last_tick_timestamp_seconds", round(time.time()))
+        time.sleep(60)
+
+@st.cache_resource
+def get_scheduler():
+    """Start the scheduler thread once per server process, shared by all sessions"""
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+    return {"thread": scheduler_thread, "lock": threading.Lock(), "signature": None}
+
+def sync_scheduled_jobs(scheduler):
+    """Re-register schedule jobs only when the scheduled tests file has changed"""
+    signature = file_signature(SCHEDULED_TESTS_FILE)
+    with scheduler["lock"]:
+        if scheduler["signature"] == signature:
+            return
+        schedule.clear()
+        for test in load_scheduled_tests():
+            time_obj = datetime.strptime(test['time'], "%H:%M:%S").time()
+            for day in test['days']:
+                getattr(schedule.every(), day.lower()).at(time_obj.strftime("%H:%M")).do(
+                    run_scheduled_test,
+                    test_name=test['test_name'],
+                    headless=True,
+                    csv_path=test.get('csv_path'),
+                    instrument=test.get('instrument', False),
+                    trace=test.get('trace', False)
+                )
+        scheduler["signature"] = signature
+
+# Command line entry point (python TestingFramework_V2.py <command>); ignored under `streamlit run`
+def cli_rerun_failed(args):
+    """Rerun the failing units of a saved result file"""
+    result_data = read_json_file(args.result)
+    if result_data is None:
+        print(f"Cannot read result file {args.result}")
+        return 1
+    failures = failed_units(result_data)
+    if not failures:
+        print("No failing units to rerun")
+        return 0
+    print(f"Rerunning {len(failures)} failing unit(s) from {args.result}")
+    path, _ = rerun_failures(result_data, os.path.basename(args.result), load_test_cases(),
+                             headless=not args.headed, from_failed_step=args.from_failed_step,
+                             max_workers=args.parallel,
+                             progress=lambda done, total: print(f"  {done}/{total} unit(s) done"))
+    still_failing = len(failed_units(read_json_file(path)))
+    print(f"Saved {path} ({still_failing} unit(s) still failing)")
+    return 1 if still_failing else 0
+
+def cli_bench(args):
+    """Run the benchmark suite and save its report"""
+    try:
+        report = run_benchmarks(iterations=args.iterations, startup_iterations=args.startup_iterations)
+    except Exception as e:
+        print(f"Benchmark failed: {e}")
+        return 2
+    path = save_benchmark(report, args.output)
+    run = report["run_test_case"]["run"]
+    print(f"Revision {report['revision']}: driver start {report['driver']['start'].get('median_ms')} ms, "
+          f"find_element overhead {report['primitives']['find_element_overhead_ms']} ms, "
+          f"full run {run.get('median_ms')} ms")
+    print(f"Saved {path}")
+    return 1 if report["run_test_case"]["failures"] else 0
+
+def cli_bench_compare(args):
+    """Compare two benchmark reports and fail when a metric regressed"""
+    base, head = read_json_file(args.base), read_json_file(args.head)
+    if base is None or head is None:
+        print("Cannot read benchmark reports")
+        return 2
+    comparison = compare_benchmarks(base, head, args.threshold)
+    print(f"{base.get('revision')} -> {head.get('revision')}")
+    print(comparison.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    regressions = int(comparison["regression"].sum())
+    print(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def cli_diff(args):
+    """Diff two saved results step by step and fail when head regressed, slowed or lost passing steps"""
+    for path in (args.base, args.head):
+        if read_json_file(path) is None:
+            print(f"Cannot read result file {path}")
+            return 2
+    diff = diff_result_files(args.base, args.head, args.duration_ratio, args.min_seconds)
+    summary = diff_summary(diff)
+    print(f"{args.base} -> {args.head}: {len(diff)} aligned step(s)")
+    print(", ".join(f"{count} {kind.replace('_', ' ')}" for kind, count in summary.items()))
+    shown = diff if args.all else diff[diff["flagged"]]
+    if not shown.empty:
+        print(shown.drop(columns=["flagged"]).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    return 1 if summary["regressed"] or summary["lost"] or summary["slower"] else 0
+
+def main(argv):
+    """Parse command line arguments and dispatch to the matching command"""
+    parser = argparse.ArgumentParser(prog="TestingFramework_V2.py", description="Automated test runner")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rerun_parser = commands.add_parser("rerun-failed", help="Rerun only the failing units of a saved result")
+    rerun_parser.add_argument("result", help="Path to a result JSON file in results/")
+    rerun_parser.add_argument("--from-failed-step", action="store_true",
+                              help="Restart each unit at the visit before its failing step, or at step 0 after a sign-in")
+    rerun_parser.add_argument("--parallel", type=int, default=1, help="Number of browsers to run at once")
+    rerun_parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    rerun_parser.set_defaults(handler=cli_rerun_failed)
+
+    bench_parser = commands.add_parser("bench", help="Measure runner overhead against the local fixture site")
+    bench_parser.add_argument("--iterations", type=int, default=5, help="Full test case runs to time")
+    bench_parser.add_argument("--startup-iterations", type=int, default=3, help="Browser start/quit cycles to time")
+    bench_parser.add_argument("--output", help="Report path (default benchmarks/results/<revision>_<time>.json)")
+    bench_parser.set_defaults(handler=cli_bench)
+
+    compare_parser = commands.add_parser("bench-compare", help="Compare two benchmark reports")
+    compare_parser.add_argument("base", help="Report of the baseline commit")
+    compare_parser.add_argument("head", help="Report of the commit under test")
+    compare_parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                                help="Relative slowdown counted as a regression")
+    compare_parser.set_defaults(handler=cli_bench_compare)
+
+    diff_parser = commands.add_parser("diff", help="Compare two saved results step by step")
+    diff_parser.add_argument("base", help="Earlier result JSON file")
+    diff_parser.add_argument("head", help="Later result JSON file")
+    diff_parser.add_argument("--duration-ratio", type=float, default=DIFF_DURATION_RATIO,
+                             help="Slowdown factor counted as a duration regression")
+    diff_parser.add_argument("--min-seconds", type=float, default=DIFF_DURATION_MIN_SECONDS,
+                             help="Smallest slowdown in seconds counted as a duration regression")
+    diff_parser.add_argument("--all", action="store_true", help="Print unchanged steps too")
+    diff_parser.set_defaults(handler=cli_diff)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__" and not st.runtime.exists():
+    sys.exit(main(sys.argv[1:]))
 
 # Streamlit App Configuration
 st.set_page_config(
@@ -723,6 +4813,7 @@ with title_col:
     st.title("Test Automation Framework")
     st.caption("Create, schedule, and run automated tests with ease.")
 
+
 # Initialize session state
 if "steps" not in st.session_state:
     st.session_state.steps = []
@@ -730,8 +4821,6 @@ if "editing_index" not in st.session_state:
     st.session_state.editing_index = None
 if "active_test_name" not in st.session_state:
     st.session_state.active_test_name = ""
-if "scheduled_tests" not in st.session_state:
-    st.session_state.scheduled_tests = load_scheduled_tests()
 if "record_driver" not in st.session_state:
     st.session_state.record_driver = None
 # Store the URL used for recording separately from the text input to avoid
@@ -741,6 +4830,11 @@ if "recording_url" not in st.session_state:
 if "record_url_input" not in st.session_state:
     st.session_state.record_url_input = ""
 
+# One scheduler thread per server process, re-synced only when the schedule file changes
+sync_scheduled_jobs(get_scheduler())
+# Watchdog enforces run deadlines and reaps browsers left behind by crashed runs
+get_watchdog()
+
 
 #Refresh Xero
 
@@ -769,38 +4863,213 @@ def open_in_new_tab_js():
         unsafe_allow_html=True
     )
 
-def run_shell_script():
-    start_time = datetime.now()
-    with st.spinner("Running script..."):
-        result = subprocess.run(
-            ["/home/ubuntu_admin/xero/run_multiple_scripts.sh"],
-            capture_output=True,
-            text=True
-        )
-    end_time = datetime.now()
-    elapsed = end_time - start_time
+class ScriptJob:
+    """Single-flight runner for a long shell script, detached from the Streamlit request.
+
+    The script runs in its own session with stdout/stderr appended to a per-run
+    log. A lock file created with O_EXCL makes a second start (another session,
+    another server process, a ?run_script=true call) join the running job
+    instead of launching a second refresh. Finished runs go to a history file.
+    """
+
+    def __init__(self, command, job_dir):
+        self.command = command
+        self.job_dir = job_dir
+        self.lock_path = os.path.join(job_dir, "running.lock")
+        self.history_path = os.path.join(job_dir, "history.json")
+        self.finish_lock = threading.Lock()
+        os.makedirs(job_dir, exist_ok=True)
+
+    def _read_lock(self):
+        try:
+            with open(self.lock_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Another start() is between creating and filling the lock
+            return {"pid": None, "started_at": datetime.now().isoformat()}
+
+    def current(self):
+        """Lock record of the running job, or None; a run whose process is gone is recorded first"""
+        record = self._read_lock()
+        if record is None:
+            return None
+        if record.get("pid") is None:
+            # A start that died before launching the script leaves a lock without a pid (or half written);
+            # nothing ran, so the lock is removed without a history entry
+            try:
+                if time.time() - os.path.getmtime(self.lock_path) < JOB_START_GRACE:
+                    return record
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+            return None
+        if pid_alive(record["pid"]):
+            return record
+        self._finish(record)
+        return None
+
+    def start(self):
+        """Launch the script unless it is already running; returns (lock record, started)"""
+        running = self.current()
+        if running is not None:
+            return running, False
+        started_at = datetime.now()
+        log_path = os.path.join(self.job_dir, f"{started_at.strftime('%Y%m%d_%H%M%S')}.log")
+        record = {"pid": None, "started_at": started_at.isoformat(), "log": log_path,
+                  "exit": f"{log_path[:-len('.log')]}.exit"}
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return self.current() or record, False
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        try:
+            with open(log_path, "ab") as log:
+                # The shell wrapper records the exit code, so a run that outlives this server is still reported
+                proc = subprocess.Popen(["/bin/sh", "-c", '"$0"; echo $? > "$1"', self.command, record["exit"]],
+                                        stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                        start_new_session=True)
+        except OSError:
+            os.remove(self.lock_path)
+            raise
+        record["pid"] = proc.pid
+        tmp_path = f"{self.lock_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self.lock_path)
+        threading.Thread(target=self._wait, args=(proc, record), daemon=True).start()
+        return record, True
+
+    def _wait(self, proc, record):
+        proc.wait()
+        self._finish(record)
+
+    def _finish(self, record):
+        """Release the lock and append the run to the history, once per run"""
+        with self.finish_lock:
+            held = self._read_lock()
+            if held is None or held.get("started_at") != record.get("started_at"):
+                return
+            returncode = None
+            # Without an exit file (server restarted, wrapper killed) the last log write is the best end time
+            log_path = record.get("log")
+            ended_at = datetime.fromtimestamp(os.path.getmtime(log_path)) if log_path and os.path.exists(log_path) else datetime.now()
+            exit_path = record.get("exit")
+            if exit_path and os.path.exists(exit_path):
+                try:
+                    with open(exit_path, "r") as f:
+                        returncode = int(f.read().strip())
+                    ended_at = datetime.fromtimestamp(os.path.getmtime(exit_path))
+                except (OSError, ValueError):
+                    pass
+                os.remove(exit_path)
+            started_at = datetime.fromisoformat(record["started_at"])
+            history = self.history() + [{
+                "started_at": record["started_at"],
+                "ended_at": ended_at.isoformat(),
+                "duration_s": round((ended_at - started_at).total_seconds(), 1),
+                "returncode": returncode,
+                "log": record.get("log"),
+            }]
+            # Logs of runs that fall out of the history are not reachable from the UI any more
+            for dropped in history[:-JOB_HISTORY_LIMIT]:
+                if dropped.get("log") and os.path.exists(dropped["log"]):
+                    os.remove(dropped["log"])
+            tmp_path = f"{self.history_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(history[-JOB_HISTORY_LIMIT:], f, indent=4)
+            os.replace(tmp_path, self.history_path)
+            os.remove(self.lock_path)
+
+    def history(self):
+        """Finished runs, oldest first"""
+        return read_json_file(self.history_path, default=[])
+
+@st.cache_resource
+def get_xero_job():
+    """Xero refresh runner shared by all sessions"""
+    return ScriptJob(XERO_SCRIPT, XERO_JOB_DIR)
 
-    # Display summary
-    st.markdown(f"**🕒 Started:** {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    st.markdown(f"**🕔 Ended:** {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    st.markdown(f"**⏱️ Duration:** {str(elapsed).split('.')[0]}")
+def read_log_tail(path, offset=None, max_bytes=JOB_TAIL_BYTES):
+    """New log text from offset (or the last max_bytes when offset is None); returns (text, new offset)"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if offset is None or offset > size:
+                offset = max(size - max_bytes, 0)
+            f.seek(offset)
+            data = f.read(size - offset)
+    except FileNotFoundError:
+        return "", 0
+    return data.decode("utf-8", errors="replace"), offset + len(data)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def xero_job_progress(record):
+    """Tail the running refresh's log; only appended bytes are read on each poll"""
+    tail = st.session_state.get("xero_log_tail")
+    if tail is None or tail["log"] != record["log"]:
+        tail = {"log": record["log"], "offset": None, "text": ""}
+    text, tail["offset"] = read_log_tail(record["log"], tail["offset"])
+    tail["text"] = (tail["text"] + text)[-JOB_TAIL_BYTES:]
+    st.session_state["xero_log_tail"] = tail
 
-    if result.returncode == 0:
+    elapsed = datetime.now() - datetime.fromisoformat(record["started_at"])
+    st.info(f"⏳ Data refresh running for {str(elapsed).split('.')[0]}")
+    st.code(tail["text"] or "Waiting for output...", language="text")
+    if get_xero_job().current() is None:
+        st.rerun()
+
+def show_xero_run(run):
+    """Summary of a finished refresh"""
+    st.markdown(f"**🕒 Started:** {datetime.fromisoformat(run['started_at']).strftime('%Y-%m-%d %H:%M:%S')}")
+    st.markdown(f"**🕔 Ended:** {datetime.fromisoformat(run['ended_at']).strftime('%Y-%m-%d %H:%M:%S')}")
+    st.markdown(f"**⏱️ Duration:** {str(timedelta(seconds=round(run['duration_s'])))}")
+    if run["returncode"] == 0:
         st.success("✅ Data refresh completed successfully!")
+    elif run["returncode"] is None:
+        st.warning("⚠️ Data refresh ended without recording an exit code")
     else:
-        st.error("❌ Data refresh failed!")
-
-    return result
+        st.error(f"❌ Data refresh failed! (exit code {run['returncode']})")
 
+xero_job = get_xero_job()
 if run_script:
-    run_shell_script()
-    close_window_js()
+    # The refresh runs detached, so the tab can close straight away once it started or joined a running one
+    try:
+        xero_job.start()
+        close_window_js()
+    except OSError as e:
+        st.error(f"❌ Could not start the data refresh: {e}")
 else:
-    if st.button("🔄 Xero Data Refresh"):
-        run_shell_script()
+    xero_running = xero_job.current()
+    if st.button("🔄 Xero Data Refresh", disabled=xero_running is not None):
+        try:
+            xero_running, started = xero_job.start()
+            if not started:
+                st.info("A data refresh is already running")
+        except OSError as e:
+            st.error(f"❌ Could not start the data refresh: {e}")
+    if xero_running is not None:
+        xero_job_progress(xero_running)
     # Optionally, suggest to the user to open it in a new tab
     #st.markdown("To automatically close this tab after the refresh, [click here to open in a new tab](javascript:window.open(window.location.href, '_blank'));")
 
+    xero_history = xero_job.history()
+    if xero_history:
+        with st.expander("Xero Refresh History", expanded=False):
+            show_xero_run(xero_history[-1])
+            st.dataframe(pd.DataFrame([
+                {"Started": run["started_at"][:19].replace("T", " "), "Duration (s)": run["duration_s"],
+                 "Exit Code": run["returncode"]}
+                for run in reversed(xero_history)
+            ]), hide_index=True)
+            log_run = st.selectbox("Show Log", [run["started_at"] for run in reversed(xero_history)],
+                                   format_func=lambda started: started[:19].replace("T", " "), key="xero_log_run")
+            log_path = next(run["log"] for run in xero_history if run["started_at"] == log_run)
+            st.code(read_log_tail(log_path)[0] or "No output", language="text")
+
 ### HTML TAG SEARCH MOVED TO THE SIDE BAR###
 #st.subheader("🔍 Identify Selector from HTML Tag")
 #
@@ -808,7 +5077,7 @@ else:
 #
 #if html_tag_input:
 #    selectors = identify_selectors_from_html(html_tag_input)
-#    
+#
 #    if selectors:
 #        st.write("### Suggested Selectors:")
 #        for selector_type, selector_value in selectors.items():
@@ -823,23 +5092,24 @@ else:
 with st.sidebar:
     st.image("Logo.png", width=200)
     st.header("📦 Test Case Management")
-    
+
     mode = st.radio("Mode", ["Create New", "Edit Existing", "Delete"])
+    test_case_names = [tc["name"] for tc in load_test_cases()]
 
     if mode == "Create New":
         test_name = st.text_input("Test Name", key="create_name")
-        if test_name in [tc["name"] for tc in load_test_cases()]:
+        if test_name in test_case_names:
             st.warning("Test name must be unique.")
             test_name = None
     elif mode == "Edit Existing":
-        selected = st.selectbox("Select Test Case", [tc["name"] for tc in load_test_cases()])
+        selected = st.selectbox("Select Test Case", test_case_names)
         test_name = selected
         if st.session_state.active_test_name != selected:
             selected_case = next(tc for tc in load_test_cases() if tc["name"] == selected)
             st.session_state.steps = selected_case["steps"]
             st.session_state.active_test_name = selected
     elif mode == "Delete":
-        del_name = st.selectbox("Select Test Case", [tc["name"] for tc in load_test_cases()])
+        del_name = st.selectbox("Select Test Case", test_case_names)
         if st.button("⚠️ Confirm Delete"):
             updated_cases = [tc for tc in load_test_cases() if tc["name"] != del_name]
             save_test_cases(updated_cases)
@@ -847,49 +5117,6 @@ with st.sidebar:
             st.rerun()
         test_name = None
 
-    # Step editing interface
-    editing = st.session_state.steps[st.session_state.editing_index] if st.session_state.editing_index is not None else None
-    action = st.selectbox("Action", ["visit", "click", "input", "assert", "select_dropdown"],
-                         index=(["visit", "click", "input", "assert", "select_dropdown"].index(editing["action"]) if editing else 0))
-    wait_time = st.number_input("Wait Time", min_value=0, value=editing.get("wait", 0) if editing else 0)
-    index = st.number_input("Element Index", min_value=0, value=editing.get("index", 0) if editing else 0) if action != "visit" else 0
-
-    if action == "visit":
-        url = st.text_input("URL", value=editing.get("url", "") if editing else "")
-    else:
-        selector_type = st.selectbox("Selector Type", [
-            "id", "name", "xpath", "css_selector", "class_name", "tag_name", "link_text", "partial_link_text", "placeholder"
-        ], index=(["id", "name", "xpath", "css_selector", "class_name", "tag_name", "link_text", "partial_link_text", "placeholder"].index(editing.get("selector_type", "xpath")) if editing else 0))
-        selector_value = st.text_input("Selector Value", value=editing.get("selector_value", "") if editing else "")
-        text = st.text_input("Text", value=editing.get("text", "") if editing and action in ["input", "assert", "select_dropdown"] else "") if action in ["input", "assert", "select_dropdown"] else None
-
-    # Step editing buttons
-    if st.session_state.editing_index is not None:
-        if st.button("💾 Save Edited Step"):
-            idx = st.session_state.editing_index
-            if action == "visit":
-                st.session_state.steps[idx] = {"action": "visit", "url": url, "wait": wait_time}
-            else:
-                step = {"action": action, "selector_type": selector_type, "selector_value": selector_value, "wait": wait_time, "index": index}
-                if action in ["input", "assert", "select_dropdown"]:
-                    step["text"] = text
-                st.session_state.steps[idx] = step
-            st.session_state.editing_index = None
-            st.rerun()
-        if st.button("❌ Cancel"):
-            st.session_state.editing_index = None
-            st.rerun()
-    else:
-        if st.button("Add Step"):
-            if action == "visit" and url:
-                st.session_state.steps.append({"action": "visit", "url": url, "wait": wait_time})
-            elif action != "visit":
-                step = {"action": action, "selector_type": selector_type, "selector_value": selector_value, "wait": wait_time, "index": index}
-                if action in ["input", "assert", "select_dropdown"]:
-                    step["text"] = text
-                st.session_state.steps.append(step)
-            st.rerun()
-
     # Recording helper
     st.subheader("🎥 Record Steps")
     record_url = st.text_input("URL to Record", key="record_url_input")
@@ -924,346 +5151,810 @@ with st.sidebar:
             st.warning("Unable to parse the HTML tag. Please check the input format.")
 
 # Main content area
-# Test Case Steps Display
-st.subheader("Test Case Steps")
-for i, step in enumerate(st.session_state.steps):
-    col1, col2, col3, col4, col5 = st.columns([5, 1, 1, 1, 1])
-    with col1:
-        st.write(step)
-    with col2:
-        if st.button("✏️", key=f"edit_{i}"):
-            st.session_state.editing_index = i
-            st.rerun()
-    with col3:
-        if st.button("🗑️", key=f"del_{i}"):
-            st.session_state.steps.pop(i)
-            st.rerun()
-    with col4:
-        if i > 0 and st.button("↑", key=f"move_up_{i}"):
-            st.session_state.steps[i], st.session_state.steps[i - 1] = st.session_state.steps[i - 1], st.session_state.steps[i]
-            st.rerun()
-    with col5:
-        if i < len(st.session_state.steps) - 1 and st.button("↓", key=f"move_down_{i}"):
-            st.session_state.steps[i], st.session_state.steps[i + 1] = st.session_state.steps[i + 1], st.session_state.steps[i]
-            st.rerun()
+@st.fragment
+def steps_panel(test_name):
+    """Step editor and step list; interactions here only rerun this fragment"""
+    st.subheader("Test Case Steps")
 
-# Save Test Case Button
-if st.button("💾 Save Test Case") and test_name:
-    existing = next((tc for tc in load_test_cases() if tc["name"] == test_name), None)
-    if existing:
-        existing["steps"] = st.session_state.steps
-    else:
+    # Step editing interface
+    with st.expander("✏️ Edit Step" if st.session_state.editing_index is not None else "➕ Add Step",
+                     expanded=st.session_state.editing_index is not None):
+        editing = st.session_state.steps[st.session_state.editing_index] if st.session_state.editing_index is not None else None
+        action = st.selectbox("Action", STEP_ACTIONS,
+                             index=(STEP_ACTIONS.index(editing["action"]) if editing else 0))
+        wait_time = st.number_input("Wait Time", min_value=0, value=editing.get("wait", 0) if editing else 0)
+        index = st.number_input("Element Index", min_value=0, value=editing.get("index", 0) if editing else 0) if action not in ["visit", "visual_assert", "fill_form"] else 0
+
+        if action == "visit":
+            url = st.text_input("URL", value=editing.get("url", "") if editing else "")
+            new_step = {"action": "visit", "url": url, "wait": wait_time} if url else None
+        elif action == "fill_form":
+            default_fields = editing.get("fields", []) if editing else [
+                {"selector_type": "placeholder", "selector_value": "Email", "index": 0, "text": "{{LoginEmail}}"}
+            ]
+            fields_json = st.text_area("Fields (JSON list of selector_type, selector_value, index, text)",
+                                       value=json.dumps(default_fields, indent=2), height=200)
+            form_timeout = st.number_input("Form Timeout (s)", min_value=0.0,
+                                           value=float(editing.get("timeout", FILL_FORM_TIMEOUT)) if editing else float(FILL_FORM_TIMEOUT))
+            try:
+                fields = json.loads(fields_json)
+                if not isinstance(fields, list) or not all(isinstance(f, dict) and f.get("selector_type") in SELECTOR_TYPES and "selector_value" in f for f in fields):
+                    raise ValueError("each field needs a known selector_type and a selector_value")
+                new_step = {"action": "fill_form", "fields": fields, "wait": wait_time, "timeout": form_timeout}
+            except ValueError as e:
+                st.error(f"Invalid fields: {e}")
+                new_step = None
+        elif action == "visual_assert":
+            baseline = st.text_input("Baseline Name (blank = step number)", value=editing.get("baseline", "") if editing else "")
+            threshold = st.number_input("Max Changed Pixels (%)", min_value=0.0, max_value=100.0,
+                                        value=float(editing.get("threshold", VISUAL_DIFF_THRESHOLD)) * 100 if editing else VISUAL_DIFF_THRESHOLD * 100)
+            masks = st.text_input("Ignore Regions (x,y,w,h; ...)",
+                                  value="; ".join(",".join(str(v) for v in m) for m in parse_masks(editing.get("masks"))) if editing else "")
+            new_step = {"action": "visual_assert", "wait": wait_time, "threshold": threshold / 100, "masks": parse_masks(masks)}
+            if baseline:
+                new_step["baseline"] = baseline
+        else:
+            selector_type = st.selectbox("Selector Type", SELECTOR_TYPES,
+                                         index=(SELECTOR_TYPES.index(editing.get("selector_type", "xpath")) if editing else 0))
+            selector_value = st.text_input("Selector Value", value=editing.get("selector_value", "") if editing else "",
+                                           help="text: visible text; label: a field's label; role: role:name, e.g. button:Save; "
+                                                "within: type=value >> type=value, e.g. css_selector=.el-dialog >> role=button:Save")
+            text = st.text_input("Text", value=editing.get("text", "") if editing and action in ["input", "assert", "select_dropdown"] else "") if action in ["input", "assert", "select_dropdown"] else None
+            new_step = {"action": action, "selector_type": selector_type, "selector_value": selector_value, "wait": wait_time, "index": index}
+            if action in ["input", "assert", "select_dropdown"]:
+                new_step["text"] = text
+            if action == "assert":
+                st.caption("Text is checked against the page's visible text. For more, list checks as JSON, e.g. "
+                           '[{"type": "count", "selector_type": "css_selector", "selector_value": ".row", "op": ">=", "expected": 3}]. '
+                           f"Types: {', '.join(ASSERTION_TYPES)}.")
+                checks_json = st.text_area("Checks (JSON, optional)",
+                                           value=json.dumps(editing["checks"], indent=2) if editing and editing.get("checks") else "")
+                assert_timeout = st.number_input("Assertion Timeout (s)", min_value=0.0,
+                                                 value=float(editing.get("timeout", ASSERT_TIMEOUT)) if editing else float(ASSERT_TIMEOUT))
+                new_step["timeout"] = assert_timeout
+                if checks_json.strip():
+                    try:
+                        checks = json.loads(checks_json)
+                        if not isinstance(checks, list) or any(c.get("type") not in ASSERTION_TYPES for c in checks):
+                            raise ValueError(f"checks must be a list of objects with a type in {ASSERTION_TYPES}")
+                        new_step["checks"] = checks
+                    except (ValueError, AttributeError) as e:
+                        st.error(f"Invalid checks: {e}")
+                        new_step = None
+
+        # Step editing buttons
+        if st.session_state.editing_index is not None:
+            if st.button("💾 Save Edited Step"):
+                if new_step is not None:
+                    st.session_state.steps[st.session_state.editing_index] = new_step
+                st.session_state.editing_index = None
+                rerun_fragment()
+            if st.button("❌ Cancel"):
+                st.session_state.editing_index = None
+                rerun_fragment()
+        else:
+            if st.button("Add Step"):
+                if new_step is not None:
+                    st.session_state.steps.append(new_step)
+                rerun_fragment()
+
+    # Test Case Steps Display
+    for i, step in enumerate(st.session_state.steps):
+        col1, col2, col3, col4, col5 = st.columns([5, 1, 1, 1, 1])
+        with col1:
+            st.write(step)
+        with col2:
+            if st.button("✏️", key=f"edit_{i}"):
+                st.session_state.editing_index = i
+                rerun_fragment()
+        with col3:
+            if st.button("🗑️", key=f"del_{i}"):
+                st.session_state.steps.pop(i)
+                rerun_fragment()
+        with col4:
+            if i > 0 and st.button("↑", key=f"move_up_{i}"):
+                st.session_state.steps[i], st.session_state.steps[i - 1] = st.session_state.steps[i - 1], st.session_state.steps[i]
+                rerun_fragment()
+        with col5:
+            if i < len(st.session_state.steps) - 1 and st.button("↓", key=f"move_down_{i}"):
+                st.session_state.steps[i], st.session_state.steps[i + 1] = st.session_state.steps[i + 1], st.session_state.steps[i]
+                rerun_fragment()
+
+    if sum(1 for step in st.session_state.steps if step.get("action") == "input") >= 2:
+        if st.button("⚡ Merge Input Steps", help="Turn consecutive input steps into single fill_form steps."):
+            st.session_state.steps = merge_input_steps(st.session_state.steps)
+            rerun_fragment()
+
+    # Case-level metadata
+    all_cases = load_test_cases()
+    current_case = next((tc for tc in all_cases if tc["name"] == test_name), None)
+    depends_on = st.multiselect(
+        "Depends On",
+        [tc["name"] for tc in all_cases if tc["name"] != test_name],
+        default=[dep for dep in (current_case or {}).get("depends_on", []) if dep != test_name and any(tc["name"] == dep for tc in all_cases)],
+        help="Cases that must finish before this one when run in the same suite.",
+        key=f"depends_on_{test_name}",
+    )
+
+    # Save Test Case Button
+    if st.button("💾 Save Test Case") and test_name:
         updated_cases = load_test_cases()
-        updated_cases.append({"name": test_name, "steps": st.session_state.steps})
+        existing = next((tc for tc in updated_cases if tc["name"] == test_name), None)
+        if existing:
+            existing["steps"] = st.session_state.steps
+        else:
+            existing = {"name": test_name, "steps": st.session_state.steps}
+            updated_cases.append(existing)
+        if depends_on:
+            existing["depends_on"] = depends_on
+        else:
+            existing.pop("depends_on", None)
+        try:
+            build_case_graph(updated_cases, [tc["name"] for tc in updated_cases])
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
         save_test_cases(updated_cases)
-    st.success(f"✅ Test case '{test_name}' saved!")
-    st.session_state.steps = []
-    st.session_state.active_test_name = ""
-    st.rerun()
+        st.success(f"✅ Test case '{test_name}' saved!")
+        st.session_state.steps = []
+        st.session_state.active_test_name = ""
+        # Other panels list test case names, so refresh the whole app
+        st.rerun()
+
+steps_panel(test_name)
 
 # Test Scheduling Section
-with st.expander("⏰ Schedule Tests", expanded=False):
+@st.fragment
+def schedule_panel():
+    """Schedule editor; changes are picked up by the scheduler via the file signature"""
     st.subheader("Schedule Test Execution")
-    
+
     selected_schedule_test = st.selectbox("Select Test to Schedule", [tc["name"] for tc in load_test_cases()])
     schedule_time = st.time_input("Schedule Time")
-    schedule_days = st.multiselect("Repeat on Days", 
+    schedule_days = st.multiselect("Repeat on Days",
                                  ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
                                  default=["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
-    
+
+    schedule_instrument = st.checkbox("Capture performance metrics", value=False, key="schedule_instrument",
+                                      help="Record page timings, LCP and network stats for visit/click steps.")
+    schedule_trace = st.checkbox("Record trace", value=False, key="schedule_trace",
+                                 help="Keep a DOM snapshot, console errors and network summary per step for offline debugging.")
+
     # Add CSV upload for scheduled tests
     scheduled_csv = st.file_uploader("Upload CSV for Scheduled Test (Optional)", type=["csv"])
     csv_path = None
     if scheduled_csv:
         csv_path = os.path.join(RESULTS_DIR, f"scheduled_{selected_schedule_test}_data.csv")
-        with open(csv_path, "wb") as f:
-            f.write(scheduled_csv.getvalue())
-    
+
     if st.button("📅 Schedule Test"):
+        if scheduled_csv:
+            with open(csv_path, "wb") as f:
+                f.write(scheduled_csv.getvalue())
         scheduled_test = {
             "test_name": selected_schedule_test,
             "time": str(schedule_time),
             "days": schedule_days,
             "created_at": datetime.now().isoformat(),
-            "csv_path": csv_path if scheduled_csv else None
+            "csv_path": csv_path if scheduled_csv else None,
+            "instrument": schedule_instrument,
+            "trace": schedule_trace
         }
-        
+
         updated_scheduled = load_scheduled_tests()
         updated_scheduled.append(scheduled_test)
         save_scheduled_tests(updated_scheduled)
-        st.session_state.scheduled_tests = updated_scheduled
-        
-        # Update the scheduler
-        if 'scheduler_thread' in st.session_state:
-            schedule.clear()
-            for test in updated_scheduled:
-                days = test['days']
-                time_str = test['time']
-                test_name = test['test_name']
-                csv_path = test.get('csv_path')
-                
-                time_obj = datetime.strptime(time_str, "%H:%M:%S").time()
-                for day in days:
-                    getattr(schedule.every(), day.lower()).at(time_obj.strftime("%H:%M")).do(
-                        run_scheduled_test, 
-                        test_name=test_name, 
-                        headless=True,
-                        csv_path=csv_path
-                    )
-        
+        sync_scheduled_jobs(get_scheduler())
+
         st.success(f"✅ Test '{selected_schedule_test}' scheduled for {schedule_time} on {', '.join(schedule_days)}")
 
     st.subheader("Scheduled Tests")
-    if st.session_state.scheduled_tests:
-        for i, scheduled_test in enumerate(st.session_state.scheduled_tests):
+    scheduled_tests = load_scheduled_tests()
+    if scheduled_tests:
+        for i, scheduled_test in enumerate(scheduled_tests):
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.write(f"**{scheduled_test['test_name']}** at {scheduled_test['time']} on {', '.join(scheduled_test['days'])}")
                 if scheduled_test.get('csv_path'):
                     st.caption(f"Using CSV: {os.path.basename(scheduled_test['csv_path'])}")
+                if scheduled_test.get('instrument'):
+                    st.caption("Capturing performance metrics")
+                if scheduled_test.get('trace'):
+                    st.caption("Recording traces")
             with col2:
                 if st.button("❌", key=f"delete_scheduled_{i}"):
                     updated_scheduled = load_scheduled_tests()
                     updated_scheduled.pop(i)
                     save_scheduled_tests(updated_scheduled)
-                    st.session_state.scheduled_tests = updated_scheduled
-                    st.rerun()
+                    sync_scheduled_jobs(get_scheduler())
+                    rerun_fragment()
     else:
         st.info("No tests scheduled yet")
 
+with st.expander("⏰ Schedule Tests", expanded=False):
+    schedule_panel()
+
 # Historical Results Section
-st.subheader("📜 Historical Test Results")
+def compare_runs(results):
+    """Pick two results and show how the later one differs step by step"""
+    labels = {r["filepath"]: f"{r['test_name']} - {r['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}" for r in results}
+    paths = list(labels)
+    col1, col2 = st.columns(2)
+    head_path = col2.selectbox("Compare", paths, format_func=labels.get, key="diff_head")
+    head = next(r for r in results if r["filepath"] == head_path)
+    # Default to the run of the same test just before the selected one
+    previous = next((r["filepath"] for r in results
+                     if r["test_name"] == head["test_name"] and r["timestamp"] < head["timestamp"]), None)
+    others = [path for path in paths if path != head_path]
+    base_path = col1.selectbox("Against", others, format_func=labels.get, key=f"diff_base_{head_path}",
+                               index=others.index(previous) if previous in others else 0)
+    col1, col2, col3 = st.columns(3)
+    duration_ratio = col1.number_input("Slower When Duration x", min_value=1.0, value=DIFF_DURATION_RATIO, step=0.1,
+                                       key="diff_ratio")
+    min_seconds = col2.number_input("And At Least (s)", min_value=0.0, value=DIFF_DURATION_MIN_SECONDS, step=0.5,
+                                    key="diff_min_seconds")
+    show_all = col3.checkbox("Show unchanged steps", key="diff_all")
+
+    diff = diff_result_files(base_path, head_path, duration_ratio, min_seconds)
+    summary = diff_summary(diff)
+    columns = st.columns(len(summary))
+    for column, (kind, count) in zip(columns, summary.items()):
+        column.metric(kind.replace("_", " ").title().replace("Url", "URL"), count)
+    shown = diff if show_all else diff[diff["flagged"]]
+    if shown.empty:
+        st.success("No differences between the two runs")
+    else:
+        st.dataframe(shown.drop(columns=["flagged"]), hide_index=True)
 
-historical_results = get_historical_results()
+@st.fragment
+def history_panel():
+    """Historical results browser; result files are parsed once per mtime"""
+    st.subheader("📜 Historical Test Results")
 
-if historical_results:
-    # Filter options
-    col1, col2 = st.columns(2)
-    with col1:
-        filter_test = st.selectbox("Filter by Test", ["All"] + list(set(r["test_name"] for r in historical_results)))
-    with col2:
-        days_back = st.slider("Show results from last N days", 1, 30, 7)
+    historical_results = get_historical_results()
 
-    cutoff_date = datetime.now() - timedelta(days=days_back)
-    filtered_results = [r for r in historical_results
-                        if r["timestamp"] >= cutoff_date and
-                        (filter_test == "All" or r["test_name"] == filter_test)]
+    if historical_results:
+        # Filter options
+        col1, col2 = st.columns(2)
+        with col1:
+            filter_test = st.selectbox("Filter by Test", ["All"] + sorted(set(r["test_name"] for r in historical_results)))
+        with col2:
+            days_back = st.slider("Show results from last N days", 1, 30, 7)
 
-    if not filtered_results:
-        st.info("No results match your filters")
-    else:
-        for result in filtered_results:
-            with st.expander(f"{result['test_name']} - {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}", expanded=False):
-                # Display basic info
-                col1, col2 = st.columns([3,1])
-                with col1:
-                    st.write(f"**Test Name:** {result['test_name']}")
-                    st.write(f"**Run Time:** {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
-                    if result['data'].get('csv_used'):
-                        st.write(f"**CSV Used:** {os.path.basename(result['data']['csv_used'])}")
-
-                # Create a DataFrame from the logs
-                try:
-                    logs_df = pd.DataFrame(result['data']['logs'])
+        cutoff_date = datetime.now() - timedelta(days=days_back)
+        filtered_results = [r for r in historical_results
+                            if r["timestamp"] >= cutoff_date and
+                            (filter_test == "All" or r["test_name"] == filter_test)]
 
-                    if not logs_df.empty:
-                        # Display the logs
-                        st.dataframe(logs_df)
+        if not filtered_results:
+            st.info("No results match your filters")
+        else:
+            if len(filtered_results) >= 2:
+                with st.expander("🔀 Compare Runs", expanded=False):
+                    compare_runs(filtered_results)
+            for result in filtered_results:
+                with st.expander(f"{result['test_name']} - {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}", expanded=False):
+                    # Display basic info
+                    col1, col2 = st.columns([3,1])
+                    with col1:
+                        st.write(f"**Test Name:** {result['test_name']}")
+                        st.write(f"**Run Time:** {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
+                        csv_used = result_csv_path(result['data'])
+                        if csv_used:
+                            st.write(f"**CSV Used:** {os.path.basename(csv_used)}")
+                        if result['data'].get('rerun_of'):
+                            st.write(f"**Rerun Of:** {result['data']['rerun_of']} ({result['data'].get('rerun_units', 0)} unit(s))")
+                        traces = sorted({log["trace"] for log in extract_step_logs(result['data']) if log.get("trace")})
+                        if traces:
+                            st.write(f"**Traces:** {', '.join(os.path.basename(path) for path in traces)} (open under Run Traces)")
+                    with col2:
+                        failures = failed_units(result['data'])
+                        if failures:
+                            from_failed_step = st.checkbox("Resume at failing step", key=f"resume_{result['filename']}",
+                                                           help="Restart each unit at the visit before the step that failed.")
+                            if st.button(f"🔁 Rerun {len(failures)} failed", key=f"rerun_{result['filename']}"):
+                                rerun_progress = st.progress(0)
+                                try:
+                                    path, count = rerun_failures(
+                                        result['data'], result['filename'], load_test_cases(),
+                                        from_failed_step=from_failed_step,
+                                        progress=lambda done, total: rerun_progress.progress(done / max(total, 1)))
+                                    st.success(f"Reran {count} unit(s): {os.path.basename(path)}")
+                                except Exception as e:
+                                    st.error(f"❌ Rerun failed: {e}")
 
-                        # Download buttons
-                        st.write("### Download Options")
-                        col1, col2, col3 = st.columns(3)
+                    # Create a DataFrame from the logs
+                    try:
+                        logs_df = pd.DataFrame(extract_step_logs(result['data']))
 
-                        with col1:
-                            # CSV Download
-                            csv = logs_df.to_csv(index=False).encode('utf-8')
-                            st.download_button(
-                                label="📥 Download CSV",
-                                data=csv,
-                                file_name=f"{result['test_name']}_{result['timestamp'].strftime('%Y%m%d_%H%M%S')}.csv",
-                                mime='text/csv',
-                                key=f"csv_{result['filename']}"
-                            )
+                        if not logs_df.empty:
+                            # Display the logs
+                            st.dataframe(logs_df)
 
-                        with col2:
-                            # Excel Download with screenshots
-                            excel_buffer = io.BytesIO()
-                            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                                create_excel_with_screenshots(logs_df, writer)
-                            excel_buffer.seek(0)
-                            st.download_button(
-                                label="📥 Download Excel with Screenshots",
-                                data=excel_buffer,
-                                file_name=f"{result['test_name']}_{result['timestamp'].strftime('%Y%m%d_%H%M%S')}.xlsx",
-                                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                                key=f"excel_{result['filename']}"
-                            )
+                            # Reports are built in the background and served from the report cache
+                            st.write("### Download Options")
+                            report_downloads(
+                                result['filename'][:-len(".json")],
+                                functools.partial(result_logs_frame, result['filepath']),
+                                f"{result['test_name']}_{result['timestamp'].strftime('%Y%m%d_%H%M%S')}",
+                                source_mtime=os.path.getmtime(result['filepath']),
+                                title=f"{result['test_name']} - {result['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}",
+                                key=result['filename'])
 
-                        with col3:
                             # Full JSON Download
-                            json_data = json.dumps(result['data'], indent=2).encode('utf-8')
                             st.download_button(
                                 label="📥 Download JSON",
-                                data=json_data,
+                                data=functools.partial(read_report, result['filepath']),
                                 file_name=result['filename'],
                                 mime='application/json',
+                                on_click="ignore",
                                 key=f"json_{result['filename']}"
                             )
-                except Exception as e:
-                    st.error(f"Error displaying results: {e}")
-else:
-    st.info("No historical test results available")
+                    except Exception as e:
+                        st.error(f"Error displaying results: {e}")
+    else:
+        st.info("No historical test results available")
 
-# Test Execution Section
-st.subheader("🚀 Run Tests")
-selected_cases = st.multiselect("Select Test Cases", [tc["name"] for tc in load_test_cases()])
-repeat = st.number_input("Repeat Count", min_value=1, value=1)
-headless = st.checkbox("Run Headless", value=True)
-
-# CSV Data Upload
-st.subheader("📄 Load CSV Data")
-uploaded_file = st.file_uploader("Upload CSV File", type=["csv"])
-csv_data = pd.read_csv(uploaded_file) if uploaded_file else None
-if csv_data is not None:
-    st.write("✅ CSV Loaded:")
-    st.dataframe(csv_data)
-
-# Run Tests Button
-logs_output = []
-if st.button("▶️ Run Selected Tests"):
-    st.subheader("📜 Live Logs")
-
-    total_runs = len(selected_cases) * repeat * (len(csv_data) if csv_data is not None else 1)
-    progress_bar = st.progress(0)
-    status_box = st.empty()
-    log_container = st.container()
-    completed = 0
-
-    for name in selected_cases:
-        test = next(tc for tc in load_test_cases() if tc["name"] == name)
-        if csv_data is not None:
-            for idx, row in csv_data.iterrows():
-                user_id = row.get("LoginEmail", f"Row {idx+1}")
-                status_box.info(f"Running `{name}` for `{user_id}` ({completed+1}/{total_runs})")
-                logs = list(run_test_case(test, headless=headless, repeat=repeat, csv_row=row))
-                group_title = f"🧪 {name} | 👤 {user_id}"
-                with log_container.expander(group_title, expanded=False):
-                    for i, log in enumerate(logs):
-                        st.markdown(f"### 🔹 Step {i+1}: `{log.get('action', '').upper()}` - {log.get('status', 'Unknown')}")
-                        if log.get("notifications"):
-                            st.markdown("**Notifications:**")
-                            st.write(log["notifications"])
-                        if log.get("screenshot") and os.path.exists(log["screenshot"]):
-                            st.image(log["screenshot"], caption="📸 Screenshot", use_container_width=True)
-                        st.markdown("---")
-
-                    logs_output.extend(logs)
-                completed += 1
-                progress_bar.progress(completed / total_runs)
+history_panel()
+
+# Visual Baselines Section
+@st.fragment
+def baselines_panel():
+    """Review visual baselines and approve failing candidates as new baselines"""
+    baselines = list_baselines()
+    if not baselines:
+        st.info("No visual baselines yet. Add a `visual_assert` step; its first run saves the baseline.")
+        return
+
+    only_pending = st.checkbox("Only show baselines with a failing candidate", value=True)
+    for baseline in baselines:
+        if only_pending and not baseline["candidate"]:
+            continue
+        st.markdown(f"**{baseline['test_name']} / {baseline['name']}**")
+        cols = st.columns(3)
+        cols[0].image(baseline["path"], caption="Baseline", use_container_width=True)
+        if baseline["candidate"]:
+            cols[1].image(baseline["candidate"], caption="Latest candidate", use_container_width=True)
+        if baseline["diff"]:
+            cols[2].image(baseline["diff"], caption="Changed pixels", use_container_width=True)
+        col_approve, col_delete = st.columns(2)
+        with col_approve:
+            if baseline["candidate"] and st.button("✅ Approve Candidate", key=f"approve_{baseline['path']}"):
+                os.replace(baseline["candidate"], baseline["path"])
+                if baseline["diff"]:
+                    os.remove(baseline["diff"])
+                rerun_fragment()
+        with col_delete:
+            if st.button("🗑️ Delete Baseline", key=f"delete_{baseline['path']}"):
+                for path in (baseline["path"], baseline["candidate"], baseline["diff"]):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                rerun_fragment()
+        st.markdown("---")
 
+with st.expander("🖼️ Visual Baselines", expanded=False):
+    baselines_panel()
+
+# Trace Viewer Section
+@st.fragment
+def traces_panel():
+    """Step timeline of a recorded run trace, with page, console, network and DOM per step"""
+    traces = list_traces()
+    if not traces:
+        st.info("No traces yet. Tick \"Record trace\" for a run or a schedule.")
+        return
+    trace_path = st.selectbox("Trace", traces, format_func=lambda path: path.name, key="trace_path")
+    try:
+        trace = read_trace(trace_path)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        st.error(f"Cannot read trace (the run may still be in progress): {e}")
+        return
+    st.write(f"**Test:** {trace['test_name']}" + (f" | **User:** {trace['user']}" if trace.get("user") else "")
+             + f" | **Started:** {trace['started_at'][:19].replace('T', ' ')}")
+    steps = trace["steps"]
+    if not steps:
+        st.info("The run ended before its first step")
+        return
+    st.dataframe(pd.DataFrame([{
+        "Step": entry["label"],
+        "Status": entry.get("status"),
+        "Duration (s)": entry.get("duration"),
+        "Console": len(entry.get("console", [])),
+        "Requests": entry.get("network", {}).get("request_count"),
+        "Failed Requests": entry.get("network", {}).get("failed_requests"),
+        "URL": entry.get("url"),
+    } for entry in steps]), hide_index=True)
+
+    first_failure = next((n for n, entry in enumerate(steps) if not is_step_passed(entry)), 0)
+    number = st.selectbox("Step", range(len(steps)), index=first_failure, key=f"trace_step_{trace_path.name}",
+                          format_func=lambda n: f"{steps[n]['label']} - {steps[n].get('status')}")
+    entry = steps[number]
+    page_tab, console_tab, network_tab, dom_tab = st.tabs(["Page", "Console", "Network", "DOM"])
+    with page_tab:
+        st.write(f"**Status:** {entry.get('status')}")
+        st.write(f"**URL:** {entry.get('url', '')}  \n**Title:** {entry.get('title', '')}")
+        if entry.get("screenshot"):
+            st.image(read_trace_file(trace_path, entry["screenshot"]), use_container_width=True)
+        elif screenshot_file(entry.get("screenshot_ref")):
+            st.image(screenshot_file(entry["screenshot_ref"]), use_container_width=True)
+    with console_tab:
+        if entry.get("console"):
+            st.dataframe(pd.DataFrame(entry["console"]), hide_index=True)
+        else:
+            st.caption(entry.get("console_error") or "No console errors or warnings")
+    with network_tab:
+        if entry.get("network"):
+            st.json(entry["network"])
+        else:
+            st.caption("No network data for this step")
+    with dom_tab:
+        if not entry.get("dom"):
+            st.caption(entry.get("dom_error") or "No DOM snapshot for this step")
         else:
-            for r in range(repeat):
-                status_box.info(f"Running `{name}` ({completed+1}/{total_runs})")
-                logs = list(run_test_case(test, headless=headless, repeat=1))
-
-                for i, log in enumerate(logs):
-                    with log_container.expander(f"🔹 Step {i+1}: {log.get('action', '').upper()} - {log.get('status', 'Unknown')}"):
-                        st.markdown(f"**Selector Type:** `{log.get('selector_type', '')}`")
-                        st.markdown(f"**Selector Value:** `{log.get('selector_value', '')}`")
-                        st.markdown(f"**Text:** `{log.get('text', '')}`")
-                        st.markdown(f"**Wait Time:** `{log.get('wait_time', '')}`")
-                        st.markdown(f"**Actual URL:** `{log.get('actual_url', '')}`")
-                        if log.get("notifications"):
-                            st.markdown("**Notifications:**")
-                            st.write(log["notifications"])
-                        if log.get("screenshot") and os.path.exists(log["screenshot"]):
-                            st.image(log["screenshot"], caption="📸 Screenshot", use_container_width=True)
-
-                    logs_output.append(log)
-                    time.sleep(0.05)
+            dom = read_trace_file(trace_path, entry["dom"]).decode("utf-8", errors="replace")
+            if entry.get("dom_truncated"):
+                st.warning(f"Snapshot truncated to {len(dom):,} of {entry.get('dom_size', 0):,} characters")
+            st.download_button("📥 Download DOM", data=dom, file_name=f"{trace_path.stem}_{entry['dom'].split('/')[-1]}",
+                               mime="text/html", on_click="ignore", key=f"trace_dom_{trace_path.name}_{number}")
+            if st.toggle("Render snapshot", key=f"trace_render_{trace_path.name}_{number}"):
+                # A data: URL gives the snapshot an opaque origin, isolated from the dashboard;
+                # scripts were stripped at capture and the base URL lets stylesheets and images resolve
+                page = f'<base href="{html.escape(entry.get("url") or "")}">' + dom
+                st.iframe("data:text/html;base64," + base64.b64encode(page.encode("utf-8")).decode("ascii"), height=600)
+            else:
+                st.code(dom[:TRACE_PREVIEW_CHARS], language="html")
 
-                completed += 1
-                progress_bar.progress(completed / total_runs)
+with st.expander("🧭 Run Traces", expanded=False):
+    traces_panel()
 
-    progress_bar.empty()
-    status_box.success("🎉 All tests completed!")
+@st.fragment(run_every=METRICS_FLUSH_INTERVAL)
+def metrics_panel():
+    """Live view of the runner metrics exported in the Prometheus text format"""
+    metrics = get_metrics()
+    exposition = metrics.render()
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Steps/sec", metrics.steps_per_second())
+    col2.metric("Active Browsers", metrics.snapshot("autotest_active_browsers"))
+    col3.metric("Queued Units", metrics.snapshot("autotest_queue_depth"))
+    col4.metric("Running Units", metrics.snapshot("autotest_units_running"))
+    col5.metric("Failed Steps", metrics.snapshot("autotest_steps_total", outcome="failed"))
+    endpoint = f"http://<host>:{METRICS_PORT}/metrics" if METRICS_PORT else "disabled (set AUTOTEST_METRICS_PORT)"
+    st.caption(f"Written to {METRICS_FILE} every {METRICS_FLUSH_INTERVAL}s · endpoint: {endpoint}")
+    st.code(exposition, language="text")
 
-    # Save the test results
-    for name in selected_cases:
-        result_data = {
-            "test_name": name,
-            "timestamp": datetime.now().isoformat(),
-            "logs": logs_output,
-            "csv_used": uploaded_file.name if uploaded_file else None
-        }
-        save_test_result(result_data, name)
+with st.expander("📡 Runner Metrics", expanded=False):
+    metrics_panel()
 
-    # Display results summary
-    logs_df = pd.DataFrame(logs_output)
+# Trend Analytics Section
+@st.fragment
+def trends_panel():
+    """Trend charts over the aggregated rollups"""
+    st.subheader("📈 Trends")
 
-    if "LoginEmail" in logs_df.columns:
-        cols = ["LoginEmail"] + [col for col in logs_df.columns if col != "LoginEmail"]
-        logs_df = logs_df[cols]
+    rollups = refresh_rollups()
+    trend_tests_df, trend_steps_df = rollups_to_frames(rollups)
+
+    if trend_tests_df.empty:
+        st.info("No results aggregated yet")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        trend_tests = st.multiselect("Tests", sorted(trend_tests_df["test_name"].unique()), key="trend_tests")
+    with col2:
+        trend_days = st.slider("Trend window (days)", 7, 90, 30, key="trend_days")
 
-    st.write("### Test Results Summary")
-    st.dataframe(logs_df)
+    trend_cutoff = pd.Timestamp(datetime.now().date()) - pd.Timedelta(days=trend_days - 1)
+    tests_view = trend_tests_df[trend_tests_df["day"] >= trend_cutoff]
+    steps_view = trend_steps_df[trend_steps_df["day"] >= trend_cutoff]
+    if trend_tests:
+        tests_view = tests_view[tests_view["test_name"].isin(trend_tests)]
+        steps_view = steps_view[steps_view["test_name"].isin(trend_tests)]
 
-    # Download options
-    if not logs_df.empty:
-        file_base_name = "_".join(selected_cases).replace(" ", "_")
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    st.write("### Pass Rate per Test per Day")
+    st.line_chart(tests_view.pivot_table(index="day", columns="test_name", values="pass_rate", aggfunc="mean"))
 
-        # CSV Download
-        csv_bytes = logs_df.to_csv(index=False).encode("utf-8-sig")
-        csv_filename = f"{file_base_name}_{timestamp}_logs.csv"
-        st.download_button("Download Log CSV", data=csv_bytes, file_name=csv_filename, mime="text/csv")
+    st.write("### Runs per Day")
+    st.bar_chart(tests_view.pivot_table(index="day", columns="test_name", values="runs", aggfunc="sum"))
 
-        # Excel Download
-        excel_filename = f"{file_base_name}_{timestamp}_logs.xlsx"
-        excel_data = io.BytesIO()
+    if not steps_view.empty:
+        step_test = st.selectbox("Step durations for test", sorted(steps_view["test_name"].unique()), key="trend_step_test")
+        step_rows = steps_view[steps_view["test_name"] == step_test]
+        st.write("### Step Duration p90 (s)")
+        st.line_chart(step_rows.pivot_table(index="day", columns="step", values="p90", aggfunc="mean"))
 
-        with pd.ExcelWriter(excel_data, engine='xlsxwriter') as writer:
-            create_excel_with_screenshots(logs_df, writer)
-        
-        excel_data.seek(0)
-        st.download_button("Download Log Excel", data=excel_data, file_name=excel_filename,
-                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        st.write("### Step Summary")
+        totals = step_rows.groupby("step", sort=False)[["count", "passed"]].sum()
+        totals["pass_rate"] = totals["passed"] / totals["count"]
+        totals["median_p50"] = step_rows.groupby("step", sort=False)["p50"].median()
+        totals["max_p95"] = step_rows.groupby("step", sort=False)["p95"].max()
+        st.dataframe(totals.reset_index())
+
+        st.write("### Steps Getting Slower (last 7 days vs previous 7)")
+        slowing = find_slowing_steps(steps_view)
+        if slowing.empty:
+            st.caption("No step p90 increased by 20% or more.")
+        else:
+            st.dataframe(slowing)
+
+    st.write("### Learned Step Timeouts")
+    timeout_frame = get_timeout_model().frame()
+    if trend_tests and not timeout_frame.empty:
+        timeout_frame = timeout_frame[timeout_frame["test_name"].isin(trend_tests)]
+    if timeout_frame.empty:
+        st.caption("No element, toast or dropdown waits recorded yet.")
+    else:
+        st.dataframe(timeout_frame.sort_values(["test_name", "step", "kind"]), hide_index=True)
+        drifting = timeout_frame[timeout_frame["drift"] >= TIMEOUT_DRIFT_RATIO]
+        if not drifting.empty:
+            st.warning(f"{len(drifting)} wait(s) drifting: the last {TIMEOUT_RECENT // 2} samples have a median "
+                       f"{TIMEOUT_DRIFT_RATIO}x or more of the {TIMEOUT_RECENT // 2} before them")
+            st.dataframe(drifting.sort_values("drift", ascending=False), hide_index=True)
 
-        # Cleanup screenshots
-        for path in logs_df["screenshot"].dropna():
-            if isinstance(path, str) and os.path.exists(path):
+trends_panel()
+
+# Test Execution Section
+@st.fragment
+def run_panel():
+    """Test selection, CSV upload and execution with live logs"""
+    st.subheader("🚀 Run Tests")
+    selected_cases = st.multiselect("Select Test Cases", [tc["name"] for tc in load_test_cases()])
+    repeat = st.number_input("Repeat Count", min_value=1, value=1)
+    headless = st.checkbox("Run Headless", value=True)
+    parallel = st.number_input("Parallel Browsers", min_value=1, max_value=16, value=1,
+                               help="Independent cases and CSV rows run concurrently; depends_on is respected.")
+    instrument = st.checkbox("Capture performance metrics", value=False,
+                             help="Record page timings, LCP and network stats for visit/click steps.")
+    network_mode = st.selectbox("Network Mode", NETWORK_MODES, format_func=str.title,
+                                help="Record saves every response to recordings/; Replay serves them locally with no network access.")
+    browser_mode = st.selectbox("Browser Mode", BROWSER_MODES, format_func=str.title,
+                                help="Context runs every unit in an isolated context of one shared Chrome, "
+                                     "which starts faster and packs far more parallel browsers per host.")
+    trace = st.checkbox("Record trace", value=False,
+                        help="Write a trace per run (DOM snapshot, console errors, network and timings per step); "
+                             "open it under Run Traces.")
+    capture = st.selectbox("Capture", CAPTURE_MODES, format_func=str.title,
+                           help="Screencast records each run's frame stream instead of a PNG per step; "
+                                "report stills are extracted from it on demand.")
+    screencast_fps, screencast_quality = SCREENCAST_FPS, SCREENCAST_QUALITY
+    if capture == "screencast":
+        col1, col2 = st.columns(2)
+        screencast_fps = col1.number_input("Frames per Second", min_value=1, max_value=30, value=SCREENCAST_FPS)
+        screencast_quality = col2.slider("JPEG Quality", 10, 100, SCREENCAST_QUALITY)
+    if network_mode == "replay":
+        missing = [name for name in selected_cases if not os.path.exists(recording_path(name))]
+        if missing:
+            st.warning(f"No recording yet for: {', '.join(missing)} (per-user recordings are used when they exist)")
+    fail_fast = st.checkbox("Fail fast when the environment is down", value=True,
+                            help="Probe entry URLs first and skip units whose shared sign-in steps keep failing.")
+    breaker = get_circuit_breaker()
+    breaker_settings = None
+    if fail_fast:
+        with st.expander("🔌 Circuit Breaker", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            min_samples = col1.number_input("Minimum Runs", min_value=1, max_value=BREAKER_WINDOW,
+                                            value=breaker.min_samples, key="breaker_min_samples")
+            failure_rate = col2.slider("Failure Rate to Trip", 0.1, 1.0, breaker.failure_rate, 0.05,
+                                       key="breaker_failure_rate")
+            cooldown = col3.number_input("Cooldown (minutes)", min_value=1, max_value=120,
+                                         value=max(1, int(breaker.cooldown // 60)), key="breaker_cooldown")
+            # Applies to this run only; scheduled runs keep the process-wide thresholds
+            breaker_settings = {"min_samples": min_samples, "failure_rate": failure_rate, "cooldown": cooldown * 60}
+            open_circuits = breaker.open_circuits()
+            for circuit in open_circuits:
+                st.warning(f"Open for {circuit['open_for']}s: {circuit['reason']}")
+            if open_circuits and st.button("Reset Circuits"):
+                breaker.reset()
+                rerun_fragment()
+
+    # CSV Data Upload
+    st.subheader("📄 Load CSV Data")
+    uploaded_file = st.file_uploader("Upload CSV File", type=["csv"])
+    csv_data = parse_csv_bytes(uploaded_file.getvalue()) if uploaded_file else None
+    if csv_data is not None:
+        st.write("✅ CSV Loaded:")
+        st.dataframe(csv_data)
+    csv_used = archive_csv_upload(uploaded_file.getvalue(), uploaded_file.name) if uploaded_file else None
+    unfinished = {name: find_unfinished_result(name, csv_used) for name in selected_cases}
+    unfinished = {name: path for name, path in unfinished.items() if path}
+    resume = False
+    if unfinished:
+        resume = st.checkbox(f"Resume unfinished run of {', '.join(unfinished)}", value=True,
+                             help="Units that already completed in the interrupted run are not run again.")
+
+    # Run Tests Button
+    logs_output = []
+    if st.button("▶️ Run Selected Tests"):
+        st.subheader("📜 Live Logs")
+
+        if not resume:
+            # Starting over supersedes the interrupted streams; they would otherwise be offered again
+            for path in unfinished.values():
                 try:
                     os.remove(path)
-                except Exception as e:
-                    st.warning(f"⚠️ Could not delete {path}: {e}")
+                except OSError as e:
+                    print(f"Error discarding unfinished result {path}: {e}")
 
-# Background scheduler thread
-def run_scheduler():
-    """Background thread to run scheduled tests"""
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+        # Each case streams its steps to disk as they finish; the result file is written from the stream
+        writers = {name: ResultWriter(name, unfinished.get(name) if resume else None, csv_used=csv_used)
+                   for name in selected_cases}
+        total_runs = len(selected_cases) * (len(csv_data) if csv_data is not None else repeat)
+        total_runs = max(total_runs - sum(len(writer.completed_units()) for writer in writers.values()), 1)
+        progress_bar = st.progress(0)
+        status_box = st.empty()
+        log_container = st.container()
+        completed = 0
 
-# Start scheduler thread if not already running
-if 'scheduler_thread' not in st.session_state:
-    # Load scheduled tests and set up schedule jobs
-    scheduled_tests = load_scheduled_tests()
-    for test in scheduled_tests:
-        days = test['days']
-        time_str = test['time']
-        test_name = test['test_name']
-        csv_path = test.get('csv_path')
-        
-        time_obj = datetime.strptime(time_str, "%H:%M:%S").time()
-        for day in days:
-            getattr(schedule.every(), day.lower()).at(time_obj.strftime("%H:%M")).do(
-                run_scheduled_test, 
-                test_name=test_name, 
-                headless=True,
-                csv_path=csv_path
+        try:
+            test_cases = load_test_cases()
+            # Slowest chains and historically failing units go first; the same plan predicts the wall-clock
+            plan = plan_suite(test_cases, selected_cases, csv_data, repeat, parallel)
+            status_box.info(f"Running {total_runs} unit(s) on {parallel} browser(s), "
+                            f"predicted {plan['predicted_makespan']:.0f}s")
+            suite_started = time.perf_counter()
+            for name, user_id, logs in run_suite(test_cases, selected_cases, headless=headless, repeat=repeat,
+                                                 csv_data=csv_data, max_workers=parallel, writers=writers, plan=plan,
+                                                 breaker=breaker if fail_fast else None, preflight=fail_fast,
+                                                 breaker_settings=breaker_settings,
+                                                 instrument=instrument, network_mode=network_mode,
+                                                 browser_mode=browser_mode, capture=capture,
+                                                 screencast_fps=screencast_fps, screencast_quality=screencast_quality,
+                                                 trace=trace):
+                if csv_data is not None:
+                    group_title = f"🧪 {name} | 👤 {user_id}"
+                    with log_container.expander(group_title, expanded=False):
+                        for i, log in enumerate(logs):
+                            st.markdown(f"### 🔹 Step {i+1}: `{log.get('action', '').upper()}` - {log.get('status', 'Unknown')}")
+                            if log.get("notifications"):
+                                st.markdown("**Notifications:**")
+                                st.write(log["notifications"])
+                            if log.get("metrics"):
+                                st.json(log["metrics"], expanded=False)
+                            if log.get("replay_unmatched"):
+                                st.warning(f"{len(log['replay_unmatched'])} request(s) missing from the recording")
+                                st.write(log["replay_unmatched"])
+                            still = screenshot_file(log.get("screenshot"))
+                            if still:
+                                st.image(still, caption="📸 Screenshot", use_container_width=True)
+                            st.markdown("---")
+                else:
+                    for i, log in enumerate(logs):
+                        with log_container.expander(f"🔹 {name} | Step {i+1}: {log.get('action', '').upper()} - {log.get('status', 'Unknown')}"):
+                            st.markdown(f"**Selector Type:** `{log.get('selector_type', '')}`")
+                            st.markdown(f"**Selector Value:** `{log.get('selector_value', '')}`")
+                            st.markdown(f"**Text:** `{log.get('text', '')}`")
+                            st.markdown(f"**Wait Time:** `{log.get('wait_time', '')}`")
+                            st.markdown(f"**Actual URL:** `{log.get('actual_url', '')}`")
+                            if log.get("notifications"):
+                                st.markdown("**Notifications:**")
+                                st.write(log["notifications"])
+                            if log.get("metrics"):
+                                st.markdown("**Performance:**")
+                                st.json(log["metrics"], expanded=False)
+                            if log.get("replay_unmatched"):
+                                st.markdown("**Requests missing from the recording:**")
+                                st.write(log["replay_unmatched"])
+                            still = screenshot_file(log.get("screenshot"))
+                            if still:
+                                st.image(still, caption="📸 Screenshot", use_container_width=True)
+
+                logs_output.extend(logs)
+                completed += 1
+                progress_bar.progress(completed / total_runs)
+                status_box.info(f"Finished `{name}` for `{user_id}` ({completed}/{total_runs})")
+
+            # Save the test results, one file per case holding only that case's logs
+            for writer in writers.values():
+                writer.finalize()
+        except ValueError as e:
+            for writer in writers.values():
+                if resume and writer.path in unfinished.values():
+                    writer.close()
+                else:
+                    writer.discard()
+            st.error(f"❌ Cannot run suite: {e}")
+            return
+        finally:
+            # Also reached when a widget change stops or reruns the script mid-run
+            for writer in writers.values():
+                writer.close()
+
+        actual_makespan = time.perf_counter() - suite_started
+        progress_bar.empty()
+        status_box.success("🎉 All tests completed!")
+        col1, col2 = st.columns(2)
+        col1.metric("Predicted Makespan", f"{plan['predicted_makespan']:.0f}s")
+        col2.metric("Actual Makespan", f"{actual_makespan:.0f}s",
+                    delta=f"{actual_makespan - plan['predicted_makespan']:+.0f}s", delta_color="inverse")
+
+        # Display results summary
+        logs_df = pd.DataFrame(logs_output)
+
+        if "LoginEmail" in logs_df.columns:
+            cols = ["LoginEmail"] + [col for col in logs_df.columns if col != "LoginEmail"]
+            logs_df = logs_df[cols]
+
+        st.write("### Test Results Summary")
+        st.dataframe(logs_df)
+
+        # Reports build in the background; screenshots are removed once every format has embedded them
+        if not logs_df.empty:
+            file_base_name = "_".join(selected_cases).replace(" ", "_")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            run_report = {"result_id": f"run_{file_base_name}_{timestamp}", "file_base": f"{file_base_name}_{timestamp}_logs",
+                          "logs": logs_df}
+            st.session_state["run_report"] = run_report
+            report_queue = get_report_queue()
+            jobs = [report_queue.submit(run_report["result_id"], fmt, lambda: logs_df, title=run_report["file_base"])
+                    for fmt in REPORT_FORMATS]
+            if "screenshot" in logs_df.columns:
+                report_queue.when_finished(jobs, functools.partial(remove_screenshots, list(logs_df["screenshot"].dropna())))
+
+    run_report = st.session_state.get("run_report")
+    if run_report is not None:
+        st.write("### Download Logs")
+        logs = run_report["logs"]
+        report_downloads(run_report["result_id"], lambda: logs, run_report["file_base"],
+                         title=run_report["file_base"], key="run_report")
+
+run_panel()
+
+# Load Testing Section
+@st.fragment
+def load_test_panel():
+    """Drive a recorded case with many virtual users and chart latency, throughput and errors"""
+    case_names = [tc["name"] for tc in load_test_cases()]
+    if not case_names:
+        st.info("Create a test case first")
+        return
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        load_case = st.selectbox("Test Case", case_names, key="load_case")
+    with col2:
+        load_backend = st.selectbox("Backend", LOAD_BACKENDS, key="load_backend",
+                                    help="browser drives real headless Chrome; context shares one Chrome across users; http replays the case's recorded document/XHR requests.")
+    with col3:
+        load_users = st.number_input("Max Concurrent Users", min_value=1, max_value=200, value=5, key="load_users")
+    load_stages = st.text_input("Arrival Schedule (seconds@users-per-second, ...)", value="60@0.2, 120@0.5, 30@0",
+                                key="load_stages", help="Each stage ramps linearly from the previous rate to its target.")
+    load_csv = st.file_uploader("User CSV (optional, browser backend)", type=["csv"], key="load_csv")
+
+    if st.button("🔥 Start Load Test"):
+        try:
+            stages = parse_load_stages(load_stages)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        st.caption(f"{len(arrival_offsets(stages))} arrivals over {sum(d for d, _ in stages):.0f}s")
+        progress_bar = st.progress(0)
+        test_case = next(tc for tc in load_test_cases() if tc["name"] == load_case)
+        try:
+            report = run_load_test(
+                test_case, stages, load_users, backend=load_backend,
+                csv_data=parse_csv_bytes(load_csv.getvalue()) if load_csv else None,
+                progress=lambda done, total: progress_bar.progress(done / max(total, 1)),
             )
-    
-    # Start the scheduler thread
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    st.session_state.scheduler_thread = scheduler_thread
\ No newline at end of file
+        except FileNotFoundError as e:
+            st.error(str(e))
+            return
+        progress_bar.empty()
+        st.session_state.load_report_path = save_load_report(report)
+
+    report_path = st.session_state.get("load_report_path")
+    if report_path and os.path.exists(report_path):
+        report = read_json_file(report_path)
+        step_table, timeline = summarise_load_report(report)
+        journeys = report["journeys"]
+        failed = sum(1 for j in journeys if not j["ok"])
+        st.write(f"### {report['test_name']} ({report['backend']}, {len(journeys)} journeys, {failed} failed)")
+        if not timeline.empty:
+            st.line_chart(timeline.set_index("t")[["throughput_per_s", "active_users"]])
+            st.line_chart(timeline.set_index("t")[["error_rate"]])
+            if "p95_step_latency" in timeline.columns:
+                st.line_chart(timeline.set_index("t")[["p95_step_latency"]])
+        if not step_table.empty:
+            st.write("#### Step Latency (s)")
+            st.dataframe(step_table)
+        st.caption(f"Report saved to {report_path}")
+
+with st.expander("🔥 Load Testing", expanded=False):
+    load_test_panel()
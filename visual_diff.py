@@ -0,0 +1,78 @@
+import numpy as np
+from PIL import Image
+
+# Width frames are downscaled to before comparing; height follows the baseline's aspect ratio
+DIFF_WIDTH = 320
+
+
+def _load_gray(path, size):
+    """Load an image as float32 luminance at the given (width, height)"""
+    with Image.open(path) as img:
+        return np.asarray(img.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def _box_blur(frame):
+    """3x3 box blur so anti-aliasing and sub-pixel shifts do not count as changes"""
+    padded = np.pad(frame, 1, mode="edge")
+    height, width = frame.shape
+    total = np.zeros_like(frame)
+    for dy in range(3):
+        for dx in range(3):
+            total += padded[dy:dy + height, dx:dx + width]
+    return total / 9.0
+
+
+def _mask_array(masks, original_size, size):
+    """Boolean array that is True for pixels inside any ignored region"""
+    mask = np.zeros((size[1], size[0]), dtype=bool)
+    x_scale = size[0] / original_size[0]
+    y_scale = size[1] / original_size[1]
+    for x, y, w, h in masks or []:
+        left = max(int(np.floor(x * x_scale)), 0)
+        top = max(int(np.floor(y * y_scale)), 0)
+        right = min(int(np.ceil((x + w) * x_scale)), size[0])
+        bottom = min(int(np.ceil((y + h) * y_scale)), size[1])
+        mask[top:bottom, left:right] = True
+    return mask
+
+
+def compare_images(candidate_path, baseline_path, masks=None, pixel_tolerance=0.1, diff_path=None):
+    """Perceptual diff of a screenshot against its baseline.
+
+    Both frames are converted to luminance, downscaled to DIFF_WIDTH and blurred.
+    A pixel counts as changed when its luminance moved by more than
+    pixel_tolerance (0-1). Masks are [x, y, w, h] regions in baseline pixels
+    that are ignored. Returns the changed-pixel ratio over unmasked pixels,
+    along with both frame sizes; a size mismatch means the layout differs.
+    """
+    with Image.open(baseline_path) as img:
+        original_size = img.size
+    with Image.open(candidate_path) as img:
+        candidate_size = img.size
+
+    size = (DIFF_WIDTH, max(int(round(original_size[1] * DIFF_WIDTH / original_size[0])), 1))
+    baseline = _box_blur(_load_gray(baseline_path, size))
+    candidate = _box_blur(_load_gray(candidate_path, size))
+    ignored = _mask_array(masks, original_size, size)
+
+    delta = np.abs(candidate - baseline) / 255.0
+    changed = (delta > pixel_tolerance) & ~ignored
+    considered = int((~ignored).sum())
+    ratio = float(changed.sum()) / considered if considered else 0.0
+
+    if diff_path and changed.any():
+        overlay = np.repeat(candidate[:, :, None], 3, axis=2).astype(np.uint8)
+        overlay[changed] = (255, 0, 0)
+        overlay[ignored] = overlay[ignored] // 2
+        Image.fromarray(overlay).save(diff_path)
+    else:
+        diff_path = None
+
+    return {
+        "ratio": round(ratio, 5),
+        "mean_delta": round(float(delta[~ignored].mean()) if considered else 0.0, 5),
+        "size_mismatch": candidate_size != original_size,
+        "size": list(candidate_size),
+        "baseline_size": list(original_size),
+        "diff_image": diff_path,
+    }